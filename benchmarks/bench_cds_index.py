@@ -0,0 +1,69 @@
+"""Compare the linear CDS scan in fastocodoncsv.py against CDSIndex.
+
+Builds synthetic loci with an increasing number of CDS regions, checks that
+both approaches classify every codon position identically and prints the
+time each takes.
+
+    python benchmarks/bench_cds_index.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from genomic_music.coordinates import CDSIndex
+
+
+def make_locus(n_regions, start_offset=100000, seed=0):
+    # Exons of 50-300 bp separated by introns of 100-2000 bp
+    rng = random.Random(seed)
+    regions = []
+    position = start_offset
+    for _ in range(n_regions):
+        position += rng.randint(100, 2000)
+        length = rng.randint(50, 300)
+        regions.append((position, position + length))
+        position += length
+    return regions, position + 1000 - start_offset
+
+
+def linear_scan(regions, positions):
+    types = []
+    for position in positions:
+        position_type = "intron"
+        for start, end in regions:
+            if start <= position <= end:
+                position_type = "exon"
+                break
+        types.append(position_type)
+    return types
+
+
+def indexed(regions, positions):
+    cds_index = CDSIndex(regions)
+    return [cds_index.position_type(position) for position in positions]
+
+
+def main():
+    start_offset = 100000
+    print(f"{'regions':>8} {'codons':>9} {'linear (s)':>11} {'index (s)':>10} {'speedup':>8}")
+    for n_regions in (10, 100, 500, 1000):
+        regions, locus_length = make_locus(n_regions, start_offset)
+        positions = range(start_offset, start_offset + locus_length, 3)
+
+        t0 = time.perf_counter()
+        expected = linear_scan(regions, positions)
+        t1 = time.perf_counter()
+        actual = indexed(regions, positions)
+        t2 = time.perf_counter()
+
+        if actual != expected:
+            raise SystemExit(f"Mismatch between linear scan and CDSIndex for {n_regions} regions")
+        print(f"{n_regions:>8} {len(positions):>9} {t1 - t0:>11.3f} {t2 - t1:>10.3f} {(t1 - t0) / (t2 - t1):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compare the memory of the chord stage on dict rows against columnar tables.
+
+aminoacidchordsaddition.py used to load the annotated CSV as a list of dicts,
+add three keys to every dict and copy the Sequence1 rows into new dicts for
+SequenceX. chords.add_chords now works on interned column codes. This builds
+the annotated table of OG0002459_codon.fasta with every sequence repeated
+1, 10 and 100 times, checks that both approaches produce the same rows and
+prints the peak memory (tracemalloc) of each, per input base.
+
+    python benchmarks/bench_memory.py [--sizes 1 10 100] [--dict-limit 100]
+
+The dict baseline is only run up to --dict-limit (it needs about 400 bytes a
+base); beyond that its figure is extrapolated from the largest measured size.
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from genomic_music import chords
+from genomic_music.columnar import Table, TableWriter
+from genomic_music.fasta import read_fasta
+from genomic_music.translate import ANNOTATION_FIELDS, annotate_alignment, annotation_columns
+
+FASTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "OG0002459_codon.fasta")
+
+
+def annotated_table(repeat):
+    records = [sequence * repeat for _, sequence in read_fasta(FASTA)]
+    with TableWriter(None, ANNOTATION_FIELDS) as writer:
+        for i, sequence in enumerate(records):
+            writer.write_columns(annotation_columns(f"Sequence{i + 1}", annotate_alignment(sequence, records[1])))
+    return writer.table
+
+
+def dict_rows(table):
+    # The chord stage of the original aminoacidchordsaddition.py, on csv.DictReader-style rows
+    original_rows = list(table.rows())
+    new_rows = []
+    for row in original_rows:
+        amino_acid = row["codons"].strip()
+        chord = chords.default_scheme().amino_acid_to_chord.get(amino_acid, "")
+        row["pitch"] = chords.base_pitch(chord, row["sequence"])
+        row["amino_acid_chord"] = chord
+        row["scale_type"] = chords.scale_type_of(amino_acid)
+    for row in original_rows:
+        if row["header"] == "Sequence1":
+            chord = row["amino_acid_chord"]
+            base_note = chords.chord_root(chord)
+            new_rows.append({
+                "header": "SequenceX",
+                "duration": row["duration"],
+                "accent": row["accent"],
+                "sequence": row["sequence"],
+                "codons": row["codons"],
+                "pitch": base_note + "4" if base_note else "",
+                "amino_acid_chord": chord,
+                "scale_type": row["scale_type"],
+            })
+    return original_rows + new_rows
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    result = function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--dict-limit", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'size':>5} {'bases':>10} {'dict MB':>9} {'B/base':>7} {'table MB':>9} {'B/base':>7} {'ratio':>6}")
+    dict_per_base = None
+    for repeat in args.sizes:
+        table = annotated_table(repeat)
+        bases = len(table)
+        chord_table, table_peak = measure(chords.add_chords, table)
+
+        if repeat <= args.dict_limit:
+            rows, dict_peak = measure(dict_rows, table)
+            expected = Table.from_rows(rows, chord_table.fieldnames)
+            if any(expected.column(name) != chord_table.column(name) for name in chord_table.fieldnames):
+                raise SystemExit(f"Mismatch between dict rows and add_chords at {repeat}x")
+            del rows
+            dict_per_base = dict_peak / bases
+            dict_label = f"{dict_peak / 1e6:>9.1f}"
+        else:
+            dict_peak = dict_per_base * bases
+            dict_label = f"{dict_peak / 1e6:>8.0f}~"
+        print(f"{repeat:>4}x {bases:>10} {dict_label} {dict_peak / bases:>7.0f} "
+              f"{table_peak / 1e6:>9.1f} {table_peak / bases:>7.1f} {dict_peak / table_peak:>5.0f}x")
+
+
+if __name__ == "__main__":
+    main()
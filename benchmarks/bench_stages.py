@@ -0,0 +1,246 @@
+"""Time and memory of every pipeline stage on synthetic inputs of increasing size.
+
+Generates an aligned codon FASTA (8 records, like OG0002459_codon.fasta) and
+a locus FASTA with its gene_and_cds_coordinates.tsv, each 1, 10, 100 and
+1000 times the size of OG0002459_codon.fasta, then runs the stages of both
+pipelines one at a time:
+
+    fasta             read_fasta over the file
+    annotate          fa-to-csv.py / fastocodoncsv.py (pipeline.annotate)
+    chords            aminoacidchordsaddition.py / aminoacidchord.py (pipeline.chords)
+    dynamics          conservation-driven accents and velocities (alignment only)
+    musicxml          direct MusicXML writer
+    musicxml-music21  music21 Score written as MusicXML
+    midi              MIDI export
+    audio             WAV rendering with the built-in synthesizer
+
+Each stage is timed, then run again under tracemalloc for its peak memory
+(skip that with --no-memory). The renderers are imported beforehand, so
+import time is not counted. The music21 writer (about 30 s at 1x) and the
+audio, whose length grows with the input, stop at 1x and 10x by default
+(--limit STAGE=SIZE).
+Results are written as JSON; with --compare, stages more than --threshold
+slower than in an earlier results file are listed and the exit status is 1.
+
+    python benchmarks/bench_stages.py [--sizes 1 10 100 1000] [--output results.json]
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from genomic_music import midi, musicxml, pipeline, score, synth  # noqa: F401 (imported before timing)
+from genomic_music.fasta import read_fasta
+
+RECORDS = 8
+BASE_LENGTH = 828  # alignment columns of OG0002459_codon.fasta
+LOCUS_RECORDS = 3
+LINE_WIDTH = 60
+STAGES = ["fasta", "annotate", "chords", "dynamics", "musicxml", "musicxml-music21", "midi", "audio"]
+DEFAULT_LIMITS = {"musicxml-music21": 1, "audio": 10}
+START_OFFSET = 10000
+
+
+def write_fasta(path, sequences):
+    with open(path, "w") as f:
+        for i, sequence in enumerate(sequences, start=1):
+            f.write(f">s{i}\n")
+            for start in range(0, len(sequence), LINE_WIDTH):
+                f.write(sequence[start:start + LINE_WIDTH] + "\n")
+
+
+def _random_bases(rng, n):
+    return np.frombuffer(b"ACGT", dtype=np.uint8)[rng.integers(0, 4, n)]
+
+
+def make_alignment(path, scale, seed=0):
+    """An alignment of RECORDS codon sequences with gapped codons, ``scale`` times OG0002459's length."""
+    rng = np.random.default_rng(seed)
+    length = BASE_LENGTH * scale
+    ancestor = _random_bases(rng, length)
+    sequences = []
+    for _ in range(RECORDS):
+        bases = ancestor.copy()
+        mutated = rng.random(length) < 0.1
+        bases[mutated] = _random_bases(rng, int(mutated.sum()))
+        # About 5% of the codons are alignment gaps
+        gaps = np.repeat(rng.random(length // 3) < 0.05, 3)
+        bases[:len(gaps)][gaps] = ord("-")
+        sequences.append(bases.tobytes().decode("ascii"))
+    write_fasta(path, sequences)
+
+
+def make_locus(fasta_path, coordinates_path, scale, seed=0):
+    """A locus FASTA and its CDS coordinates with as many bases as ``scale`` alignments."""
+    rng = np.random.default_rng(seed)
+    length = BASE_LENGTH * RECORDS * scale // LOCUS_RECORDS
+    write_fasta(fasta_path, [_random_bases(rng, length).tobytes().decode("ascii")
+                             for _ in range(LOCUS_RECORDS)])
+    # Exons of 50-300 bp separated by introns of 100-2000 bp
+    end = START_OFFSET + length - 1
+    rows = [("chr1", START_OFFSET, end, "g1", "gene")]
+    position = START_OFFSET + int(rng.integers(100, 2000))
+    while position < end:
+        exon_end = min(position + int(rng.integers(50, 300)), end)
+        rows.append(("chr1", position, exon_end, "g1", "CDS"))
+        position = exon_end + int(rng.integers(100, 2000))
+    with open(coordinates_path, "w") as f:
+        f.write("chrom\tstart\tend\tid\tfeature\n")
+        for row in rows:
+            f.write("\t".join(str(value) for value in row) + "\n")
+
+
+def stage_function(stage, inputs, with_introns, scratch, tables):
+    """A function running ``stage`` on the outputs of the stages before it.
+
+    ``tables`` keeps the annotated and chord tables for the later stages.
+    Returns None for a stage the pipeline does not have.
+    """
+    fasta_path, coordinates = inputs
+    output = os.path.join(scratch, "output")
+    if stage == "fasta":
+        return lambda: sum(len(sequence) for _, sequence in read_fasta(fasta_path))
+    if stage == "annotate":
+        return lambda: pipeline.annotate(fasta_path, coordinates=coordinates)
+    if "annotated" not in tables:
+        tables["annotated"] = pipeline.annotate(fasta_path, coordinates=coordinates)
+    table = tables["annotated"]
+    if stage == "chords":
+        return lambda: pipeline.chords(table, with_introns=with_introns)
+    if "chords" not in tables:
+        tables["chords"] = pipeline.chords(table, with_introns=with_introns)
+    chord_table = tables["chords"]
+    if stage == "dynamics":
+        return None if with_introns else lambda: pipeline.dynamics(chord_table)
+    return {
+        "musicxml": lambda: pipeline.direct_musicxml(chord_table, output + ".musicxml", with_introns),
+        "musicxml-music21": lambda: pipeline.score(chord_table, output + ".musicxml", with_introns),
+        "midi": lambda: pipeline.midi(chord_table, output + ".mid", with_introns),
+        "audio": lambda: pipeline.audio(chord_table, output + ".wav", with_introns, workers=1),
+    }[stage]
+
+
+def measure(function, memory=True):
+    """(seconds, peak traced bytes or None) of one call of ``function``."""
+    gc.collect()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run_benchmarks(sizes, stages, limits, memory=True):
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        for scale in sizes:
+            alignment = os.path.join(scratch, f"alignment_{scale}x.fasta")
+            locus = os.path.join(scratch, f"locus_{scale}x.fa")
+            coordinates = os.path.join(scratch, f"coordinates_{scale}x.tsv")
+            make_alignment(alignment, scale)
+            make_locus(locus, coordinates, scale)
+            for name, inputs, with_introns in (("alignment", (alignment, None), False),
+                                               ("locus", (locus, coordinates), True)):
+                bases = sum(len(sequence) for _, sequence in read_fasta(inputs[0]))
+                tables = {}
+                for stage in stages:
+                    if scale > limits.get(stage, scale):
+                        continue
+                    function = stage_function(stage, inputs, with_introns, scratch, tables)
+                    if function is None:
+                        continue
+                    seconds, peak = measure(function, memory)
+                    results.append({
+                        "pipeline": name,
+                        "stage": stage,
+                        "scale": scale,
+                        "bases": bases,
+                        "seconds": round(seconds, 4),
+                        "bases_per_second": round(bases / seconds) if seconds else None,
+                        "peak_bytes": peak,
+                    })
+                    print(format_result(results[-1]), flush=True)
+    return results
+
+
+def format_result(result):
+    peak = f"{result['peak_bytes'] / 1e6:>9.1f}" if result["peak_bytes"] is not None else f"{'-':>9}"
+    return (f"{result['pipeline']:<9} {result['stage']:<17} {result['scale']:>5}x {result['bases']:>10} "
+            f"{result['seconds']:>9.3f} {peak}")
+
+
+def regressions(results, baseline, threshold):
+    """Results more than ``threshold`` (a fraction) slower than the same benchmark in ``baseline``."""
+    earlier = {(r["pipeline"], r["stage"], r["scale"]): r for r in baseline["results"]}
+    slower = []
+    for result in results:
+        before = earlier.get((result["pipeline"], result["stage"], result["scale"]))
+        if before and before["seconds"] and result["seconds"] > before["seconds"] * (1 + threshold):
+            slower.append((result, before))
+    return slower
+
+
+def _limit(value):
+    stage, _, size = value.partition("=")
+    if stage not in STAGES or not size.isdigit():
+        raise argparse.ArgumentTypeError(f"expected STAGE=SIZE with a stage of {', '.join(STAGES)}")
+    return stage, int(size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--limit", type=_limit, action="append", default=[], metavar="STAGE=SIZE",
+                        help="Largest size to run a stage at (defaults: musicxml-music21=1, audio=10).")
+    parser.add_argument("--no-memory", action="store_true", help="Only time the stages.")
+    parser.add_argument("--output", default="bench_stages.json", help="Results JSON (default bench_stages.json).")
+    parser.add_argument("--compare", metavar="JSON", help="Earlier results to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Slowdown counted as a regression, as a fraction (default 0.2).")
+    args = parser.parse_args()
+
+    print(f"{'pipeline':<9} {'stage':<17} {'size':>6} {'bases':>10} {'seconds':>9} {'peak MB':>9}")
+    results = run_benchmarks(args.sizes, args.stages, {**DEFAULT_LIMITS, **dict(args.limit)}, not args.no_memory)
+    report = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = regressions(results, json.load(f), args.threshold)
+        for result, before in slower:
+            print(f"regression: {result['pipeline']} {result['stage']} {result['scale']}x "
+                  f"{before['seconds']:.3f} s -> {result['seconds']:.3f} s")
+        if slower:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
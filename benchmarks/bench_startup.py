@@ -0,0 +1,91 @@
+"""Cold start time of the pipeline entry points, in fresh interpreters.
+
+Each command runs in a new Python process --repeat times and the median
+wall time is printed, next to the bare interpreter and a NumPy import,
+which every path needs. The annotation and chord paths, MIDI output, the
+direct MusicXML backend and stage reports must not import music21 or
+pydub; the benchmark fails if they do.
+
+The target for the annotation-only path is a cold start well under 100 ms.
+It is not met where importing NumPy alone takes longer than that (about
+173 ms of the 185 ms annotate takes on the reference machine); the last
+line prints the absolute time against the target and the NumPy share.
+
+    python benchmarks/bench_startup.py [--repeat 11]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+FASTA = os.path.join(ROOT, "OG0002459_codon.fasta")
+
+# Prints the heavy modules that got imported, after the statement has run
+CHECK = "import sys; print('heavy:', *(m for m in ('music21', 'pydub') if m in sys.modules))"
+
+TARGET_MS = 100  # cold start of the annotation-only path
+
+
+def commands(scratch):
+    annotated = os.path.join(scratch, "annotated.npz")
+    midi = os.path.join(scratch, "score.mid")
+    report = os.path.join(scratch, "report.json")
+    return [
+        ("interpreter", "pass", None),
+        ("import numpy", "import numpy", None),
+        ("annotate", f"from genomic_music.pipeline import annotate; annotate({FASTA!r})", ()),
+        ("annotate + chords", f"from genomic_music import pipeline; "
+                              f"pipeline.run({FASTA!r}, annotated={annotated!r})", ()),
+        ("import musicxml backend", "import genomic_music.musicxml", ()),
+        ("midi", f"from genomic_music import pipeline; pipeline.run({FASTA!r}, midi_file={midi!r})", ()),
+        ("midi --report", f"from genomic_music.cli import main; "
+                          f"main(['render', {FASTA!r}, '--midi', {midi!r}, '--report', {report!r}])", ()),
+    ]
+
+
+def run(statement, check):
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(ROOT))
+    code = f"{statement}\n{CHECK}" if check is not None else statement
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - start
+    # The statement may print too; the check's line is the last one
+    lines = result.stdout.splitlines()
+    return seconds, lines[-1].split()[1:] if check is not None else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=11)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        run("import genomic_music.pipeline, genomic_music.musicxml", None)  # compile the .pyc files first
+        timings = {}
+        print(f"{'command':<24} {'median ms':>10} {'over numpy':>11}")
+        for name, statement, check in commands(scratch):
+            times = []
+            for _ in range(args.repeat):
+                seconds, heavy = run(statement, check)
+                times.append(seconds)
+                if check is not None and heavy:
+                    raise SystemExit(f"{name} imported {', '.join(heavy)}")
+            timings[name] = statistics.median(times)
+            over = f"{(timings[name] - timings['import numpy']) * 1000:>10.1f}" if "import numpy" in timings else ""
+            print(f"{name:<24} {timings[name] * 1000:>10.1f} {over}")
+
+    annotate_ms, numpy_ms = timings["annotate"] * 1000, timings["import numpy"] * 1000
+    if annotate_ms < TARGET_MS:
+        verdict = "met"
+    else:
+        verdict = f"not met, importing NumPy alone takes {numpy_ms:.1f} ms"
+    print(f"annotate cold start {annotate_ms:.1f} ms, target under {TARGET_MS} ms: {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""Shared building blocks for the Genomic Music pipelines.
+
+The scripts in "Genomic Music without Introns" and "Genomic Music with Introns"
+import from here so both pipelines share one implementation of each stage.
+"""
+
+from .coordinates import CDSIndex
+from .fasta import read_fasta
+from .translate import annotate_alignment, annotate_locus, dna_to_amino_acid, translate
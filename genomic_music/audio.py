@@ -0,0 +1,43 @@
+"""MP3 export of MIDI and MusicXML files through pydub.
+
+The pipeline renders audio with synth.render_audio; these helpers convert
+files that already exist.
+"""
+
+import os
+
+
+def midi_to_mp3(midi_file, output_file):
+    """Convert a MIDI file to MP3 using pydub."""
+    from pydub import AudioSegment
+
+    sound = AudioSegment.from_file(midi_file, format="mid")
+    sound.export(output_file, format="mp3")
+
+
+def musicxml_to_mp3(input_file, output_file):
+    """Convert an existing MusicXML file to MP3.
+
+    This is the legacy path for files the pipeline did not produce: the
+    MusicXML is parsed with music21 and translated to MIDI first.
+    """
+    from music21 import converter, midi
+
+    try:
+        # Convert the MusicXML file to a MIDI stream
+        score = converter.parse(input_file)
+        midi_file = input_file.replace('.musicxml', '.mid')
+        mf = midi.translate.music21ObjectToMidiFile(score)
+        mf.open(midi_file, 'wb')
+        mf.write()
+        mf.close()
+
+        try:
+            midi_to_mp3(midi_file, output_file)
+        finally:
+            # Clean up temporary MIDI file
+            os.remove(midi_file)
+
+        print(f"Successfully converted {input_file} to {output_file}")
+    except Exception as e:
+        print(f"Error converting {input_file} to {output_file}: {e}")
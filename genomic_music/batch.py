@@ -0,0 +1,255 @@
+"""Render many orthogroups in parallel.
+
+Jobs come from a directory of FASTA files or from a manifest, run in a
+process pool and are skipped when their outputs are newer than their inputs.
+Every job is isolated: a failure is recorded in the summary instead of
+stopping the batch. A job writes into a staging directory of its own and
+its outputs only replace the previous ones once all of them are written,
+so a failed or killed job never leaves files that look up to date.
+"""
+
+import concurrent.futures
+import csv
+import json
+import os
+import shutil
+import time
+import traceback
+
+from . import mappings, pipeline
+from .cache import DEFAULT_MAX_BYTES, StageCache
+from .report import RunReport, aggregate
+
+FASTA_SUFFIXES = (".fasta", ".fa", ".fna", ".fas")
+
+
+class Job:
+    """One orthogroup: a FASTA file and, for the pipeline with introns, its CDS coordinates."""
+
+    def __init__(self, name, fasta, coordinates=None):
+        self.name = name
+        self.fasta = fasta
+        self.coordinates = coordinates
+
+    def inputs(self):
+        return [path for path in (self.fasta, self.coordinates) if path]
+
+    def outputs(self, output_dir, options):
+        base = os.path.join(output_dir, self.name)
+        outputs = {}
+        if options.get("musicxml", True):
+            outputs["musicxml"] = base + ".musicxml"
+        if options.get("midi"):
+            outputs["midi_file"] = base + ".mid"
+        if options.get("audio"):
+            outputs["audio_file"] = f"{base}.{options['audio']}"
+        if options.get("tables"):
+            outputs["annotated"] = f"{base}_codon.{options['tables']}"
+            outputs["with_chords"] = f"{base}_codon_with_chords.{options['tables']}"
+        return outputs
+
+
+def _job_name(path):
+    name = os.path.basename(path)
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return os.path.splitext(name)[0]
+
+
+def discover_jobs(source):
+    """Return the jobs described by a directory or a manifest file.
+
+    In a directory every FASTA file (optionally gzipped) is a job, paired with
+    a ``<name>.tsv`` coordinates file when one sits next to it. A manifest is
+    a CSV or TSV file with ``fasta`` and optional ``name`` and ``coordinates``
+    columns; relative paths are resolved against the manifest's directory.
+    """
+    jobs = []
+    if os.path.isdir(source):
+        for entry in sorted(os.listdir(source)):
+            path = os.path.join(source, entry)
+            if not entry.lower().removesuffix(".gz").endswith(FASTA_SUFFIXES):
+                continue
+            name = _job_name(path)
+            coordinates = os.path.join(source, name + ".tsv")
+            jobs.append(Job(name, path, coordinates if os.path.exists(coordinates) else None))
+        _check_names(jobs)
+        return jobs
+
+    root = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", newline="") as manifest:
+        delimiter = "\t" if source.endswith(".tsv") else ","
+        for row in csv.DictReader(manifest, delimiter=delimiter):
+            fasta = os.path.join(root, row["fasta"])
+            coordinates = row.get("coordinates") or None
+            if coordinates:
+                coordinates = os.path.join(root, coordinates)
+            jobs.append(Job(row.get("name") or _job_name(fasta), fasta, coordinates))
+    _check_names(jobs)
+    return jobs
+
+
+def _check_names(jobs):
+    # Outputs are named after the job, so two jobs with one name would overwrite each other
+    seen = {}
+    for job in jobs:
+        if job.name in seen:
+            raise ValueError(f"Jobs {seen[job.name]} and {job.fasta} share the name {job.name!r}; "
+                             "give them distinct names in a manifest")
+        seen[job.name] = job.fasta
+
+
+def _output_paths(job, output_dir, options):
+    # Every file a job writes; with several schemes each output but the annotated table is per scheme
+    outputs = job.outputs(output_dir, options)
+    schemes = options.get("schemes") or []
+    if len(schemes) < 2:
+        return list(outputs.values())
+    paths = [path for keyword, path in outputs.items() if keyword == "annotated"]
+    for scheme in schemes:
+        name = mappings.load_scheme(scheme).name
+        paths += [pipeline.scheme_output(path, name) for keyword, path in outputs.items() if keyword != "annotated"]
+    return paths
+
+
+def is_up_to_date(job, output_dir, options):
+    """True when every output exists and is newer than every input, scheme files included."""
+    outputs = _output_paths(job, output_dir, options)
+    if not outputs or not all(os.path.exists(path) for path in outputs):
+        return False
+    inputs = job.inputs() + [mappings.scheme_path(scheme) for scheme in options.get("schemes") or []]
+    newest_input = max(os.path.getmtime(path) for path in inputs)
+    return min(os.path.getmtime(path) for path in outputs) >= newest_input
+
+
+def report_path(job, output_dir):
+    return os.path.join(output_dir, job.name + "_report.json")
+
+
+def staging_dir(job, output_dir):
+    """Directory a job writes its outputs to before they are moved into ``output_dir``."""
+    return os.path.join(output_dir, f".{job.name}.partial")
+
+
+def _failed(job, error, traceback_text=None):
+    result = {"name": job.name, "fasta": job.fasta, "coordinates": job.coordinates,
+              "status": "failed", "error": f"{type(error).__name__}: {error}", "seconds": None}
+    if traceback_text:
+        result["traceback"] = traceback_text
+    return result
+
+
+def run_job(job, output_dir, options):
+    """Run one job and return its summary entry; never raises.
+
+    Outputs are written to staging_dir and moved into ``output_dir`` only
+    when the whole job succeeded; a failed job's partial outputs are removed.
+    """
+    start = time.perf_counter()
+    result = {"name": job.name, "fasta": job.fasta, "coordinates": job.coordinates}
+    # Jobs already run in parallel, so each one renders in a single process
+    report = None
+    staging = staging_dir(job, output_dir)
+    try:
+        # Left over when an earlier run of the job was killed
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        if options.get("reports"):
+            report = RunReport(command="batch", name=job.name, fasta=job.fasta, coordinates=job.coordinates,
+                               schemes=options.get("schemes"), backend=options.get("backend", "music21"))
+        cache = None
+        if options.get("cache_dir"):
+            cache = StageCache(options["cache_dir"], options.get("cache_size", DEFAULT_MAX_BYTES))
+        schemes = options.get("schemes") or []
+        arguments = dict(coordinates=job.coordinates, backend=options.get("backend", "music21"), cache=cache,
+                         workers=1, report=report, **job.outputs(staging, options))
+        if len(schemes) > 1:
+            pipeline.run_schemes(job.fasta, schemes, **arguments)
+        else:
+            pipeline.run(job.fasta, scheme=schemes[0] if schemes else None, **arguments)
+        for filename in os.listdir(staging):
+            os.replace(os.path.join(staging, filename), os.path.join(output_dir, filename))
+        result["status"] = "done"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    if report is not None:
+        # Failed jobs keep the stages they got through
+        report.finish()
+        result["report"] = report_path(job, output_dir)
+        report.write(result["report"])
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(jobs, output_dir, workers=None, force=False, summary_file=None, **options):
+    """Run ``jobs`` across a process pool and write a JSON summary.
+
+    ``options`` select the outputs of each job: ``musicxml`` (default True),
+    ``midi``, ``audio`` ("wav", "mp3" or "flac") and ``tables`` ("csv" or
+    "npz" to keep the intermediate tables);
+    ``backend`` is passed on to pipeline.run, and ``cache_dir`` (with
+    ``cache_size`` in bytes) gives the jobs a shared stage cache. With
+    several ``schemes``, each job renders all of them from one annotation
+    (pipeline.run_schemes). With ``reports``, every job writes a stage
+    report (report.RunReport) next to its outputs and the summary adds up
+    the stages of the jobs that ran.
+    Jobs whose outputs are already up to date are skipped unless ``force``;
+    a job whose check fails (a missing input, an unknown scheme) is recorded
+    as failed. Job names must be unique.
+    The summary is written to ``summary_file`` (default
+    ``<output_dir>/batch_summary.json``) and returned.
+    """
+    _check_names(jobs)
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    results = []
+    pending = []
+    for job in jobs:
+        try:
+            up_to_date = not force and is_up_to_date(job, output_dir, options)
+        except Exception as e:
+            result = _failed(job, e, traceback.format_exc())
+            print(f"{result['status']:>7} {job.name} - {result['error']}")
+            results.append(result)
+            continue
+        if up_to_date:
+            results.append({"name": job.name, "fasta": job.fasta, "coordinates": job.coordinates,
+                            "status": "skipped", "seconds": 0.0})
+        else:
+            pending.append(job)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_job, job, output_dir, options): job for job in pending}
+        for future in concurrent.futures.as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed or out of memory)
+                result = _failed(job, e)
+            print(f"{result['status']:>7} {job.name}" + (f" - {result['error']}" if "error" in result else ""))
+            results.append(result)
+
+    order = {job.name: i for i, job in enumerate(jobs)}
+    results.sort(key=lambda result: order[result["name"]])
+    summary = {
+        "output_dir": output_dir,
+        "seconds": round(time.perf_counter() - start, 3),
+        "counts": {status: sum(result["status"] == status for result in results)
+                   for status in ("done", "skipped", "failed")},
+        "jobs": results,
+    }
+    if options.get("reports"):
+        reports = []
+        for result in results:
+            if result.get("report"):
+                with open(result["report"]) as f:
+                    reports.append(json.load(f))
+        summary["stages"] = aggregate(reports)
+    with open(summary_file or os.path.join(output_dir, "batch_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
@@ -0,0 +1,254 @@
+"""Content-addressed cache of pipeline stage outputs.
+
+A stage's cache key is a SHA-256 digest of everything its output depends on:
+the sequences it reads, the mapping tables and code of the modules that
+compute it, and the keys of the stages before it. Annotation and chords are
+cached per part (one entry per SequenceN record), so after one FASTA record
+or one chord mapping changes only the affected parts are recomputed; the
+rendered MusicXML, MIDI and audio files are cached whole.
+
+Entries are files under the cache directory. A hit refreshes the file's
+modification time, and once the cache grows past ``max_bytes`` the least
+recently used entries are deleted. Writes go through a temporary file and a
+rename, so several processes can share one cache directory.
+"""
+
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+
+from . import chords as exon_chords
+from . import introns, mappings
+from .columnar import Table, TableWriter, load_npz, save_npz
+from .coordinates import CDSIndex, read_cds_coordinates
+from .fasta import read_records
+
+# The package re-exports translate.translate, which hides the module itself
+translate = importlib.import_module(".translate", __package__)
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB
+
+
+def digest(*values):
+    """SHA-256 hex digest of JSON-serialisable values (anything else by repr)."""
+    data = json.dumps(values, sort_keys=True, default=repr).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def module_fingerprint(module):
+    """Digest of a module's source file, its module-level tables and its default scheme.
+
+    Editing a mapping in the source or in the module's default scheme file
+    changes the fingerprint and so the keys of every stage that uses the
+    module.
+    """
+    with open(module.__file__, "rb") as f:
+        source = hashlib.sha256(f.read()).hexdigest()
+    tables = {name: value for name, value in vars(module).items()
+              if not name.startswith("_") and isinstance(value, (dict, list, tuple, str, int, float))}
+    scheme = module.default_scheme().digest if hasattr(module, "default_scheme") else None
+    return digest(CACHE_VERSION, module.__name__, source, tables, scheme)
+
+
+class StageCache:
+    """Size-bounded, least-recently-used store of stage outputs keyed by digest."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.startswith("."):
+                    yield os.path.join(root, name)
+
+    def size(self):
+        """Total bytes currently held."""
+        if self._size is None:
+            self._size = sum(os.path.getsize(path) for path in self._entries())
+        return self._size
+
+    def lookup(self, key, suffix):
+        """Path of the entry for ``key``, or None; a hit marks it as recently used."""
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def store(self, key, suffix, write):
+        """Create the entry for ``key`` by calling ``write(path)`` on a temporary path."""
+        path = self.path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary = tempfile.mkstemp(suffix=suffix, prefix=".", dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            write(temporary)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        self._size = self.size() + os.path.getsize(path)
+        if self._size > self.max_bytes:
+            self.evict()
+        return path
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # removed by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def table(self, key, build):
+        """Return the cached table for ``key``, building and storing it on a miss."""
+        path = self.lookup(key, ".npz")
+        if path is not None:
+            return load_npz(path)
+        table = build()
+        self.store(key, ".npz", lambda temporary: save_npz(temporary, table))
+        return table
+
+    def output(self, key, output_file, render):
+        """Copy the cached file for ``key`` to ``output_file``, or ``render(output_file)`` and keep a copy.
+
+        Returns True on a hit.
+        """
+        suffix = os.path.splitext(output_file)[1]
+        path = self.lookup(key, suffix)
+        if path is not None:
+            shutil.copyfile(path, output_file)
+            return True
+        render(output_file)
+        self.store(key, suffix, lambda temporary: shutil.copyfile(output_file, temporary))
+        return False
+
+    def add_counts(self, hits, misses):
+        """Add lookups made through copies of this cache (e.g. in worker processes) to its counts."""
+        self.hits += hits
+        self.misses += misses
+        self._size = None  # the copies may have stored entries
+
+    def stats(self):
+        return f"stage cache: {self.hits} hits, {self.misses} misses, {self.size() / 1e6:.1f} MB"
+
+
+def _annotate_part(header, sequence, reference, locus, offset=0, frame=("", "")):
+    if locus:
+        start_offset, cds_index = locus
+        annotation = translate.annotate_locus(sequence, start_offset + offset, cds_index)
+        fieldnames, columns = introns.LOCUS_FIELDS, introns.locus_columns(header, annotation)
+    else:
+        annotation = translate.annotate_alignment(sequence, reference, *frame)
+        annotation.position = annotation.position + offset
+        fieldnames, columns = translate.ANNOTATION_FIELDS, translate.annotation_columns(header, annotation)
+    with TableWriter(None, fieldnames) as writer:
+        writer.write_columns(columns)
+    return writer.table
+
+
+def cached_annotation(fasta_path, cache, coordinates=None, records=None, region=None):
+    """Annotate a FASTA file one part at a time through ``cache``.
+
+    Returns a list of (header, annotated part table, part key), one per
+    record; the parts hold the rows of pipeline.annotate, including its
+    ``records`` and ``region`` selection.
+    """
+    with_introns = bool(coordinates)
+    region = translate.codon_region(region)
+    offset = region[0] if region else 0
+    if with_introns:
+        selected = [(number, sequence, ("", "")) for number, _, sequence
+                    in read_records(fasta_path, records, region, upper=True)]
+        cds_regions, start_offset = read_cds_coordinates(coordinates)
+        locus = (start_offset, CDSIndex(cds_regions))
+        context = digest(start_offset, cds_regions, offset)
+        reference = None
+    else:
+        # The bases around the region that complete its codons are part of each part's key
+        selected = [(number, sequence, (before, after)) for number, sequence, before, after
+                    in translate.aligned_records(fasta_path, records, region)]
+        reference = [sequence for number, sequence, _ in selected if number == 2]
+        if not reference:
+            reference = [sequence for _, _, sequence in read_records(fasta_path, {2}, region)]
+        if not reference:
+            raise ValueError(f"{fasta_path}: at least two records are needed, Sequence2 is the reference")
+        locus = None
+        reference = reference[0]
+        context = digest(hashlib.sha256(reference.encode()).hexdigest(), offset)
+
+    annotate_fingerprint = digest(module_fingerprint(translate), introns.LOCUS_FIELDS, with_introns)
+    parts = []
+    for number, sequence, frame in selected:
+        header = f"Sequence{number}"
+        part_key = digest("annotate", annotate_fingerprint, header, context,
+                          hashlib.sha256(sequence.encode()).hexdigest(), frame)
+        annotated = cache.table(part_key, lambda: _annotate_part(header, sequence, reference, locus, offset,
+                                                                 frame))
+        parts.append((header, annotated, part_key))
+    return parts
+
+
+def cached_chords(parts, cache, with_introns=False, scheme=None):
+    """Add chords to the parts of cached_annotation through ``cache``.
+
+    Returns (chord table, chord keys). The table holds the rows of
+    pipeline.chords (with the mappings.Scheme ``scheme``, when given); the
+    keys identify it for caching the rendered outputs.
+    """
+    chord_module = introns if with_introns else exon_chords
+    reference_header = "Sequence2" if with_introns else "Sequence1"  # the part the chord track follows
+    chords_fingerprint = digest(module_fingerprint(chord_module), module_fingerprint(mappings),
+                                scheme.digest if scheme else None)
+    add_chords = scheme.add_chords if scheme else chord_module.add_chords
+    chord_parts, keys = [], []
+    for header, annotated, part_key in parts:
+        chords_key = digest("chords", chords_fingerprint, part_key)
+        chord_parts.append((header, cache.table(chords_key, lambda: add_chords(annotated))))
+        keys.append(chords_key)
+
+    # add_chords puts the SequenceX rows after every sequence; rebuild that order from the parts
+    track = [table.select(table.equals("header", "SequenceX")) for header, table in chord_parts
+             if header == reference_header]
+    sequences = [table.select(~table.equals("header", "SequenceX")) for _, table in chord_parts]
+    return Table.concat(sequences + track), keys
+
+
+def cached_tables(fasta_path, cache, coordinates=None, scheme=None, records=None, region=None):
+    """Annotate and add chords to a FASTA file one part at a time through ``cache``.
+
+    Returns (annotated table, chord table, part keys); see cached_annotation
+    and cached_chords.
+    """
+    parts = cached_annotation(fasta_path, cache, coordinates, records, region)
+    chord_table, keys = cached_chords(parts, cache, bool(coordinates), scheme)
+    return Table.concat(annotated for _, annotated, _ in parts), chord_table, keys
@@ -0,0 +1,81 @@
+"""Amino acid chords and base pitches for the pipeline without introns.
+
+Every base gets a pitch from the chord of its amino acid, and a SequenceX
+chord track is derived from Sequence1.
+"""
+
+import functools
+
+from .columnar import Table, combine, constant
+
+# The amino acid -> chord, scale type and chord -> pitch tables are those of
+# the bundled blues scheme (schemes/blues.json), read on first use by default_scheme
+DEFAULT_SCHEME = "blues"
+
+CHORD_FIELDS = ["pitch", "amino_acid_chord", "scale_type"]
+
+
+@functools.lru_cache(maxsize=None)
+def default_scheme():
+    """The mappings.Scheme whose tables this stage uses unless given others.
+
+    Importing the module stays cheap: the scheme is read (from the
+    precompiled scheme cache) when first used, and then shared.
+    """
+    from . import mappings
+
+    return mappings.load_scheme(DEFAULT_SCHEME)
+
+
+def default_lookup():
+    """The precompiled mappings.Lookup of the default scheme."""
+    return default_scheme().lookup()
+
+
+def scale_type_of(amino_acid):
+    """Scale type of an amino acid's chord: blues, pentatonic, mixolydian, bebop or ""."""
+    return default_scheme().scale_types.get(amino_acid, "")
+
+
+def base_pitch(chord, base):
+    """Pitch of a base within the chord of its amino acid, or "" without one."""
+    chord_to_pitch_mapping = default_scheme().chord_to_pitch_mapping
+    if chord in chord_to_pitch_mapping:
+        return chord_to_pitch_mapping[chord].get(base.upper(), "")
+    return ""
+
+
+def chord_root(chord):
+    """Root pitch name of the SequenceX chord track: the chord without its qualities."""
+    # Strip all chord qualities from the chord
+    return chord.replace("7", "").replace("13", "").replace("-", "").replace("9", "") if chord else ""
+
+
+def add_chords(table, lookup=None):
+    """Return a copy of an annotation table with pitch, chord and scale columns.
+
+    The rows of Sequence1 are repeated under the SequenceX header to carry
+    the chord track, exactly as aminoacidchordsaddition.py writes them. The
+    new columns come from a mappings.Lookup (default_lookup unless one is
+    given, e.g. a Scheme's), applied to whole columns at once.
+    """
+    if lookup is None:
+        lookup = default_lookup()
+    pitches, chords, scales = lookup.apply(table.columns["codons"], table.columns["sequence"])
+    columns = dict(table.columns)
+    columns["pitch"] = pitches
+    columns["amino_acid_chord"] = chords
+    columns["scale_type"] = scales
+    table = Table(columns)
+
+    # Create new rows for the amino acid chord instrument using only Sequence1
+    track = table.select(table.equals("header", "Sequence1"))
+    n = len(track)
+    track.columns.update({
+        "header": constant("SequenceX", n),
+        "position": constant("", n),
+        "type": constant("", n),
+        "pitch": combine(lambda chord: chord_root(chord) + "4" if chord_root(chord) else "",
+                         track.columns["amino_acid_chord"]),
+    })
+    return Table.concat([table, track])
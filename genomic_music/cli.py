@@ -0,0 +1,300 @@
+"""Command line interface: ``python -m genomic_music <command> ...``."""
+
+import argparse
+import sys
+
+from . import pipeline
+
+
+def _stage_cache(args):
+    if not args.cache:
+        return None
+    from .cache import StageCache
+
+    return StageCache(args.cache, int(args.cache_size * 1e6))
+
+
+def _records(value):
+    # "1,3-5" -> {1, 3, 4, 5}
+    numbers = set()
+    try:
+        for item in value.split(","):
+            first, _, last = item.partition("-")
+            numbers.update(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected record numbers such as 1,3-5, not {value!r}") from None
+    if not numbers or min(numbers) < 1:
+        raise argparse.ArgumentTypeError("record numbers start at 1")
+    return numbers
+
+
+def _region(value):
+    # "START:END", 1-based and inclusive as in samtools, -> 0-based (start, end)
+    try:
+        start, end = (int(bound) for bound in value.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a region such as 1000:2500, not {value!r}") from None
+    if not 1 <= start <= end:
+        raise argparse.ArgumentTypeError("a region needs 1 <= START <= END")
+    return start - 1, end
+
+
+def _run_report(args, **info):
+    if not (args.report or args.profile or args.trace_memory):
+        return None
+    from .report import RunReport
+
+    return RunReport(profile=bool(args.profile), trace_memory=args.trace_memory, **info)
+
+
+def _finish_report(report, args):
+    if report is None:
+        return
+    report.finish()
+    for line in report.lines():
+        print(line)
+    report.errors.print_summary()
+    if args.report:
+        report.write(args.report)
+    if args.profile:
+        report.dump_profile(args.profile)
+
+
+def render(args):
+    cache = _stage_cache(args)
+    report = _run_report(args, command="render", fasta=args.fasta, coordinates=args.coordinates,
+                         scheme=args.scheme, backend=args.backend)
+    options = dict(
+        coordinates=args.coordinates,
+        musicxml=args.musicxml,
+        audio_file=args.audio,
+        annotated=args.annotated,
+        with_chords=args.chords,
+        backend=args.backend,
+        midi_file=args.midi,
+        workers=args.workers,
+        cache=cache,
+        records=args.records,
+        region=args.region,
+        report=report,
+        with_dynamics=args.dynamics,
+    )
+    if args.scheme and len(args.scheme) > 1:
+        outputs = pipeline.run_schemes(args.fasta, args.scheme, **options)
+        for name, paths in outputs.items():
+            print(f"{name}: {', '.join(paths.values())}")
+    else:
+        pipeline.run(args.fasta, scheme=args.scheme[0] if args.scheme else None, **options)
+    _finish_report(report, args)
+    if cache is not None:
+        print(cache.stats())
+
+
+def batch(args):
+    from .batch import discover_jobs, run_batch
+
+    try:
+        jobs = discover_jobs(args.source)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    summary = run_batch(
+        jobs,
+        args.output_dir,
+        workers=args.workers,
+        force=args.force,
+        summary_file=args.summary,
+        musicxml=not args.no_musicxml,
+        midi=args.midi,
+        audio=args.audio,
+        tables=args.tables,
+        backend=args.backend,
+        cache_dir=args.cache,
+        cache_size=int(args.cache_size * 1e6),
+        schemes=args.scheme,
+        reports=args.reports,
+    )
+    counts = summary["counts"]
+    print(f"{counts['done']} done, {counts['skipped']} skipped, {counts['failed']} failed in {summary['seconds']} s")
+    return 1 if counts["failed"] else 0
+
+
+def stream(args):
+    import asyncio
+
+    from . import stream as streaming
+
+    options = dict(coordinates=args.coordinates, format=args.format, realtime=args.realtime,
+                   tempo_bpm=args.tempo, window_codons=args.window, scheme=args.scheme)
+    if args.serve:
+        host, _, port = args.serve.rpartition(":")
+        try:
+            asyncio.run(streaming.serve(args.fasta, host or "127.0.0.1", int(port), **options))
+        except KeyboardInterrupt:
+            pass
+    else:
+        streaming.play(args.fasta, args.output, **options)
+
+
+def sections(args):
+    from .sections import write_sections
+
+    cache = _stage_cache(args)
+    manifest = write_sections(
+        args.fasta,
+        args.output_dir,
+        name=args.name,
+        coordinates=args.coordinates,
+        section_codons=args.codons,
+        musicxml=not args.no_musicxml,
+        midi=args.midi,
+        audio=args.audio,
+        backend=args.backend,
+        scheme=args.scheme,
+        records=args.records,
+        workers=args.workers,
+        cache=cache,
+        with_dynamics=args.dynamics,
+    )
+    print(manifest)
+    if cache is not None:
+        print(cache.stats())
+
+
+def schemes(args):
+    from . import mappings
+
+    if not args.check:
+        for name, path in mappings.available_schemes().items():
+            scheme = mappings.load_scheme(path)
+            print(f"{name:<20} {scheme.pipeline:<10} {scheme.description}")
+        return 0
+    status = 0
+    for path in args.check:
+        try:
+            scheme = mappings.read_scheme(mappings.scheme_path(path))
+        except (OSError, ValueError) as e:
+            problems = getattr(e, "problems", [str(e)])
+            print(f"{path}: {len(problems)} problem(s)")
+            for problem in problems:
+                print(f"  error: {problem}")
+            status = 1
+            continue
+        print(f"{path}: valid {scheme.pipeline} scheme")
+        for warning in scheme.warnings:
+            print(f"  warning: {warning}")
+    return status
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="genomic_music", description="Turn codon alignments into music.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    render_parser = subparsers.add_parser("render", help="Run the whole pipeline for one FASTA file.")
+    render_parser.add_argument("fasta", help="Aligned codon FASTA, or locus FASTA with --coordinates (optionally gzipped).")
+    render_parser.add_argument("--coordinates", help="CDS coordinates TSV; selects the pipeline with introns.")
+    render_parser.add_argument("--records", type=_records, metavar="N[,N-M...]",
+                               help="Only render these records (Sequence numbers, from 1).")
+    render_parser.add_argument("--region", type=_region, metavar="START:END",
+                               help="Only render these bases (1-based, inclusive, widened to whole codons). "
+                                    "Uncompressed FASTA files are read through a .fai index.")
+    render_parser.add_argument("--musicxml", help="Write the score to this MusicXML file.")
+    render_parser.add_argument("--midi", help="Write the notes to this MIDI file.")
+    render_parser.add_argument("--audio", help="Render the notes to this .wav file (.mp3/.flac need ffmpeg).")
+    render_parser.add_argument("--annotated", help="Also write the annotated table (.csv or .npz).")
+    render_parser.add_argument("--chords", help="Also write the table with chords (.csv or .npz).")
+    render_parser.add_argument("--backend", choices=["music21", "direct"], default="music21",
+                               help="Build a music21 Score (reference) or stream MusicXML directly.")
+    render_parser.add_argument("-j", "--workers", type=int,
+                               help="Processes for writing score parts and audio (default: number of CPUs).")
+    render_parser.add_argument("--cache", metavar="DIR", help="Reuse unchanged stage outputs from this cache directory.")
+    render_parser.add_argument("--cache-size", type=float, default=1024, metavar="MB",
+                               help="Largest size of the cache before old entries are evicted (default 1024).")
+    render_parser.add_argument("--scheme", action="append",
+                               help="Mapping scheme name or .json file (see the schemes command). Repeat it to "
+                                    "render every scheme from one annotation; each output gets the scheme's name.")
+    render_parser.add_argument("--dynamics", action="store_true",
+                               help="Accents and velocities from the conservation of each alignment column.")
+    render_parser.add_argument("--report", metavar="JSON", help="Write a report of every stage (time, memory, counts).")
+    render_parser.add_argument("--profile", metavar="FILE",
+                               help="Profile the stages with cProfile; the statistics go to FILE and the report.")
+    render_parser.add_argument("--trace-memory", action="store_true",
+                               help="Trace the peak Python memory of every stage with tracemalloc (slower).")
+    render_parser.set_defaults(func=render)
+
+    batch_parser = subparsers.add_parser("batch", help="Render many orthogroups in parallel.")
+    batch_parser.add_argument("source", help="Directory of FASTA files, or a CSV/TSV manifest with fasta[,name,coordinates] columns.")
+    batch_parser.add_argument("output_dir", help="Directory for the outputs of every job.")
+    batch_parser.add_argument("-j", "--workers", type=int, help="Worker processes (default: number of CPUs).")
+    batch_parser.add_argument("--force", action="store_true", help="Rerun jobs whose outputs are up to date.")
+    batch_parser.add_argument("--summary", help="Summary JSON path (default: OUTPUT_DIR/batch_summary.json).")
+    batch_parser.add_argument("--no-musicxml", action="store_true", help="Do not write MusicXML scores.")
+    batch_parser.add_argument("--midi", action="store_true", help="Also write MIDI files.")
+    batch_parser.add_argument("--audio", choices=["wav", "mp3", "flac"], help="Also render audio in this format.")
+    batch_parser.add_argument("--tables", choices=["csv", "npz"], help="Also keep the intermediate tables in this format.")
+    batch_parser.add_argument("--backend", choices=["music21", "direct"], default="music21",
+                              help="Build a music21 Score (reference) or stream MusicXML directly.")
+    batch_parser.add_argument("--cache", metavar="DIR", help="Reuse unchanged stage outputs from this cache directory.")
+    batch_parser.add_argument("--cache-size", type=float, default=1024, metavar="MB",
+                              help="Largest size of the cache before old entries are evicted (default 1024).")
+    batch_parser.add_argument("--scheme", action="append",
+                              help="Mapping scheme name or .json file. Repeat it to render every scheme from one "
+                                   "annotation of each job; each output gets the scheme's name.")
+    batch_parser.add_argument("--reports", action="store_true",
+                              help="Write a stage report per job (NAME_report.json) and add their totals to the summary.")
+    batch_parser.set_defaults(func=batch)
+
+    stream_parser = subparsers.add_parser("stream", help="Stream the notes while the alignment is processed.")
+    stream_parser.add_argument("fasta", help="Aligned codon FASTA, or locus FASTA with --coordinates (optionally gzipped).")
+    stream_parser.add_argument("--coordinates", help="CDS coordinates TSV; selects the pipeline with introns.")
+    stream_parser.add_argument("--format", choices=["wav", "pcm", "midi", "events"], default="wav",
+                               help="WAV or raw 16-bit PCM audio, MIDI (a MIDI file when writing a file) or JSON lines.")
+    stream_parser.add_argument("-o", "--output", default="-", help="Output file, or - for stdout (default).")
+    stream_parser.add_argument("--serve", metavar="[HOST:]PORT", help="Serve the stream to TCP clients instead.")
+    stream_parser.add_argument("--realtime", action=argparse.BooleanOptionalAction, default=None,
+                               help="Pace MIDI and JSON events in real time (default: unless writing a file).")
+    stream_parser.add_argument("--tempo", type=float, default=120, help="Tempo in quarter notes per minute.")
+    stream_parser.add_argument("--window", type=int, default=64, help="Codons processed per step.")
+    stream_parser.add_argument("--scheme", help="Mapping scheme name or .json file (see the schemes command).")
+    stream_parser.set_defaults(func=stream)
+
+    sections_parser = subparsers.add_parser("sections", help="Render a long FASTA file as fixed-size sections.")
+    sections_parser.add_argument("fasta", help="Aligned codon FASTA, or locus FASTA with --coordinates.")
+    sections_parser.add_argument("output_dir", help="Directory for the section files and their manifest.")
+    sections_parser.add_argument("--coordinates", help="CDS coordinates TSV; selects the pipeline with introns.")
+    sections_parser.add_argument("--name", help="Prefix of the output files (default: the FASTA file name).")
+    size = sections_parser.add_mutually_exclusive_group()
+    size.add_argument("--codons", type=int, default=256, help="Codons per section (default 256).")
+    size.add_argument("--measures", type=int, dest="codons",
+                      help="Measures per section; a 3/8 measure holds one codon of a sequence part.")
+    sections_parser.add_argument("--records", type=_records, metavar="N[,N-M...]",
+                                 help="Only render these records (Sequence numbers, from 1).")
+    sections_parser.add_argument("--no-musicxml", action="store_true", help="Do not write MusicXML sections.")
+    sections_parser.add_argument("--midi", action="store_true", help="Also write a MIDI file per section.")
+    sections_parser.add_argument("--audio", choices=["wav", "mp3", "flac"], help="Also render each section as audio.")
+    sections_parser.add_argument("--backend", choices=["music21", "direct"], default="direct",
+                                 help="Stream MusicXML directly (default) or build a music21 Score per section.")
+    sections_parser.add_argument("--scheme", help="Mapping scheme name or .json file (see the schemes command).")
+    sections_parser.add_argument("--dynamics", action="store_true",
+                                 help="Accents and velocities from the conservation of each alignment column.")
+    sections_parser.add_argument("-j", "--workers", type=int, help="Processes rendering sections (default: number of CPUs).")
+    sections_parser.add_argument("--cache", metavar="DIR", help="Reuse unchanged stage outputs from this cache directory.")
+    sections_parser.add_argument("--cache-size", type=float, default=1024, metavar="MB",
+                                 help="Largest size of the cache before old entries are evicted (default 1024).")
+    sections_parser.set_defaults(func=sections)
+
+    schemes_parser = subparsers.add_parser("schemes", help="List the mapping schemes, or check scheme files.")
+    schemes_parser.add_argument("--check", nargs="+", metavar="SCHEME",
+                                help="Validate these scheme names or .json files and print their problems.")
+    schemes_parser.set_defaults(func=schemes)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
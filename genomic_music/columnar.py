@@ -0,0 +1,416 @@
+"""Compact columnar tables for passing data between pipeline stages.
+
+Each stage used to write one CSV row per base and the next stage read it back
+with csv.DictReader. A table here is a set of named columns: integer columns
+are stored as NumPy arrays and every other column as a categorical (small
+integer codes plus the list of distinct strings). Tables are saved as
+compressed ``.npz`` files; ``.csv`` remains available as an export format.
+
+Whatever the storage, ``Table.rows()`` yields the same string dictionaries
+csv.DictReader would produce for the CSV export, so stages can switch format
+without changing their row handling.
+"""
+
+import csv
+import itertools
+
+import numpy as np
+
+# Rows converted to columns at a time when a table is built from rows
+ROW_CHUNK = 65536
+
+
+class Categorical:
+    """Integer codes into a list of distinct string categories."""
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def tolist(self):
+        categories = self.categories
+        return [categories[code] for code in self.codes.tolist()]
+
+    @classmethod
+    def from_values(cls, values):
+        """Intern a sequence of strings."""
+        builder = _CategoryBuilder()
+        builder.add(values)
+        return builder.build()
+
+    @classmethod
+    def from_codes(cls, codes, categories):
+        """Categorical of integer ``codes`` into ``categories``, stored in the smallest code type that fits."""
+        return cls(codes.astype(_code_dtype(len(categories))), categories)
+
+    def take(self, index):
+        """Categorical of the values at integer positions ``index`` (any shape)."""
+        return Categorical(self.codes[index], self.categories)
+
+    def isin(self, values):
+        """Boolean mask of the rows whose value is one of ``values``."""
+        selected = np.array([category in values for category in self.categories], dtype=bool)
+        return selected[self.codes] if len(selected) else np.zeros(len(self.codes), dtype=bool)
+
+
+def _code_dtype(n_categories):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_categories <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint64
+
+
+class _CategoryBuilder:
+    # Interns string values chunk by chunk so codes stay consistent across chunks
+    def __init__(self):
+        self.index = {}
+        self.chunks = []
+
+    def add(self, values):
+        index = self.index
+        codes = [index.setdefault(value, len(index)) for value in values]
+        self.chunks.append(np.asarray(codes, dtype=np.uint32))
+
+    def build(self):
+        codes = np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=np.uint32)
+        return Categorical.from_codes(codes, list(self.index))
+
+
+def as_categorical(values):
+    """Return a column as a Categorical; integer columns become their distinct values as strings."""
+    if isinstance(values, Categorical):
+        return values
+    unique, codes = np.unique(values, return_inverse=True)
+    return Categorical.from_codes(codes, [str(value) for value in unique.tolist()])
+
+
+def constant(value, n):
+    """A Categorical column repeating one string ``n`` times."""
+    return Categorical(np.zeros(n, dtype=np.uint8), [value])
+
+
+def index_codes(values, index, default, key=None):
+    """Position of each row's value in the dict ``index``, or ``default`` when absent.
+
+    ``key`` normalises a value (e.g. str.upper) before it is looked up; it is
+    applied once per distinct value.
+    """
+    values = as_categorical(values)
+    lookup = np.array([index.get(key(category) if key else category, default) for category in values.categories],
+                      dtype=np.intp)
+    return lookup[values.codes] if len(lookup) else np.zeros(len(values), dtype=np.intp)
+
+
+def combine(function, *columns):
+    """Categorical of ``function(value, ...)`` applied row by row to categorical columns.
+
+    The function is called once per distinct combination of values rather
+    than once per row, so it may be arbitrary Python.
+    """
+    columns = [as_categorical(values) for values in columns]
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    for values in columns:
+        key = key * max(len(values.categories), 1) + values.codes
+    unique, inverse = np.unique(key, return_inverse=True)
+    index = {}
+    result_codes = []
+    for combination in unique.tolist():
+        arguments = []
+        for values in reversed(columns):
+            combination, code = divmod(combination, max(len(values.categories), 1))
+            arguments.append(values.categories[code])
+        result_codes.append(index.setdefault(function(*reversed(arguments)), len(index)))
+    codes = np.asarray(result_codes, dtype=np.int64)[inverse] if result_codes else np.zeros(0, dtype=np.int64)
+    return Categorical.from_codes(codes, list(index))
+
+
+def _is_integer_array(values):
+    return isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.integer)
+
+
+def _as_values(values, n):
+    if isinstance(values, (str, int, float)):
+        return itertools.repeat(values, n)
+    if isinstance(values, np.ndarray):
+        return values.tolist()
+    return values
+
+
+def _as_strings(values, n):
+    # Scalars are broadcast to a constant column; everything is stored as str,
+    # which is what csv.DictReader hands back for the CSV export
+    if isinstance(values, (str, int, float)):
+        return itertools.repeat(str(values), n)
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    return (value if isinstance(value, str) else str(value) for value in values)
+
+
+class Table:
+    """Named columns of equal length, in field order."""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @property
+    def fieldnames(self):
+        return list(self.columns)
+
+    def __len__(self):
+        for values in self.columns.values():
+            return len(values)
+        return 0
+
+    def column(self, name):
+        """Return a column as a list of strings."""
+        values = self.columns[name]
+        if isinstance(values, Categorical):
+            return values.tolist()
+        return [str(value) for value in values.tolist()]
+
+    def rows(self):
+        """Yield each row as a dict of strings, like csv.DictReader."""
+        fieldnames = self.fieldnames
+        for chunk in self.chunks(fieldnames):
+            for values in zip(*(chunk[name] for name in fieldnames)):
+                yield dict(zip(fieldnames, values))
+
+    def chunks(self, names, chunk_size=ROW_CHUNK, mask=None):
+        """Yield {name: list of strings} for consecutive slices of rows.
+
+        Only one slice of each column is decoded at a time, so memory stays
+        bounded by ``chunk_size``. With a boolean ``mask``, only the selected
+        rows are returned.
+        """
+        for start in range(0, len(self), chunk_size):
+            stop = start + chunk_size
+            selected = None if mask is None else np.flatnonzero(mask[start:stop]) + start
+            chunk = {}
+            for name in names:
+                values = self.columns[name]
+                data = values.codes if isinstance(values, Categorical) else values
+                data = data[start:stop] if selected is None else data[selected]
+                if isinstance(values, Categorical):
+                    categories = values.categories
+                    chunk[name] = [categories[code] for code in data.tolist()]
+                else:
+                    chunk[name] = [str(value) for value in data.tolist()]
+            yield chunk
+
+    def distinct(self, name):
+        """Distinct values of a column in order of first appearance."""
+        values = self.columns[name]
+        data = values.codes if isinstance(values, Categorical) else values
+        unique, first = np.unique(data, return_index=True)
+        unique = unique[np.argsort(first)].tolist()
+        if isinstance(values, Categorical):
+            return [values.categories[code] for code in unique]
+        return [str(value) for value in unique]
+
+    def equals(self, name, value):
+        """Boolean mask of the rows whose ``name`` column equals the string ``value``."""
+        values = self.columns[name]
+        if isinstance(values, Categorical):
+            if value not in values.categories:
+                return np.zeros(len(values), dtype=bool)
+            return values.codes == values.categories.index(value)
+        return np.array([str(v) == value for v in values.tolist()], dtype=bool)
+
+    def select(self, mask):
+        """Return a table of the rows selected by a boolean ``mask``."""
+        columns = {}
+        for name, values in self.columns.items():
+            if isinstance(values, Categorical):
+                columns[name] = Categorical(values.codes[mask], values.categories)
+            else:
+                columns[name] = values[mask]
+        return Table(columns)
+
+    @classmethod
+    def concat(cls, tables):
+        """Stack tables with the same fields; categories are merged."""
+        tables = list(tables)
+        columns = {}
+        for name in (tables[0].fieldnames if tables else []):
+            parts = [table.columns[name] for table in tables]
+            if not any(isinstance(values, Categorical) for values in parts):
+                columns[name] = np.concatenate(parts)
+                continue
+            index = {}
+            codes = []
+            for values in parts:
+                values = as_categorical(values)
+                remap = np.array([index.setdefault(category, len(index)) for category in values.categories],
+                                 dtype=np.uint32)
+                codes.append(remap[values.codes] if len(remap) else np.zeros(0, dtype=np.uint32))
+            columns[name] = Categorical.from_codes(np.concatenate(codes), list(index))
+        return cls(columns)
+
+    @classmethod
+    def from_rows(cls, rows, fieldnames):
+        """Build a table from dict rows; missing keys become empty strings."""
+        with TableWriter(None, fieldnames) as writer:
+            writer.write_rows(rows)
+        return writer.table
+
+
+class TableWriter:
+    """Write a table in chunks to ``.csv`` or ``.npz``, chosen by extension.
+
+    CSV output is streamed as chunks arrive. NPZ output accumulates compact
+    column chunks and is written when the writer is closed. With ``path=None``
+    nothing is written and the finished table is available as ``.table``.
+    """
+
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.table = None
+        self._csvfile = None
+        if path is not None and not str(path).endswith(".npz"):
+            self._csvfile = open(path, "w", newline="")
+            self._writer = csv.writer(self._csvfile)
+            self._writer.writerow(self.fieldnames)
+        else:
+            self._integers = {name: [] for name in self.fieldnames}
+            self._strings = {name: None for name in self.fieldnames}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write_columns(self, columns):
+        """Append one chunk given as {field: list, array or scalar}."""
+        n = max((len(v) for v in columns.values() if not isinstance(v, (str, int, float))), default=0)
+        if self._csvfile is not None:
+            self._writer.writerows(zip(*(_as_values(columns[name], n) for name in self.fieldnames)))
+            return
+
+        for name in self.fieldnames:
+            values = columns[name]
+            if self._strings[name] is None and _is_integer_array(values):
+                self._integers[name].append(values.astype(np.int64))
+                continue
+            if self._strings[name] is None:
+                # Column turned out not to be purely integer; demote earlier chunks
+                self._strings[name] = _CategoryBuilder()
+                for chunk in self._integers.pop(name, []):
+                    self._strings[name].add(str(value) for value in chunk.tolist())
+                self._integers[name] = None
+            self._strings[name].add(_as_strings(values, n))
+
+    def write_rows(self, rows):
+        """Append dict rows, as csv.DictWriter.writerows would, ROW_CHUNK rows at a time."""
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, ROW_CHUNK))
+            if not chunk:
+                return
+            self.write_columns({name: [row.get(name, "") for row in chunk] for name in self.fieldnames})
+
+    def close(self):
+        if self._csvfile is not None:
+            self._csvfile.close()
+            self._csvfile = None
+            return
+        if self.table is not None:
+            return
+        columns = {}
+        for name in self.fieldnames:
+            if self._strings[name] is not None:
+                columns[name] = self._strings[name].build()
+            elif self._integers[name]:
+                columns[name] = np.concatenate(self._integers[name])
+            else:
+                columns[name] = Categorical(np.zeros(0, dtype=np.uint8), [])
+        self.table = Table(columns)
+        if self.path is not None:
+            save_npz(self.path, self.table)
+
+
+def save_npz(path, table):
+    arrays = {"__columns__": np.array(table.fieldnames)}
+    for name, values in table.columns.items():
+        if isinstance(values, Categorical):
+            arrays[f"{name}.codes"] = values.codes
+            arrays[f"{name}.categories"] = np.array(values.categories, dtype=str)
+        else:
+            arrays[name] = values
+    np.savez_compressed(path, **arrays)
+
+
+def load_npz(path):
+    columns = {}
+    with np.load(path, allow_pickle=False) as data:
+        for name in data["__columns__"].tolist():
+            if name in data.files:
+                columns[name] = data[name]
+            else:
+                columns[name] = Categorical(data[f"{name}.codes"], data[f"{name}.categories"].tolist())
+    return Table(columns)
+
+
+def _parse_integers(values):
+    # An int64 array when every value is an integer written as str(int) would write it, else the values
+    strings = np.asarray(values, dtype=str)
+    try:
+        integers = strings.astype(np.int64)
+    except (ValueError, OverflowError):
+        return values
+    if not np.array_equal(integers.astype(str), strings):
+        return values  # e.g. "007" or "+7", which would not be written back the same
+    return integers
+
+
+def read_table(path):
+    """Read a ``.npz`` or ``.csv`` table written by TableWriter.
+
+    CSV rows are read ROW_CHUNK at a time straight into columns; blank lines
+    are skipped and missing trailing fields are read as empty strings. A CSV
+    column whose values are all integers is stored as integers, as
+    TableWriter stores it; a column with any other value, blanks included,
+    is categorical.
+    """
+    if str(path).endswith(".npz"):
+        return load_npz(path)
+    with open(path, "r", newline="") as csvfile:
+        reader = csv.reader(csvfile)
+        fieldnames = next(reader, [])
+        width = len(fieldnames)
+        rows = (row for row in reader if row)
+        with TableWriter(None, fieldnames) as writer:
+            while True:
+                chunk = [row + [""] * (width - len(row)) for row in itertools.islice(rows, ROW_CHUNK)]
+                if not chunk:
+                    break
+                writer.write_columns({name: _parse_integers(values) for name, values in zip(fieldnames, zip(*chunk))})
+        return writer.table
+
+
+def write_table(path, table):
+    """Write a whole table to ``.npz`` or ``.csv``; CSV rows are decoded ROW_CHUNK at a time."""
+    if str(path).endswith(".npz"):
+        save_npz(path, table)
+        return
+    with TableWriter(path, table.fieldnames) as writer:
+        for chunk in table.chunks(table.fieldnames):
+            writer.write_columns(chunk)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a pipeline table between .npz and .csv.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    args = parser.parse_args(argv)
+    write_table(args.output, read_table(args.input))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Conservation- and variation-driven dynamics for the pipeline without introns.
+
+Every SequenceN record of an orthogroup alignment used to get the same
+eighth-note treatment. add_dynamics computes, for every alignment column,
+statistics over all the SequenceN records at once:
+
+    identity   fraction of the records carrying the column's most common base
+    entropy    Shannon entropy of the column's bases, gaps and other symbols (bits)
+    change     per row, "synonymous" or "nonsynonymous" where the base differs
+               from the column's consensus base, depending on whether the
+               amino acid differs from the column's consensus amino acid
+
+and turns them into dynamics. Notes are softer in conserved columns and
+louder in variable ones; a non-synonymous substitution is accented and
+played at the accent velocity. Each SequenceX chord is emphasised the same
+way from the columns of its Sequence1 codon: its velocity follows their
+mean variation, and only codons with a non-synonymous substitution in some
+record keep the accent. The MusicXML, MIDI and audio writers read the
+``emphasis`` and ``velocity`` columns in place of the fixed accent.
+
+Rows are grouped by column with np.bincount, so the pass is linear in the
+size of the alignment whatever the number of records.
+"""
+
+import numpy as np
+
+from .columnar import Categorical, Table, index_codes
+from .translate import amino_acid_codes, amino_acids
+
+DYNAMICS_FIELDS = ["identity", "entropy", "change", "emphasis", "velocity"]
+
+# Symbols counted per column: the four bases, gaps and anything else
+SYMBOLS = {"A": 0, "C": 1, "G": 2, "T": 3, "-": 4}
+OTHER_SYMBOL = 5
+N_SYMBOLS = 6
+
+CHANGES = ["", "synonymous", "nonsynonymous"]
+
+SOFT_VELOCITY = 56  # a column every record agrees on
+LOUD_VELOCITY = 100  # a column as varied as the records allow
+CODON_LIFT = 10  # added to the first base of every codon
+ACCENT_VELOCITY = 110  # non-synonymous substitutions, as midi.ACCENT_VELOCITY
+
+
+def _integers(values):
+    # Integer values of a column; the SequenceX rows of a chord table make positions categorical
+    if not isinstance(values, Categorical):
+        return np.asarray(values, dtype=np.int64)
+    lookup = np.array([int(value) if value else -1 for value in values.categories], dtype=np.int64)
+    return lookup[values.codes] if len(lookup) else np.zeros(len(values), dtype=np.int64)
+
+
+def _decimals(values, rows, digits=3):
+    # Categorical of floats rounded to ``digits`` at ``rows`` and "" elsewhere; strings are built per distinct value
+    unique, inverse = np.unique(np.round(values[rows], digits), return_inverse=True)
+    codes = np.full(len(values), len(unique), dtype=np.int64)
+    codes[rows] = inverse
+    categories = [f"{value:.{digits}f}" for value in unique.tolist()] + [""]
+    return Categorical.from_codes(codes, categories)
+
+
+def column_statistics(table):
+    """Per-column statistics of the SequenceN rows of an annotated or chord table.
+
+    Returns a dict of arrays: ``column`` (the column index of every row,
+    -1 for SequenceX rows), per-column ``identity``, ``entropy`` and
+    ``variation`` (entropy as a fraction of the most the records allow),
+    per-column ``nonsynonymous`` counts and per-row ``change`` codes into
+    CHANGES.
+    """
+    sequence_rows = ~table.equals("header", "SequenceX")
+    positions = _integers(table.columns["position"])
+    first = positions[sequence_rows].min() if sequence_rows.any() else 0
+    column = np.where(sequence_rows, positions - first, -1)
+    n_columns = int(column.max()) + 1 if len(column) and column.max() >= 0 else 1
+    rows = np.flatnonzero(sequence_rows)
+    row_column = column[rows]
+
+    symbol = index_codes(table.columns["sequence"], SYMBOLS, OTHER_SYMBOL, key=str.upper)[rows]
+    counts = np.bincount(row_column * N_SYMBOLS + symbol, minlength=n_columns * N_SYMBOLS)
+    counts = counts.reshape(n_columns, N_SYMBOLS)
+    records = counts.sum(axis=1)
+    present = np.maximum(records, 1)
+
+    base_counts = counts[:, :4]
+    identity = base_counts.max(axis=1) / present
+    p = counts / present[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # + 0.0 turns the -0.0 of a conserved column into 0.0, so it is not written as "-0.000"
+        entropy = -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=1) + 0.0
+    most = np.log2(np.minimum(records, N_SYMBOLS).clip(min=2))
+    variation = np.where(records > 1, entropy / most, 0.0)
+
+    # Consensus base and amino acid of every column; code 0 is "no amino acid"
+    consensus_base = np.where(base_counts.max(axis=1) > 0, base_counts.argmax(axis=1), -1)
+    amino_acid = index_codes(table.columns["codons"], amino_acid_codes, 0)[rows]
+    aa_counts = np.bincount(row_column * len(amino_acids) + amino_acid, minlength=n_columns * len(amino_acids))
+    aa_counts = aa_counts.reshape(n_columns, len(amino_acids))
+    aa_counts[:, 0] = 0
+    consensus_aa = np.where(aa_counts.max(axis=1) > 0, aa_counts.argmax(axis=1), 0)
+
+    substituted = (symbol < 4) & (consensus_base[row_column] >= 0) & (symbol != consensus_base[row_column])
+    coding = (amino_acid != 0) & (consensus_aa[row_column] != 0)
+    same_aa = amino_acid == consensus_aa[row_column]
+    change = np.zeros(len(table), dtype=np.uint8)
+    change[rows[substituted & coding & same_aa]] = 1
+    change[rows[substituted & coding & ~same_aa]] = 2
+
+    return {
+        "column": column,
+        "identity": identity,
+        "entropy": entropy,
+        "variation": variation,
+        "nonsynonymous": np.bincount(column[change == 2], minlength=n_columns),
+        "change": change,
+    }
+
+
+def add_dynamics(table):
+    """Return a copy of a chord table with the columns of DYNAMICS_FIELDS.
+
+    ``emphasis`` is "accent" for the notes and chords to accent and
+    ``velocity`` a MIDI velocity for every row. SequenceX rows are matched
+    to the Sequence1 rows they were copied from, in order.
+    """
+    stats = column_statistics(table)
+    column = stats["column"]
+    sequence_rows = column >= 0
+    change = stats["change"]
+    codon_start = table.equals("accent", "accent")
+
+    safe_column = np.where(sequence_rows, column, 0)
+    variation = np.where(sequence_rows, stats["variation"][safe_column], 0.0)
+    velocity = SOFT_VELOCITY + (LOUD_VELOCITY - SOFT_VELOCITY) * variation + CODON_LIFT * codon_start
+    velocity = np.where(change == 2, ACCENT_VELOCITY, velocity)
+    emphasis = change == 2
+
+    # A chord covers the columns of one Sequence1 codon: from its first base to the next codon's
+    track = np.flatnonzero(table.equals("header", "SequenceX"))
+    reference = np.flatnonzero(table.equals("header", "Sequence1"))
+    if len(track) and len(track) == len(reference):
+        starts = np.flatnonzero(codon_start[reference])
+        if len(starts):
+            codon_columns = safe_column[reference]
+            lengths = np.diff(np.append(starts, len(reference)))
+            mean_variation = np.add.reduceat(stats["variation"][codon_columns], starts) / lengths
+            changed = np.add.reduceat(stats["nonsynonymous"][codon_columns], starts) > 0
+            chords = track[starts]
+            velocity[chords] = np.where(changed, ACCENT_VELOCITY,
+                                        SOFT_VELOCITY + (LOUD_VELOCITY - SOFT_VELOCITY) * mean_variation)
+            emphasis[chords] = changed
+
+    columns = dict(table.columns)
+    columns["identity"] = _decimals(stats["identity"][safe_column], sequence_rows)
+    columns["entropy"] = _decimals(stats["entropy"][safe_column], sequence_rows)
+    columns["change"] = Categorical(change, list(CHANGES))
+    columns["emphasis"] = Categorical(emphasis.astype(np.uint8), ["", "accent"])
+    columns["velocity"] = np.rint(velocity).clip(1, 127).astype(np.int64)
+    return Table(columns)
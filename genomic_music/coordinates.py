@@ -0,0 +1,69 @@
+"""CDS coordinates and exon/intron lookup."""
+
+import bisect
+
+import numpy as np
+
+
+class CDSIndex:
+    """Sorted, merged CDS intervals answering position lookups in O(log n).
+
+    Intervals are inclusive on both ends, like the start/end columns of
+    gene_and_cds_coordinates.tsv. Overlapping regions are merged once when the
+    index is built so each lookup is a single binary search.
+    """
+
+    def __init__(self, regions):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(regions):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __contains__(self, position):
+        i = bisect.bisect_right(self.starts, position) - 1
+        return i >= 0 and position <= self.ends[i]
+
+    def position_type(self, position):
+        return "exon" if position in self else "intron"
+
+    def mask(self, positions):
+        """Return a boolean array marking which of ``positions`` are exonic."""
+        positions = np.asarray(positions)
+        i = np.searchsorted(self.starts, positions, side="right") - 1
+        ends = np.asarray(self.ends + [0])
+        return (i >= 0) & (positions <= ends[i])
+
+
+def read_cds_coordinates(path):
+    """Read gene_and_cds_coordinates.tsv into (cds_regions, start_offset).
+
+    The header line is skipped. Rows with more than four columns and a "CDS"
+    column contribute an inclusive (start, end) region, and the start of the
+    first data row is the locus offset. Rows whose positions are not
+    integers are skipped.
+    """
+    cds_regions = []
+    start_offset = None
+    with open(path, "r") as cds_file:
+        for line_num, line in enumerate(cds_file):
+            if line_num == 0:
+                continue  # Skip header line
+            parts = line.strip().split('\t')
+            if len(parts) > 4 and "CDS" in parts:
+                try:
+                    cds_regions.append((int(parts[1]), int(parts[2])))
+                except ValueError:
+                    pass
+            if start_offset is None and len(parts) > 1:
+                try:
+                    start_offset = int(parts[1])  # Use the first start position as the offset
+                except ValueError:
+                    pass
+    return cds_regions, start_offset
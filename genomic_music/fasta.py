@@ -0,0 +1,228 @@
+"""Streaming and indexed FASTA reading.
+
+read_fasta streams every record. For large uncompressed files, a
+samtools-compatible ``.fai`` index and IndexedFasta give random access to
+any record and region through a memory map, so only the bytes that are
+sliced are read; read_records picks between the two.
+"""
+
+import gzip
+import mmap
+import os
+
+
+def open_text(path):
+    # Open plain or gzip-compressed text files transparently
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt")
+    return open(path, "r")
+
+
+def read_fasta(path, upper=False):
+    """Yield (header, sequence) records from a FASTA file one at a time.
+
+    Sequences are joined from their lines once per record instead of being
+    grown by repeated concatenation, so only the current record is held in
+    memory. Records without any sequence lines are skipped, matching the
+    original scripts. Gzip input is detected automatically.
+    """
+    with open_text(path) as f:
+        header = ""
+        chunks = []
+        for line in f:
+            if line.startswith(">"):
+                if chunks:
+                    yield header, _join(chunks, upper)
+                    chunks = []
+                header = line[1:].strip()
+            else:
+                stripped_line = line.strip()
+                if stripped_line:
+                    chunks.append(stripped_line)
+        if chunks:
+            yield header, _join(chunks, upper)
+
+
+def _join(chunks, upper):
+    sequence = "".join(chunks)
+    return sequence.upper() if upper else sequence
+
+
+class FaiRecord:
+    """One line of a ``.fai`` index: where a record's bases are and how they are wrapped."""
+
+    __slots__ = ("name", "length", "offset", "line_bases", "line_width")
+
+    def __init__(self, name, length, offset, line_bases, line_width):
+        self.name = name
+        self.length = length
+        self.offset = offset  # byte offset of the first base
+        self.line_bases = line_bases
+        self.line_width = line_width  # bytes per line, newline included
+
+    def byte_offset(self, position):
+        """File offset of the base at 0-based ``position``."""
+        if not self.line_bases:
+            return self.offset
+        line, column = divmod(position, self.line_bases)
+        return self.offset + line * self.line_width + column
+
+
+def build_index(path):
+    """Scan an uncompressed FASTA file and return its list of FaiRecord.
+
+    As with samtools faidx, every line of a record but the last must hold
+    the same number of bases; a ValueError is raised otherwise, and for
+    gzip-compressed files.
+    """
+    index = []
+    with open(path, "rb") as f:
+        if f.read(2) == b"\x1f\x8b":
+            raise ValueError(f"{path}: gzip-compressed FASTA files cannot be indexed")
+        f.seek(0)
+        record = None
+        ended = False  # a shorter or blank line was seen, so the record's lines must be over
+        offset = 0
+        for line in f:
+            width = len(line)
+            if line.startswith(b">"):
+                name = line[1:].split(maxsplit=1)
+                record = FaiRecord(name[0].decode() if name else "", 0, offset + width, 0, 0)
+                index.append(record)
+                ended = False
+            elif record is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if bases and (ended or (record.line_bases and bases > record.line_bases)):
+                    raise ValueError(f"{path}: record {record.name!r} has lines of different lengths "
+                                     "and cannot be indexed")
+                if not bases:
+                    ended = True
+                elif not record.line_bases:
+                    record.line_bases, record.line_width = bases, width
+                elif bases < record.line_bases or width - bases != record.line_width - record.line_bases:
+                    ended = True
+                record.length += bases
+            offset += width
+    return index
+
+
+def write_index(fai_path, index):
+    with open(fai_path, "w") as f:
+        for record in index:
+            f.write(f"{record.name}\t{record.length}\t{record.offset}\t{record.line_bases}\t{record.line_width}\n")
+
+
+def read_index(fai_path):
+    index = []
+    with open(fai_path) as f:
+        for line in f:
+            name, length, offset, line_bases, line_width = line.rstrip("\n").split("\t")[:5]
+            index.append(FaiRecord(name, int(length), int(offset), int(line_bases), int(line_width)))
+    return index
+
+
+def fasta_index(path):
+    """The index of ``path`` from ``path.fai`` when it is up to date; otherwise built and saved there."""
+    fai_path = path + ".fai"
+    try:
+        if os.path.getmtime(fai_path) >= os.path.getmtime(path):
+            return read_index(fai_path)
+    except OSError:
+        pass
+    index = build_index(path)
+    try:
+        write_index(fai_path, index)
+    except OSError:
+        pass  # a read-only directory only means indexing again next time
+    return index
+
+
+class IndexedFasta:
+    """Random access to the records of an uncompressed, indexed FASTA file through a memory map."""
+
+    def __init__(self, path, index=None):
+        self.path = path
+        self.index = fasta_index(path) if index is None else index
+        self._by_name = {record.name: record for record in self.index}
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.index else b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def record(self, key):
+        """The FaiRecord at position ``key`` of the index, or named ``key``."""
+        return self.index[key] if isinstance(key, int) else self._by_name[key]
+
+    def fetch(self, key, start=0, end=None, upper=False):
+        """Bases ``start`` to ``end`` (0-based, end excluded) of a record, reading only those bytes."""
+        record = self.record(key)
+        end = record.length if end is None else max(0, min(end, record.length))
+        start = max(0, min(start, end))
+        data = self._map[record.byte_offset(start):record.byte_offset(end)]
+        sequence = data.replace(b"\n", b"").replace(b"\r", b"").decode("ascii")
+        return sequence.upper() if upper else sequence
+
+
+def _record_name(header):
+    # The name a .fai index gives a record: its header up to the first whitespace
+    words = header.split(maxsplit=1)
+    return words[0] if words else ""
+
+
+def read_records(path, numbers=None, region=None, upper=False):
+    """Yield (number, name, sequence) for the records of a FASTA file.
+
+    Records are numbered from 1 in file order, skipping empty ones as
+    read_fasta does. ``numbers`` (a set) keeps only those records and
+    ``region`` (0-based start, end) cuts every sequence to that slice. With
+    either, an uncompressed file is read through its ``.fai`` index (built
+    when missing) and only the selected bytes are touched; other files are
+    streamed and filtered. Whichever way the file is read, ``name`` is the
+    header up to its first whitespace, the name the ``.fai`` index keeps.
+    """
+    start, end = region if region else (0, None)
+    if numbers is None and region is None:
+        for number, (header, sequence) in enumerate(read_fasta(path, upper), start=1):
+            yield number, _record_name(header), sequence
+        return
+    try:
+        indexed = IndexedFasta(path)
+    except ValueError:
+        indexed = None  # compressed, or wrapped irregularly
+    if indexed is None:
+        for number, (header, sequence) in enumerate(read_fasta(path, upper), start=1):
+            if numbers is None or number in numbers:
+                yield number, _record_name(header), sequence[start:end]
+        return
+    with indexed:
+        positions = [i for i, record in enumerate(indexed.index) if record.length]
+        for number, position in enumerate(positions, start=1):
+            if numbers is None or number in numbers:
+                yield number, indexed.index[position].name, indexed.fetch(position, start, end, upper)
+
+
+def record_lengths(path):
+    """Number of bases of every record, in the numbering of read_records.
+
+    Uncompressed files are measured from their ``.fai`` index; others are
+    streamed one record at a time.
+    """
+    try:
+        index = fasta_index(path)
+    except ValueError:
+        return [len(sequence) for _, sequence in read_fasta(path)]
+    return [record.length for record in index if record.length]
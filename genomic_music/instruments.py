@@ -0,0 +1,59 @@
+"""Instrument of every part, shared by the music21 score and the direct writers.
+
+Instruments are named after their music21.instrument classes. The direct
+MusicXML, MIDI and streaming writers only need an instrument's name and
+General MIDI program, which are listed here so they never import music21;
+an instrument missing from PROGRAMS is looked up in music21 once.
+"""
+
+# Define the instrument mapping for each sequence
+species_instruments = {
+    "Sequence1": "Piano",
+    "Sequence2": "Piano",
+    "Sequence3": "Piano",
+    "Sequence4": "Piano",
+    "Sequence5": "Piano",
+    "Sequence6": "Piano",
+    "Sequence7": "Piano",
+    "Sequence8": "Piano",
+    "SequenceX": "Piano",
+}
+
+default_instrument = "Piano"
+
+# (instrument name, General MIDI program) of the music21 instrument classes
+PROGRAMS = {
+    "Piano": ("Piano", 0),
+    "Harpsichord": ("Harpsichord", 6),
+    "Celesta": ("Celesta", 8),
+    "Vibraphone": ("Vibraphone", 11),
+    "Marimba": ("Marimba", 12),
+    "Organ": ("Organ", 19),
+    "AcousticGuitar": ("Acoustic Guitar", 24),
+    "Violin": ("Violin", 40),
+    "Viola": ("Viola", 41),
+    "Violoncello": ("Violoncello", 42),
+    "Contrabass": ("Contrabass", 43),
+    "Harp": ("Harp", 46),
+    "Trumpet": ("Trumpet", 56),
+    "Horn": ("Horn", 60),
+    "Oboe": ("Oboe", 68),
+    "Clarinet": ("Clarinet", 71),
+    "Flute": ("Flute", 73),
+}
+
+
+def instrument_class(header):
+    """Name of the music21.instrument class that plays the part ``header``."""
+    return species_instruments.get(header, default_instrument)
+
+
+def instrument_program(header):
+    """(instrument name, General MIDI program) of the part ``header``."""
+    name = instrument_class(header)
+    if name not in PROGRAMS:
+        from music21 import instrument
+
+        instrument_obj = getattr(instrument, name)()
+        PROGRAMS[name] = (instrument_obj.instrumentName or header, instrument_obj.midiProgram or 0)
+    return PROGRAMS[name]
@@ -0,0 +1,125 @@
+"""Stages of the pipeline with introns.
+
+fastocodoncsv.py annotates a genomic locus against CDS coordinates and
+aminoacidchord.py adds circle-of-fifths chords, intron pitches and a
+SequenceX chord track derived from Sequence2.
+"""
+
+import functools
+
+from .columnar import Categorical, Table, as_categorical, combine, constant
+from .fasta import read_records
+from .translate import annotate_locus, codon_region
+
+# Columns of the annotation table written by fastocodoncsv.py
+LOCUS_FIELDS = ["header", "position", "sequence", "type", "codons"]
+
+# The amino acid -> chord, chord -> pitch and intron pitch tables are those of the bundled
+# circle-of-fifths scheme (schemes/circle_of_fifths.json), read on first use by default_scheme
+DEFAULT_SCHEME = "circle_of_fifths"
+
+CHORD_FIELDS = ["pitch", "amino_acid_chord", "accent"]
+
+
+@functools.lru_cache(maxsize=None)
+def default_scheme():
+    """The mappings.Scheme whose tables this stage uses unless given others.
+
+    As in chords.default_scheme, it is read when first used, so the
+    annotation stage can be imported without it.
+    """
+    from . import mappings
+
+    return mappings.load_scheme(DEFAULT_SCHEME)
+
+
+def default_lookup():
+    """The precompiled mappings.Lookup of the default scheme."""
+    return default_scheme().lookup()
+
+
+def annotate_locus_fasta(fasta_path, start_offset, cds_index, writer, records=None, region=None):
+    """Annotate every record of a locus FASTA file into a TableWriter.
+
+    Records are named Sequence1, Sequence2, ... in file order; bases are
+    upper-cased and every complete codon is classified against ``cds_index``.
+    ``records`` (a set of record numbers) and ``region`` (0-based start, end
+    within the locus, widened to whole codons) restrict the output; see
+    fasta.read_records.
+    """
+    region = codon_region(region)
+    offset = region[0] if region else 0
+    for number, _, sequence in read_records(fasta_path, records, region, upper=True):
+        annotation = annotate_locus(sequence, start_offset + offset, cds_index)
+        writer.write_columns(locus_columns(f"Sequence{number}", annotation))
+
+
+def locus_columns(header, annotation):
+    """Columns of the fastocodoncsv.py table for one annotated record."""
+    return {
+        "header": header,
+        "position": annotation.position,
+        "sequence": annotation.bases(),
+        "type": annotation.types(),
+        "codons": annotation.amino_acid_labels(),
+    }
+
+
+def base_pitch(chord, base, row_type):
+    """Pitch of a base: from the intron mapping in introns, else from its amino acid's chord."""
+    scheme = default_scheme()
+    # Assign pitch for intron segments if type is intron
+    if row_type.strip().lower() == "intron":
+        return scheme.intron_pitch_mapping.get(base.upper(), "")
+    if chord in scheme.chord_to_pitch_mapping:
+        return scheme.chord_to_pitch_mapping[chord].get(base.upper(), "")
+    return ""
+
+
+def chord_root(chord):
+    """Root pitch name of a circle-of-fifths chord."""
+    return chord.rstrip('m').rstrip('dim').rstrip('aug')  # Remove chord suffixes correctly
+
+
+def _track_kind(codon, row_type):
+    # Which Sequence2 rows the chord track repeats, and how
+    row_type = row_type.strip().lower()
+    if codon.strip() and row_type == "exon":
+        return "exon"
+    return "intron" if row_type == "intron" else ""
+
+
+def add_chords(table, lookup=None):
+    """Return a copy of a locus table with pitch, chord and accent columns.
+
+    Exonic Sequence2 rows with an amino acid, and all intronic Sequence2
+    rows, are repeated under the SequenceX header to carry the chord track,
+    exactly as aminoacidchord.py writes them. Pitches and chords come from a
+    mappings.Lookup (default_lookup unless one is given, e.g. a Scheme's),
+    applied to whole columns at once.
+    """
+    if lookup is None:
+        lookup = default_lookup()
+    codons = as_categorical(table.columns["codons"])
+    types = as_categorical(table.columns["type"])
+    pitches, chords, _ = lookup.apply(codons, table.columns["sequence"], types)
+    columns = dict(table.columns)
+    columns["pitch"] = pitches
+    columns["amino_acid_chord"] = chords
+    columns["accent"] = constant("", len(table))
+    table = Table(columns)
+
+    # Create new rows for the amino acid chord instrument using only Sequence2;
+    # exon rows carry the chord's root, intron rows are empty
+    kind = combine(_track_kind, codons, types)
+    selected = table.equals("header", "Sequence2") & kind.isin(("exon", "intron"))
+    track = table.select(selected)
+    track_chords = combine(lambda chord, kind: chord if kind == "exon" else "",
+                           track.columns["amino_acid_chord"], Categorical(kind.codes[selected], kind.categories))
+    n = len(track)
+    track.columns.update({
+        "header": constant("SequenceX", n),
+        "pitch": combine(lambda chord: chord_root(chord) + "2" if chord_root(chord) else "", track_chords),
+        "amino_acid_chord": track_chords,
+    })
+    return Table.concat([table, track])
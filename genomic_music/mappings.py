@@ -0,0 +1,412 @@
+"""Mapping schemes: amino acid chords and base pitches loaded from JSON files.
+
+A scheme file holds the tables of one chord stage (see schemes/*.json)::
+
+    {
+      "pipeline": "alignment",
+      "description": "...",
+      "groups": {"non_polar": {"scale_type": "blues", "chords": {"A": "C7", ...}}, ...},
+      "pitches": {"C7": {"A": "C4", "T": "D4", "C": "E4", "G": "F4"}, ...},
+      "intron_pitches": {"A": "A4", "T": "E4", "C": "C4", "G": "G4"}
+    }
+
+``pipeline`` is "alignment" for the pipeline without introns (chords.py),
+where each group's scale type voices the SequenceX chord track, or "locus"
+for the pipeline with introns (introns.py), which also needs
+``intron_pitches``. Every amino acid is in exactly one group.
+
+A scheme is rejected when it has duplicate keys, an amino acid in two
+groups or in none, a chord without pitches, a pitch mapping missing a base,
+or a malformed pitch name. A valid scheme is compiled into a Lookup of dense
+arrays and the result is stored in a cache directory, keyed by a digest of
+the file, so later processes load an unchanged scheme without parsing or
+validating it again. Within a process each scheme is loaded once.
+
+Schemes are found by name (the file name without .json) in the directories
+listed in GENOMIC_MUSIC_SCHEMES, then in the bundled schemes directory; a
+path to a .json file can be given instead of a name.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zipfile
+
+import numpy as np
+
+from .columnar import Categorical, index_codes
+
+_bundled_schemes = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemes")
+COMPILED_VERSION = 1
+
+PIPELINES = ("alignment", "locus")
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+BASES = "ACGT"
+
+_pitch_pattern = re.compile(r"^[A-G][#\-]*\d+$")
+_chord_pattern = re.compile(r"^[A-G]")
+
+# Schemes added with register_scheme, and the schemes loaded by this process
+_registered = {}
+_loaded = {}
+
+
+class SchemeError(ValueError):
+    """A scheme file that cannot be used; ``problems`` lists everything wrong with it."""
+
+    def __init__(self, path, problems):
+        super().__init__(f"{path}: " + "; ".join(problems))
+        self.path = path
+        self.problems = problems
+
+
+class Lookup:
+    """Chord and scale type of every amino acid and pitch of every (amino acid, base, intron) triple.
+
+    Rows are indexed by amino acid and columns by base; a last index on each
+    axis stands for any other value, which maps to empty strings. The intron
+    axis is only used by the pipeline with introns.
+    """
+
+    def __init__(self, amino_acids, bases, chords, scale_types, pitches):
+        self.amino_acid_index = {amino_acid: i for i, amino_acid in enumerate(amino_acids)}
+        self.base_index = {base: i for i, base in enumerate(bases)}
+        self.chords = chords
+        self.scale_types = scale_types
+        self.pitches = pitches
+
+    @classmethod
+    def compile(cls, amino_acid_to_chord, chord_to_pitch_mapping, scale_types=None, intron_pitch_mapping=None):
+        """Compile dict tables into dense arrays."""
+        scale_types = scale_types or {}
+        intron_pitch_mapping = intron_pitch_mapping or {}
+        amino_acids = sorted(set(amino_acid_to_chord) | set(scale_types))
+        bases = sorted({base for mapping in chord_to_pitch_mapping.values() for base in mapping}
+                       | set(intron_pitch_mapping))
+
+        chords = [amino_acid_to_chord.get(amino_acid, "") for amino_acid in amino_acids] + [""]
+        pitches = []
+        for chord in chords:
+            mapping = chord_to_pitch_mapping.get(chord, {})
+            for base in bases + [""]:
+                pitches += [mapping.get(base, ""), intron_pitch_mapping.get(base, "")]
+        pitches = Categorical.from_values(pitches)
+        return cls(
+            amino_acids,
+            bases,
+            Categorical.from_values(chords),
+            Categorical.from_values([scale_types.get(amino_acid, "") for amino_acid in amino_acids] + [""]),
+            Categorical(pitches.codes.reshape(len(chords), len(bases) + 1, 2), pitches.categories),
+        )
+
+    def apply(self, codons, sequence, types=None):
+        """Return the (pitch, chord, scale type) columns for codon, base and, optionally, type columns."""
+        amino_acid = index_codes(codons, self.amino_acid_index, len(self.amino_acid_index), key=str.strip)
+        base = index_codes(sequence, self.base_index, len(self.base_index), key=str.upper)
+        if types is None:
+            intron = np.zeros(len(base), dtype=np.intp)
+        else:
+            intron = index_codes(types, {"intron": 1}, 0, key=lambda row_type: row_type.strip().lower())
+        return (self.pitches.take((amino_acid, base, intron)), self.chords.take(amino_acid),
+                self.scale_types.take(amino_acid))
+
+    def arrays(self):
+        """The lookup as named NumPy arrays, for saving with np.savez."""
+        arrays = {"amino_acids": np.array(list(self.amino_acid_index), dtype=str),
+                  "bases": np.array(list(self.base_index), dtype=str)}
+        for name in ("chords", "scale_types", "pitches"):
+            values = getattr(self, name)
+            arrays[f"{name}.codes"] = values.codes
+            arrays[f"{name}.categories"] = np.array(values.categories, dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        columns = [Categorical(arrays[f"{name}.codes"], arrays[f"{name}.categories"].tolist())
+                   for name in ("chords", "scale_types", "pitches")]
+        return cls(arrays["amino_acids"].tolist(), arrays["bases"].tolist(), *columns)
+
+
+class Scheme:
+    """The validated tables of one mapping scheme and their compiled Lookup."""
+
+    def __init__(self, name, pipeline, amino_acid_to_chord, chord_to_pitch_mapping, scale_types=None,
+                 intron_pitch_mapping=None, description="", warnings=(), digest="", lookup=None):
+        self.name = name
+        self.pipeline = pipeline
+        self.amino_acid_to_chord = amino_acid_to_chord
+        self.chord_to_pitch_mapping = chord_to_pitch_mapping
+        self.scale_types = scale_types or {}
+        self.intron_pitch_mapping = intron_pitch_mapping or {}
+        self.description = description
+        self.warnings = list(warnings)
+        self.digest = digest
+        self._lookup = lookup
+
+    @property
+    def with_introns(self):
+        return self.pipeline == "locus"
+
+    def lookup(self):
+        """The compiled Lookup, built on first use."""
+        if self._lookup is None:
+            self._lookup = Lookup.compile(self.amino_acid_to_chord, self.chord_to_pitch_mapping,
+                                          self.scale_types, self.intron_pitch_mapping)
+        return self._lookup
+
+    def add_chords(self, table):
+        """Add the pitch and chord columns and the SequenceX track with this scheme's tables."""
+        from . import chords, introns
+
+        return (introns if self.with_introns else chords).add_chords(table, self.lookup())
+
+    def tables(self):
+        return {
+            "pipeline": self.pipeline,
+            "description": self.description,
+            "warnings": self.warnings,
+            "amino_acid_to_chord": self.amino_acid_to_chord,
+            "chord_to_pitch_mapping": self.chord_to_pitch_mapping,
+            "scale_types": self.scale_types,
+            "intron_pitch_mapping": self.intron_pitch_mapping,
+        }
+
+
+def _check_pitches(label, mapping):
+    # Problems with a base -> pitch mapping
+    if not isinstance(mapping, dict):
+        return [f"{label} must map the bases {', '.join(BASES)} to pitches"]
+    problems = [f"{label} has no pitch for {base}" for base in BASES if base not in mapping]
+    for base, pitch in mapping.items():
+        if base not in BASES:
+            problems.append(f"{label}: {base!r} is not a base")
+        elif not isinstance(pitch, str) or not _pitch_pattern.match(pitch):
+            problems.append(f"{label}: {pitch!r} is not a pitch such as C4, E-4 or F#3")
+    return problems
+
+
+def validate(data, path="<scheme>", problems=()):
+    """Check the decoded JSON of a scheme file and return its Scheme.
+
+    Raises SchemeError listing every problem found, including any passed
+    in ``problems`` (such as duplicate keys found while decoding).
+    """
+    from .voicings import scale_type_intervals
+
+    problems = list(problems)
+    warnings = []
+    if not isinstance(data, dict):
+        raise SchemeError(path, problems + ["a scheme must be a JSON object"])
+
+    pipeline = data.get("pipeline")
+    if pipeline not in PIPELINES:
+        problems.append(f"pipeline must be one of {', '.join(PIPELINES)}, not {pipeline!r}")
+
+    amino_acid_to_chord, scale_types, owners = {}, {}, {}
+    groups = data.get("groups")
+    if not isinstance(groups, dict) or not groups:
+        problems.append("no amino acid groups")
+        groups = {}
+    for group, entry in groups.items():
+        chords = entry.get("chords") if isinstance(entry, dict) else None
+        if not isinstance(chords, dict):
+            problems.append(f"group {group!r} has no chords")
+            continue
+        scale_type = entry.get("scale_type", "")
+        if pipeline == "alignment" and scale_type not in scale_type_intervals:
+            problems.append(f"group {group!r}: scale type {scale_type!r} is not one of "
+                            f"{', '.join(scale_type_intervals)}")
+        for amino_acid, chord in chords.items():
+            if amino_acid not in AMINO_ACIDS or len(amino_acid) != 1:
+                problems.append(f"group {group!r}: {amino_acid!r} is not an amino acid")
+                continue
+            if amino_acid in owners:
+                problems.append(f"{amino_acid} is in both groups {owners[amino_acid]!r} and {group!r}")
+                continue
+            if not isinstance(chord, str) or not _chord_pattern.match(chord):
+                problems.append(f"group {group!r}: {chord!r} is not a chord name")
+                continue
+            owners[amino_acid] = group
+            amino_acid_to_chord[amino_acid] = chord
+            if pipeline == "alignment":
+                scale_types[amino_acid] = scale_type
+    missing = [amino_acid for amino_acid in AMINO_ACIDS if amino_acid not in owners]
+    if missing:
+        problems.append(f"no chord for {', '.join(missing)}")
+
+    pitches = data.get("pitches")
+    if not isinstance(pitches, dict):
+        problems.append("no chord pitches")
+        pitches = {}
+    for chord, mapping in pitches.items():
+        problems += _check_pitches(f"pitches of {chord}", mapping)
+    used = sorted(set(amino_acid_to_chord.values()))
+    problems += [f"chord {chord!r} has no pitches" for chord in used if chord not in pitches]
+    unused = [chord for chord in pitches if chord not in used]
+    if unused:
+        warnings.append(f"pitches of unused chords: {', '.join(unused)}")
+    for chord in used:
+        sharing = sorted({owners[amino_acid] for amino_acid, other in amino_acid_to_chord.items() if other == chord})
+        if len(sharing) > 1:
+            warnings.append(f"chord {chord!r} is shared by the groups {', '.join(sharing)} and has one set of pitches")
+
+    intron_pitches = data.get("intron_pitches")
+    if pipeline == "locus":
+        problems += _check_pitches("intron_pitches", intron_pitches)
+    elif intron_pitches is not None:
+        warnings.append("intron_pitches are only used by locus schemes")
+
+    if problems:
+        raise SchemeError(path, problems)
+    return Scheme(
+        os.path.splitext(os.path.basename(path))[0],
+        pipeline,
+        amino_acid_to_chord,
+        {chord: dict(mapping) for chord, mapping in pitches.items()},
+        scale_types,
+        dict(intron_pitches) if pipeline == "locus" else None,
+        data.get("description", ""),
+        warnings,
+    )
+
+
+def read_scheme(path, data=None):
+    """Parse and validate a scheme file (``data`` is its bytes, when already read)."""
+    problems = []
+
+    def unique(pairs):
+        # json keeps the last of duplicate keys silently; report them instead
+        seen = set()
+        for key, _ in pairs:
+            if key in seen:
+                problems.append(f"duplicate key {key!r}")
+            seen.add(key)
+        return dict(pairs)
+
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    try:
+        decoded = json.loads(data, object_pairs_hook=unique)
+    except ValueError as e:
+        raise SchemeError(path, [f"not valid JSON: {e}"]) from None
+    return validate(decoded, path, problems)
+
+
+def scheme_dirs():
+    """Directories searched for schemes by name, in order."""
+    extra = [directory for directory in os.environ.get("GENOMIC_MUSIC_SCHEMES", "").split(os.pathsep) if directory]
+    return extra + [_bundled_schemes]
+
+
+def register_scheme(path, name=None):
+    """Make the scheme file at ``path`` available as ``name`` (default: its file name)."""
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    _registered[name] = os.path.abspath(path)
+    return name
+
+
+def available_schemes():
+    """Map the name of every scheme that can be loaded to its file."""
+    found = {}
+    for directory in reversed(scheme_dirs()):
+        if not os.path.isdir(directory):
+            continue
+        for filename in os.listdir(directory):
+            if filename.endswith(".json"):
+                found[filename[:-len(".json")]] = os.path.join(directory, filename)
+    found.update(_registered)
+    return dict(sorted(found.items()))
+
+
+def _is_scheme_file(name):
+    return name.endswith(".json") or os.sep in name
+
+
+def scheme_path(name):
+    """Path of the scheme called ``name``, or ``name`` itself when it is a .json file."""
+    if _is_scheme_file(name):
+        if not os.path.isfile(name):
+            raise FileNotFoundError(f"scheme file {name} does not exist")
+        return os.path.abspath(name)
+    schemes = available_schemes()
+    if name not in schemes:
+        raise ValueError(f"unknown mapping scheme {name!r}; available: {', '.join(schemes)}")
+    return schemes[name]
+
+
+def cache_dir():
+    """Directory of compiled schemes: GENOMIC_MUSIC_SCHEME_CACHE, else under the user cache directory."""
+    directory = os.environ.get("GENOMIC_MUSIC_SCHEME_CACHE")
+    if directory:
+        return directory
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "genomic_music", "schemes")
+
+
+def _load_compiled(path, name, digest):
+    with np.load(path, allow_pickle=False) as data:
+        tables = json.loads(data["tables"].item())
+        lookup = Lookup.from_arrays(data)
+    return Scheme(name, tables["pipeline"], tables["amino_acid_to_chord"], tables["chord_to_pitch_mapping"],
+                  tables["scale_types"], tables["intron_pitch_mapping"], tables["description"],
+                  tables["warnings"], digest, lookup)
+
+
+def _save_compiled(path, scheme):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temporary = tempfile.mkstemp(suffix=".npz", prefix=".", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, tables=np.array(json.dumps(scheme.tables())), **scheme.lookup().arrays())
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def load_scheme(name):
+    """Return the Scheme called ``name`` (or stored at a .json path).
+
+    A scheme loaded by name keeps that name, including a name given to
+    register_scheme; one loaded from a path is named after its file. The
+    compiled form is read from the cache directory when the file has not
+    changed since it was compiled; otherwise the file is parsed, validated
+    and compiled, and the result stored there for next time.
+    """
+    path = scheme_path(name)
+    if _is_scheme_file(name):
+        name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(b"%d\0%s" % (COMPILED_VERSION, data)).hexdigest()
+    scheme = _loaded.get((name, path, digest))
+    if scheme is not None:
+        return scheme
+
+    compiled = os.path.join(cache_dir(), f"{name}-{digest[:16]}.npz")
+    try:
+        scheme = _load_compiled(compiled, name, digest)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        scheme = read_scheme(path, data)
+        scheme.name = name
+        scheme.digest = digest
+        try:
+            _save_compiled(compiled, scheme)
+        except OSError:
+            pass  # without a writable cache the scheme is compiled in every process
+    _loaded[name, path, digest] = scheme
+    return scheme
+
+
+def scheme_for(scheme, with_introns):
+    """Load ``scheme`` (a name, .json path or Scheme) and check that it is for the given pipeline."""
+    if not isinstance(scheme, Scheme):
+        scheme = load_scheme(scheme)
+    if scheme.with_introns != bool(with_introns):
+        needed = "locus" if with_introns else "alignment"
+        raise ValueError(f"mapping scheme {scheme.name!r} is for the {scheme.pipeline} pipeline, "
+                         f"not the {needed} pipeline")
+    return scheme
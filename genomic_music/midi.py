@@ -0,0 +1,130 @@
+"""Native Standard MIDI File export from the chord table.
+
+Writes the notes of musicxml.part_events straight to a type 1 MIDI file, one
+track per part, without building a music21 Score or going through MusicXML.
+"""
+
+import struct
+
+from .instruments import instrument_program
+from .musicxml import part_events
+from .report import ErrorReport
+
+TICKS_PER_QUARTER = 480
+TICKS_PER_EIGHTH = TICKS_PER_QUARTER // 2
+TEMPO_BPM = 120  # music21's default tempo
+
+VELOCITY = 80
+ACCENT_VELOCITY = 110
+
+step_semitones = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+
+def midi_note_number(step, alter, octave):
+    """MIDI key number of a (step, alter, octave) pitch; C4 is 60."""
+    return 12 * (octave + 1) + step_semitones[step] + alter
+
+
+def midi_keys(pitches, errors):
+    """MIDI key numbers of the (step, alter, octave) pitches that fit in 0-127.
+
+    Pitches outside that range cannot be played and are counted in ``errors``
+    (an ErrorReport) instead.
+    """
+    keys = []
+    for step, alter, octave in pitches:
+        key = midi_note_number(step, alter, octave)
+        if 0 <= key <= 127:
+            keys.append(key)
+        else:
+            accidentals = "#" * alter if alter > 0 else "-" * -alter
+            errors.add("pitch", f"{step}{accidentals}{octave}", ValueError(f"MIDI key {key} is outside 0-127"))
+    return keys
+
+
+def note_velocity(accent, velocity=None):
+    """Velocity of an event of musicxml.part_events: its own, else the accent or default velocity."""
+    if velocity is not None:
+        return velocity
+    return ACCENT_VELOCITY if accent else VELOCITY
+
+
+def variable_length(value):
+    """Encode a delta time or length as a MIDI variable-length quantity."""
+    data = [value & 0x7F]
+    value >>= 7
+    while value:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    return bytes(reversed(data))
+
+
+def _chunk(kind, data):
+    return kind + struct.pack(">I", len(data)) + data
+
+
+def part_channel(part_index):
+    """MIDI channel (0-15) of the part at ``part_index``, skipping the percussion channel."""
+    # Channel 10 (index 9) is reserved for percussion
+    channel = part_index % 15
+    return channel + 1 if channel >= 9 else channel
+
+
+def _conductor_track(tempo_bpm):
+    microseconds = round(60_000_000 / tempo_bpm)
+    data = (b"\x00\xff\x51\x03" + microseconds.to_bytes(3, "big")
+            + b"\x00\xff\x58\x04\x03\x03\x0c\x08"  # 3/8
+            + b"\x00\xff\x2f\x00")
+    return _chunk(b"MTrk", data)
+
+
+def part_track(events, part_index, program=0, name="", errors=None):
+    """Encode (pitches, length in eighths, accent, velocity) events as one MTrk chunk.
+
+    Pitches outside the MIDI range are counted in ``errors`` and left out;
+    an event without any other pitch becomes a rest.
+    """
+    errors = ErrorReport() if errors is None else errors
+    channel = part_channel(part_index)
+    data = bytearray()
+    encoded_name = name.encode("latin-1", "replace")
+    data += b"\x00\xff\x03" + variable_length(len(encoded_name)) + encoded_name
+    data += bytes([0x00, 0xC0 | channel, program & 0x7F])
+    pending = 0
+    for pitches, length, accent, velocity in events:
+        ticks = length * TICKS_PER_EIGHTH
+        keys = midi_keys(pitches, errors)
+        if not keys:
+            pending += ticks
+            continue
+        velocity = note_velocity(accent, velocity)
+        for i, key in enumerate(keys):
+            data += variable_length(pending if i == 0 else 0) + bytes([0x90 | channel, key, velocity])
+        for i, key in enumerate(keys):
+            data += variable_length(ticks if i == 0 else 0) + bytes([0x80 | channel, key, 0])
+        pending = 0
+    data += variable_length(pending) + b"\xff\x2f\x00"
+    return _chunk(b"MTrk", bytes(data))
+
+
+def write_midi(table, path, with_introns=False, errors=None, tempo_bpm=TEMPO_BPM):
+    """Write a chord table as a type 1 MIDI file with one track per part.
+
+    Accented notes and chords get a higher velocity, unless the table has
+    velocities of its own (conservation.add_dynamics). ``with_introns`` and
+    ``errors`` behave as in musicxml.write_musicxml.
+    """
+    own_report = errors is None
+    errors = ErrorReport() if own_report else errors
+    headers = table.distinct("header")
+
+    with open(path, "wb") as out:
+        out.write(_chunk(b"MThd", struct.pack(">HHH", 1, len(headers) + 1, TICKS_PER_QUARTER)))
+        out.write(_conductor_track(tempo_bpm))
+        for i, header in enumerate(headers):
+            _, program = instrument_program(header)
+            events = part_events(table, header, errors, with_introns)
+            out.write(part_track(events, i, program, header, errors))
+
+    if own_report:
+        errors.print_summary()
@@ -0,0 +1,351 @@
+"""Direct MusicXML writer for large scores.
+
+Builds the same parts, notes, rests, chords and accents as score.build_score
+and score.build_intron_score, but streams them into a partwise MusicXML file
+instead of building a music21 Score first. Rows are read from the table in
+bounded chunks, so memory does not grow with the length of the sequences.
+
+Measures follow the 3/8 meter the converters ask for: an eighth note per
+base, and chords that cross a barline are split and tied. (The music21 path
+puts its TimeSignature on the Score rather than on each Part, so music21
+notates its parts in 4/4; the notes and their timing are the same.) The
+music21 builders remain the reference implementation.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from xml.sax.saxutils import escape
+
+from .instruments import instrument_program
+from .report import ErrorReport
+from .voicings import scale_type_intervals, triad_intervals, voicing_cache
+
+# Durations are counted in eighth notes: one division per eighth
+DIVISIONS_PER_QUARTER = 2
+MEASURE_LENGTH = 3  # 3/8
+
+note_types = {1: ("eighth", False), 2: ("quarter", False), 3: ("quarter", True)}
+
+_pitch_pattern = re.compile(r"^([A-Ga-g])([#\-]*)(\d+)$")
+
+
+def parse_pitch(pitch_string):
+    """Return (step, alter, octave) for a pitch string such as "E-4" or "C#4"."""
+    match = _pitch_pattern.match(pitch_string)
+    if not match:
+        raise ValueError(f"cannot parse pitch {pitch_string!r}")
+    step, accidentals, octave = match.groups()
+    return step.upper(), accidentals.count("#") - accidentals.count("-"), int(octave)
+
+
+class PitchCache(dict):
+    """Parsed (step, alter, octave) pitches by pitch string, shared by the parts of a score.
+
+    Failures are stored as the exception and raised again on every lookup.
+    """
+
+    def get_pitch(self, pitch_string):
+        parsed = self.get(pitch_string)
+        if parsed is None:
+            try:
+                parsed = parse_pitch(pitch_string)
+            except ValueError as e:
+                parsed = e
+            self[pitch_string] = parsed
+        if isinstance(parsed, Exception):
+            raise parsed
+        return parsed
+
+
+class PartWriter:
+    """Writes the measures of one part, splitting events at barlines."""
+
+    def __init__(self, out, part_id):
+        self.out = out
+        self.part_id = part_id
+        self.measure_number = 0
+        self.position = 0
+
+    def __enter__(self):
+        self.out.write(f'  <part id="{self.part_id}">\n')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.position or self.measure_number == 0:
+            if self.measure_number == 0:
+                self._open_measure()
+            self.out.write('    </measure>\n')
+        self.out.write('  </part>\n')
+
+    def _open_measure(self):
+        self.measure_number += 1
+        self.out.write(f'    <measure number="{self.measure_number}">\n')
+        if self.measure_number == 1:
+            self.out.write(
+                '      <attributes>\n'
+                f'        <divisions>{DIVISIONS_PER_QUARTER}</divisions>\n'
+                '        <time>\n'
+                '          <beats>3</beats>\n'
+                '          <beat-type>8</beat-type>\n'
+                '        </time>\n'
+                '        <clef>\n'
+                '          <sign>G</sign>\n'
+                '          <line>2</line>\n'
+                '        </clef>\n'
+                '      </attributes>\n'
+            )
+
+    def add(self, pitches, length, accent=False, velocity=None):
+        """Add a rest (``pitches`` empty), note or chord lasting ``length`` eighths.
+
+        A ``velocity`` (MIDI, 1-127) is written as the notes' dynamics.
+        """
+        remaining = length
+        first = True
+        while remaining:
+            if self.position == 0:
+                self._open_measure()
+            take = min(remaining, MEASURE_LENGTH - self.position)
+            tie_stop = bool(pitches) and not first
+            tie_start = bool(pitches) and remaining > take
+            self._write_element(pitches, take, accent and first, tie_start, tie_stop, velocity)
+            self.position += take
+            remaining -= take
+            first = False
+            if self.position == MEASURE_LENGTH:
+                self.out.write('    </measure>\n')
+                self.position = 0
+
+    def _write_element(self, pitches, length, accent, tie_start, tie_stop, velocity=None):
+        note_type, dotted = note_types[length]
+        duration = f'        <duration>{length}</duration>\n'
+        ties = ('        <tie type="stop" />\n' if tie_stop else '') + \
+               ('        <tie type="start" />\n' if tie_start else '')
+        kind = f'        <type>{note_type}</type>\n' + ('        <dot />\n' if dotted else '')
+        if not pitches:
+            self.out.write('      <note>\n        <rest />\n' + duration + kind + self._notations(accent, False, False) + '      </note>\n')
+            return
+        # Dynamics as a percentage of the forte velocity, 90, as music21 writes them
+        opening = '      <note>\n' if velocity is None else f'      <note dynamics="{velocity / 90 * 100:.2f}">\n'
+        for i, (step, alter, octave) in enumerate(pitches):
+            self.out.write(
+                opening
+                + ('        <chord />\n' if i else '')
+                + f'        <pitch>\n          <step>{step}</step>\n'
+                + (f'          <alter>{alter}</alter>\n' if alter else '')
+                + f'          <octave>{octave}</octave>\n        </pitch>\n'
+                + duration + ties + kind
+                + self._notations(accent and i == 0, tie_start, tie_stop)
+                + '      </note>\n'
+            )
+
+    @staticmethod
+    def _notations(accent, tie_start, tie_stop):
+        if not (accent or tie_start or tie_stop):
+            return ''
+        return ('        <notations>\n'
+                + ('          <tied type="stop" />\n' if tie_stop else '')
+                + ('          <tied type="start" />\n' if tie_start else '')
+                + ('          <articulations>\n            <accent />\n          </articulations>\n' if accent else '')
+                + '        </notations>\n')
+
+
+def _write_header(out, headers):
+    out.write('<?xml version="1.0" encoding="utf-8"?>\n'
+              '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 4.0 Partwise//EN" '
+              '"http://www.musicxml.org/dtds/partwise.dtd">\n'
+              '<score-partwise version="4.0">\n'
+              '  <part-list>\n')
+    for i, header in enumerate(headers, start=1):
+        name, program = instrument_program(header)
+        name = escape(name)
+        program += 1
+        out.write(f'    <score-part id="P{i}">\n'
+                  f'      <part-name>{name}</part-name>\n'
+                  f'      <score-instrument id="P{i}-I1">\n'
+                  f'        <instrument-name>{name}</instrument-name>\n'
+                  '      </score-instrument>\n'
+                  f'      <midi-instrument id="P{i}-I1">\n'
+                  f'        <midi-channel>{(i - 1) % 16 + 1}</midi-channel>\n'
+                  f'        <midi-program>{program}</midi-program>\n'
+                  '      </midi-instrument>\n'
+                  '    </score-part>\n')
+    out.write('  </part-list>\n')
+
+
+def _event_columns(table, header, with_introns):
+    # The columns part_events reads for one part
+    names = ["pitch", "accent"]
+    if header == "SequenceX":
+        names += ["type", "amino_acid_chord"] if with_introns else ["amino_acid_chord", "scale_type"]
+    if "velocity" in table.columns:
+        names += ["emphasis", "velocity"]
+    return names
+
+
+def part_events(table, header, errors, with_introns=False, pitch_cache=None):
+    """Yield (pitches, length in eighths, accent, velocity) for one part of a chord table.
+
+    Mirrors the rules of score.build_score, or score.build_intron_score with
+    ``with_introns``. ``pitches`` is a list of (step, alter, octave) tuples,
+    empty for a rest. ``velocity`` is None unless the table has the columns
+    of conservation.add_dynamics, whose ``emphasis`` then gives the accents;
+    the ``accent`` column still places the chords. Every event is counted in
+    ``errors.events`` as a note, chord or rest.
+    """
+    pitch_cache = PitchCache() if pitch_cache is None else pitch_cache
+    names = _event_columns(table, header, with_introns)
+    dynamics = "velocity" in names
+
+    for chunk in table.chunks(names, mask=table.equals("header", header)):
+        accents = [value.strip().lower() == "accent" for value in chunk["accent"]]
+        if dynamics:
+            emphasis = [value == "accent" for value in chunk["emphasis"]]
+            velocities = [int(value) for value in chunk["velocity"]]
+        else:
+            emphasis = accents
+            velocities = [None] * len(accents)
+
+        if header != "SequenceX":
+            for pitch_string, accent, velocity in zip(chunk["pitch"], emphasis, velocities):
+                if with_introns and not (len(pitch_string) > 1 and pitch_string[-1].isdigit()):
+                    pitch_string = ""
+                pitches = []
+                if pitch_string:
+                    try:
+                        pitches = [pitch_cache.get_pitch(pitch_string)]
+                    except ValueError as e:
+                        errors.add("pitch", pitch_string, e)
+                errors.add_event("notes" if pitches else "rests")
+                yield pitches, 1, accent, velocity
+            continue
+
+        for i, root_note in enumerate(chunk["pitch"]):
+            if with_introns:
+                row_type = chunk["type"][i].strip().lower()
+                if row_type == "intron":
+                    errors.add_event("rests")
+                    yield [], 1, False, None
+                    continue
+                if row_type != "exon" or not root_note:
+                    continue
+                intervals = triad_intervals(chunk["amino_acid_chord"][i])
+                accent = emphasis[i]
+            else:
+                scale_type = chunk["scale_type"][i].strip().lower()
+                if not (accents[i] and root_note and chunk["amino_acid_chord"][i] and scale_type):
+                    continue
+                intervals = scale_type_intervals.get(scale_type, ())
+                accent = emphasis[i] if dynamics else True
+            try:
+                pitches = [pitch_cache.get_pitch(name) for name in voicing_cache.get(root_note, intervals)]
+            except Exception as e:
+                errors.add("chord", f"{root_note} {intervals}", e)
+                continue
+            errors.add_event("chords")
+            yield pitches, 3, accent, velocities[i]
+
+
+def write_part(out, table, header, part_id, errors, with_introns=False, pitch_cache=None):
+    """Write the ``<part>`` element of one header of a chord table to ``out``."""
+    with PartWriter(out, part_id) as part:
+        for pitches, length, accent, velocity in part_events(table, header, errors, with_introns, pitch_cache):
+            part.add(pitches, length, accent, velocity)
+
+
+def part_key(table, header, part_id, with_introns=False):
+    """Cache key of one part's fragment: the rows it is written from and the code that writes it."""
+    from . import voicings
+    from .cache import digest, module_fingerprint
+
+    rows = hashlib.sha256()
+    for chunk in table.chunks(_event_columns(table, header, with_introns), mask=table.equals("header", header)):
+        rows.update(json.dumps(chunk, sort_keys=True).encode())
+    modules = [sys.modules[__name__]]
+    if header == "SequenceX":
+        # Only the chord track looks up voicings
+        modules.append(voicings)
+    return digest("musicxml-part", part_id, header == "SequenceX", with_introns, rows.hexdigest(),
+                  [module_fingerprint(module) for module in modules])
+
+
+def _write_fragment(part_table, header, part_id, with_introns, path):
+    # Runs in a worker process; the fragment goes to a file to keep it out of the pipe
+    errors = ErrorReport()
+    with open(path, "w", encoding="utf-8") as out:
+        write_part(out, part_table, header, part_id, errors, with_introns)
+    return errors
+
+
+def _part_fragments(table, headers, with_introns, errors, workers, cache, scratch):
+    # Fragment file of every part: from the cache, or written here or by a worker
+    fragments = {}
+    pending = []
+    for i, header in enumerate(headers, start=1):
+        part_id = f"P{i}"
+        key = part_key(table, header, part_id, with_introns) if cache is not None else None
+        cached = cache.lookup(key, ".xml") if key else None
+        if cached is not None:
+            fragments[header] = cached
+        else:
+            pending.append((header, part_id, key, os.path.join(scratch, f"{part_id}.xml")))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(pending) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            reports = executor.map(_write_fragment,
+                                   [table.select(table.equals("header", header)) for header, _, _, _ in pending],
+                                   *zip(*[(header, part_id, with_introns, path) for header, part_id, _, path in pending]))
+            for report in reports:
+                errors.update(report)
+    else:
+        pitch_cache = PitchCache()
+        for header, part_id, _, path in pending:
+            with open(path, "w", encoding="utf-8") as out:
+                write_part(out, table, header, part_id, errors, with_introns, pitch_cache)
+
+    for header, _, key, path in pending:
+        if key:
+            path = cache.store(key, ".xml", lambda temporary: shutil.copyfile(path, temporary))
+        fragments[header] = path
+    return [fragments[header] for header in headers]
+
+
+def write_musicxml(table, path, with_introns=False, errors=None, workers=1, cache=None):
+    """Stream a chord table straight to a MusicXML file.
+
+    ``with_introns`` selects the rules of the pipeline with introns. Failures
+    are counted in ``errors`` (an ErrorReport); without one, a summary is
+    printed at the end.
+
+    Each part is written independently of the others, so with ``workers``
+    other than 1 (None: one per CPU) the parts are written in parallel
+    processes, and with a ``cache`` (a cache.StageCache) a part whose rows
+    have not changed is reused and only the changed parts are rewritten.
+    The score is then assembled from the part fragments.
+    """
+    own_report = errors is None
+    errors = ErrorReport() if own_report else errors
+    headers = table.distinct("header")
+
+    with open(path, "w", encoding="utf-8") as out:
+        _write_header(out, headers)
+        if workers == 1 and cache is None:
+            pitch_cache = PitchCache()
+            for i, header in enumerate(headers, start=1):
+                write_part(out, table, header, f"P{i}", errors, with_introns, pitch_cache)
+        else:
+            with tempfile.TemporaryDirectory() as scratch:
+                for fragment in _part_fragments(table, headers, with_introns, errors, workers, cache, scratch):
+                    with open(fragment, "r", encoding="utf-8") as part:
+                        shutil.copyfileobj(part, out)
+        out.write('</score-partwise>\n')
+
+    if own_report:
+        errors.print_summary()
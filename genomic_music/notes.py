@@ -0,0 +1,79 @@
+"""Pooled pitch parsing and bulk note construction.
+
+A score has tens of thousands of notes but fewer than thirty distinct pitch
+strings. Each string is parsed by music21 once; notes are then built from the
+parsed step, octave and accidental, which is much cheaper than parsing the
+string again. Parse failures are collected in a report.ErrorReport instead
+of being printed row by row.
+"""
+
+import itertools
+
+from music21 import articulations, note, pitch
+
+
+class PitchPool:
+    """Parsed pitch strings, keyed by the string from the chord table."""
+
+    def __init__(self):
+        self.specs = {}
+
+    def spec(self, pitch_string):
+        """Return (step, octave, accidental) for a pitch string, or raise.
+
+        Invalid strings are remembered so the same exception is raised again
+        without reparsing.
+        """
+        spec = self.specs.get(pitch_string)
+        if spec is None:
+            try:
+                parsed = pitch.Pitch(pitch_string)
+                spec = (parsed.step, parsed.octave, parsed.accidental.name if parsed.accidental else None)
+                # Fall back to parsing the string for anything the fields do not round-trip
+                if pitch.Pitch(step=spec[0], octave=spec[1], accidental=spec[2]) != parsed:
+                    spec = pitch_string
+            except Exception as e:
+                spec = e
+            self.specs[pitch_string] = spec
+        if isinstance(spec, Exception):
+            raise spec
+        return spec
+
+    def pitch(self, pitch_string):
+        """Return a new music21 Pitch for a pitch string."""
+        spec = self.spec(pitch_string)
+        if isinstance(spec, str):
+            return pitch.Pitch(spec)
+        step, octave, accidental = spec
+        return pitch.Pitch(step=step, octave=octave, accidental=accidental)
+
+    def build_notes(self, pitch_strings, accents, quarter_length, errors, velocities=None):
+        """Turn a column of pitch strings into notes and rests in one pass.
+
+        Empty or unparsable pitches become rests (failures are counted in
+        ``errors``); notes and rests with a true ``accents`` entry get an
+        accent articulation, and notes take their MIDI velocity from
+        ``velocities`` when it is given.
+        """
+        elements = []
+        if velocities is None:
+            velocities = itertools.repeat(None)
+        for pitch_string, accent, velocity in zip(pitch_strings, accents, velocities):
+            element = None
+            if pitch_string:
+                try:
+                    element = note.Note(pitch=self.pitch(pitch_string), quarterLength=quarter_length)
+                    if velocity is not None:
+                        element.volume.velocity = velocity
+                except Exception as e:
+                    errors.add("pitch", pitch_string, e)
+            if element is None:
+                element = note.Rest(quarterLength=quarter_length)
+            if accent:
+                element.articulations.append(articulations.Accent())
+            elements.append(element)
+        return elements
+
+
+# Shared by every score built in this process
+pitch_pool = PitchPool()
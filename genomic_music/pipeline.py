@@ -0,0 +1,374 @@
+"""In-process pipeline: FASTA -> annotated notes -> chords -> score -> audio.
+
+This runs the stages of fa-to-csv.py, aminoacidchordsaddition.py,
+Convert_csv_to_musicxml.py and convert-to-mp3 in one process, passing tables
+between them in memory. When a CDS coordinates file is given, the stages of
+the pipeline with introns (fastocodoncsv.py, aminoacidchord.py and
+Convert_csv_to_musicxml2.2.2.py) are used instead. Intermediate tables are
+only written when a path is given for them. For aligned files, an optional
+dynamics stage (conservation.py) turns the conservation of every alignment
+column into accents and velocities. Each stage imports what it needs
+when it runs, so annotating a file loads neither the chord tables nor music21.
+"""
+
+import os
+
+from .columnar import Table, TableWriter, write_table
+from .coordinates import CDSIndex, read_cds_coordinates
+from .report import output_stage, stage
+from .translate import ANNOTATION_FIELDS, annotate_fasta
+
+
+def annotate(fasta_path, output_file=None, coordinates=None, records=None, region=None):
+    """Annotate a FASTA file and return the table.
+
+    Without ``coordinates`` the file is an aligned codon FASTA; with a
+    gene_and_cds_coordinates.tsv path it is a genomic locus. ``records``
+    (a set of record numbers, from 1) and ``region`` (0-based start, end of
+    the bases, widened to whole codons) select what is annotated, reading
+    only those bytes of an uncompressed file. With ``output_file`` the
+    table is also written as .csv or .npz.
+    """
+    if coordinates:
+        from . import introns
+
+        cds_regions, start_offset = read_cds_coordinates(coordinates)
+        with TableWriter(None, introns.LOCUS_FIELDS) as writer:
+            introns.annotate_locus_fasta(fasta_path, start_offset, CDSIndex(cds_regions), writer, records, region)
+    else:
+        with TableWriter(None, ANNOTATION_FIELDS) as writer:
+            annotate_fasta(fasta_path, writer, records, region)
+    if output_file:
+        write_table(output_file, writer.table)
+    return writer.table
+
+
+def chords(table, output_file=None, with_introns=False, scheme=None):
+    """Add the pitch/chord columns and the SequenceX track to a table.
+
+    ``scheme`` is a mapping scheme (a name, .json path or mappings.Scheme);
+    without one the tables of the chords or introns module are used.
+    """
+    if scheme is None:
+        from . import chords as exon_chords, introns
+
+        chord_table = (introns if with_introns else exon_chords).add_chords(table)
+    else:
+        from .mappings import scheme_for
+
+        chord_table = scheme_for(scheme, with_introns).add_chords(table)
+    if output_file:
+        write_table(output_file, chord_table)
+    return chord_table
+
+
+def dynamics(chord_table, output_file=None):
+    """Add conservation-driven accents and velocities to a chord table of the pipeline without introns.
+
+    See conservation.add_dynamics; the writers then use them in place of
+    the fixed accent on the first base of every codon.
+    """
+    from .conservation import add_dynamics
+
+    table = add_dynamics(chord_table)
+    if output_file:
+        write_table(output_file, table)
+    return table
+
+
+def _check_dynamics(with_dynamics, with_introns):
+    if with_dynamics and with_introns:
+        raise ValueError("dynamics need an aligned FASTA file; the pipeline with introns has no alignment columns")
+
+
+def _dynamics_stage(chord_table, with_chords, report, part_keys=None):
+    # The dynamics stage after the chords, which then writes the chord table; with a cache, the
+    # rendered outputs are keyed on the dynamics code too
+    with stage(report, "dynamics", rows=len(chord_table)):
+        chord_table = dynamics(chord_table, with_chords)
+    if part_keys is not None:
+        from . import conservation
+        from .cache import digest, module_fingerprint
+
+        part_keys = part_keys + [digest("dynamics", module_fingerprint(conservation))]
+    return chord_table, part_keys
+
+
+def score(chord_table, output_file=None, with_introns=False, errors=None):
+    """Build the music21 score, optionally writing it as MusicXML."""
+    from .score import build_intron_score, build_score
+
+    build = build_intron_score if with_introns else build_score
+    music21_score = build(chord_table, errors)
+    if output_file:
+        music21_score.write("musicxml", fp=output_file)
+    return music21_score
+
+
+def direct_musicxml(chord_table, output_file, with_introns=False, workers=1, cache=None, errors=None):
+    """Stream the score straight to MusicXML without building a music21 Score.
+
+    Parts are written by ``workers`` processes and reused from ``cache``
+    when their rows have not changed; see musicxml.write_musicxml.
+    """
+    from .musicxml import write_musicxml
+
+    write_musicxml(chord_table, output_file, with_introns, errors, workers, cache)
+
+
+def midi(chord_table, output_file, with_introns=False, errors=None):
+    """Write the notes straight to a MIDI file, without a music21 Score."""
+    from .midi import write_midi
+
+    write_midi(chord_table, output_file, with_introns, errors)
+
+
+def audio(chord_table, output_file, with_introns=False, workers=None, errors=None):
+    """Render the notes to a .wav, .mp3 or .flac file with the built-in synthesizer."""
+    from .synth import render_audio
+
+    render_audio(chord_table, output_file, with_introns, workers, errors=errors)
+
+
+def _render_key(stage, part_keys, with_introns, modules, *extra):
+    # Rendered outputs depend on every part and on the code that renders them
+    from . import instruments, voicings
+    from .cache import digest, module_fingerprint
+
+    modules = (instruments, voicings) + tuple(modules)
+    return digest(stage, part_keys, with_introns, [module_fingerprint(module) for module in modules], extra)
+
+
+def _render(chord_table, with_introns, musicxml=None, midi_file=None, audio_file=None, backend="music21",
+            workers=None, cache=None, part_keys=None, report=None):
+    # Write the requested outputs of a chord table; with a cache, reuse those rendered before.
+    # With a report, each output is a stage counting the events and failures of its own writer.
+    rows = len(chord_table)
+    if cache is None:
+        if musicxml:
+            with output_stage(report, f"musicxml-{backend}", rows=rows) as record:
+                if backend == "direct":
+                    direct_musicxml(chord_table, musicxml, with_introns, workers, errors=record.errors)
+                else:
+                    score(chord_table, musicxml, with_introns, record.errors)
+        if midi_file:
+            with output_stage(report, "midi", rows=rows) as record:
+                midi(chord_table, midi_file, with_introns, record.errors)
+        if audio_file:
+            with output_stage(report, "audio", rows=rows) as record:
+                audio(chord_table, audio_file, with_introns, workers, record.errors)
+        return
+
+    from . import midi as midi_module, musicxml as musicxml_module, synth
+
+    if musicxml:
+        with output_stage(report, f"musicxml-{backend}", rows=rows) as record:
+            if backend == "direct":
+                key = _render_key("musicxml-direct", part_keys, with_introns, [musicxml_module])
+                record.counts["cached"] = cache.output(
+                    key, musicxml,
+                    lambda path: direct_musicxml(chord_table, path, with_introns, workers, cache, record.errors))
+            else:
+                import music21
+
+                from . import notes, score as score_module
+
+                key = _render_key("musicxml-music21", part_keys, with_introns, [score_module, notes],
+                                  music21.VERSION_STR)
+                record.counts["cached"] = cache.output(
+                    key, musicxml, lambda path: score(chord_table, path, with_introns, record.errors))
+    if midi_file:
+        with output_stage(report, "midi", rows=rows) as record:
+            key = _render_key("midi", part_keys, with_introns, [musicxml_module, midi_module])
+            record.counts["cached"] = cache.output(
+                key, midi_file, lambda path: midi(chord_table, path, with_introns, record.errors))
+    if audio_file:
+        with output_stage(report, "audio", rows=rows) as record:
+            key = _render_key("audio", part_keys, with_introns, [musicxml_module, midi_module, synth])
+            record.counts["cached"] = cache.output(
+                key, audio_file, lambda path: audio(chord_table, path, with_introns, workers, record.errors))
+
+
+def run(fasta_path, coordinates=None, musicxml=None, audio_file=None, annotated=None, with_chords=None,
+        backend="music21", midi_file=None, workers=None, cache=None, scheme=None, records=None, region=None,
+        report=None, with_dynamics=False):
+    """Run every stage for one FASTA file.
+
+    ``coordinates`` selects the pipeline with introns. The other keywords
+    name optional outputs: the MusicXML score, a MIDI file, the audio
+    rendering (.wav, .mp3 or .flac) and the two intermediate tables (.csv or
+    .npz). ``backend`` is "music21" to build a music21 Score for MusicXML or
+    "direct" to stream MusicXML without one. MIDI and audio are written from
+    the chord table directly. ``workers`` is the number of processes writing
+    the parts of a direct MusicXML score and rendering audio chunks (None:
+    one per CPU). With a ``cache`` (a cache.StageCache), stages and score
+    parts whose inputs have not changed are reused instead of recomputed.
+    ``scheme`` names the mapping scheme of the chord stage (default: the
+    pipeline's own tables), and ``records`` and ``region`` select part of
+    the FASTA file as in annotate. With a ``report`` (a report.RunReport)
+    every stage is measured into it. ``with_dynamics`` adds the dynamics
+    stage after the chords (aligned FASTA files only). Returns the chord
+    table.
+    """
+    if backend not in ("direct", "music21"):
+        raise ValueError(f"unknown MusicXML backend {backend!r}")
+    with_introns = bool(coordinates)
+    _check_dynamics(with_dynamics, with_introns)
+    if scheme is not None:
+        from .mappings import scheme_for
+
+        scheme = scheme_for(scheme, with_introns)
+    if cache is None:
+        with stage(report, "annotate") as record:
+            table = annotate(fasta_path, annotated, coordinates, records, region)
+            record.counts["rows"] = len(table)
+        with stage(report, "chords", rows=len(table)):
+            chord_table = chords(table, None if with_dynamics else with_chords, with_introns, scheme)
+        if with_dynamics:
+            chord_table, _ = _dynamics_stage(chord_table, with_chords, report)
+        _render(chord_table, with_introns, musicxml, midi_file, audio_file, backend, workers, report=report)
+        return chord_table
+
+    from .cache import cached_annotation, cached_chords
+
+    with stage(report, "annotate") as record:
+        hits = cache.hits
+        parts = cached_annotation(fasta_path, cache, coordinates, records, region)
+        table = Table.concat(part for _, part, _ in parts)
+        if annotated:
+            write_table(annotated, table)
+        record.counts.update(rows=len(table), cached_parts=cache.hits - hits)
+    with stage(report, "chords", rows=len(table)) as record:
+        hits = cache.hits
+        chord_table, part_keys = cached_chords(parts, cache, with_introns, scheme)
+        if with_chords and not with_dynamics:
+            write_table(with_chords, chord_table)
+        record.counts["cached_parts"] = cache.hits - hits
+    if with_dynamics:
+        chord_table, part_keys = _dynamics_stage(chord_table, with_chords, report, part_keys)
+    _render(chord_table, with_introns, musicxml, midi_file, audio_file, backend, workers, cache, part_keys, report)
+    return chord_table
+
+
+def scheme_output(path, scheme_name):
+    """The output path of one scheme: its name goes before the extension (score.wav -> score_blues.wav)."""
+    root, extension = os.path.splitext(path)
+    return f"{root}_{scheme_name}{extension}"
+
+
+# The annotation shared by the processes of run_schemes, set when each one starts
+_shared_annotation = None
+
+
+def _share_annotation(annotation):
+    global _shared_annotation
+    _shared_annotation = annotation
+
+
+def _run_scheme(annotation, scheme, with_introns, outputs, backend, workers, cache, report=None, with_dynamics=False):
+    # The chord stage and outputs of one scheme; ``annotation`` is a table, or cached parts with a cache.
+    # Returns the cache counts and, in a worker process, a report of its stages.
+    if annotation is None:
+        annotation = _shared_annotation
+        if report is not None:
+            from .report import RunReport
+
+            report = RunReport()
+    first_stage = len(report.stages) if report is not None else 0
+    if cache is None:
+        with stage(report, "chords", rows=len(annotation)):
+            chord_table = chords(annotation, None if with_dynamics else outputs.get("with_chords"), with_introns,
+                                 scheme)
+        if with_dynamics:
+            chord_table, _ = _dynamics_stage(chord_table, outputs.get("with_chords"), report)
+        _render(chord_table, with_introns, outputs.get("musicxml"), outputs.get("midi_file"),
+                outputs.get("audio_file"), backend, workers, report=report)
+    else:
+        from .cache import cached_chords
+
+        with stage(report, "chords", rows=sum(len(part) for _, part, _ in annotation)) as record:
+            hits = cache.hits
+            chord_table, part_keys = cached_chords(annotation, cache, with_introns, scheme)
+            if outputs.get("with_chords") and not with_dynamics:
+                write_table(outputs["with_chords"], chord_table)
+            record.counts["cached_parts"] = cache.hits - hits
+        if with_dynamics:
+            chord_table, part_keys = _dynamics_stage(chord_table, outputs.get("with_chords"), report, part_keys)
+        _render(chord_table, with_introns, outputs.get("musicxml"), outputs.get("midi_file"),
+                outputs.get("audio_file"), backend, workers, cache, part_keys, report)
+    if report is not None:
+        for record in report.stages[first_stage:]:
+            record.counts["scheme"] = scheme.name
+    return (cache.hits, cache.misses) if cache is not None else None, report
+
+
+def run_schemes(fasta_path, schemes, coordinates=None, musicxml=None, audio_file=None, annotated=None,
+                with_chords=None, backend="music21", midi_file=None, workers=None, cache=None, records=None,
+                region=None, report=None, with_dynamics=False):
+    """Run the pipeline for one FASTA file under several mapping schemes.
+
+    The FASTA file is read and annotated once; the chord stage of every
+    scheme (a name, .json path or mappings.Scheme) is then applied to the
+    shared annotated table. Output paths are those of run, with each
+    scheme's name added before the extension; the annotated table is
+    written once, as given. Schemes are processed by ``workers`` processes
+    (None: one per CPU); with one worker or one scheme they run in this
+    process, which then passes ``workers`` on to the audio and direct
+    MusicXML renderers. ``records`` and ``region`` are those of annotate,
+    and ``report`` and ``with_dynamics`` those of run; the stages of each
+    scheme are labelled with its name.
+    Returns {scheme name: {output keyword: path}}.
+    """
+    if backend not in ("direct", "music21"):
+        raise ValueError(f"unknown MusicXML backend {backend!r}")
+    import concurrent.futures
+
+    from .mappings import scheme_for
+
+    with_introns = bool(coordinates)
+    _check_dynamics(with_dynamics, with_introns)
+    schemes = [scheme_for(scheme, with_introns) for scheme in schemes]
+    names = [scheme.name for scheme in schemes]
+    if len(set(names)) != len(names):
+        raise ValueError(f"mapping schemes must have different names, not {', '.join(names)}")
+
+    with stage(report, "annotate") as record:
+        if cache is None:
+            annotation = annotate(fasta_path, annotated, coordinates, records, region)
+            record.counts["rows"] = len(annotation)
+        else:
+            from .cache import cached_annotation
+
+            hits = cache.hits
+            annotation = cached_annotation(fasta_path, cache, coordinates, records, region)
+            table = Table.concat(part for _, part, _ in annotation)
+            if annotated:
+                write_table(annotated, table)
+            record.counts.update(rows=len(table), cached_parts=cache.hits - hits)
+
+    paths = {"musicxml": musicxml, "midi_file": midi_file, "audio_file": audio_file, "with_chords": with_chords}
+    outputs = {scheme.name: {keyword: scheme_output(path, scheme.name) for keyword, path in paths.items() if path}
+               for scheme in schemes}
+    if workers == 1 or len(schemes) == 1:
+        for scheme in schemes:
+            _run_scheme(annotation, scheme, with_introns, outputs[scheme.name], backend, workers, cache, report,
+                        with_dynamics)
+        return outputs
+
+    # Each process receives the annotation once, when it starts, rather than once per scheme
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_share_annotation,
+                                                initargs=(annotation,)) as executor:
+        futures = [executor.submit(_run_scheme, None, scheme, with_introns, outputs[scheme.name], backend, 1, cache,
+                                   report, with_dynamics)
+                   for scheme in schemes]
+        results = [future.result() for future in futures]
+    if report is not None:
+        for _, scheme_report in results:
+            report.update(scheme_report)
+    counts = [scheme_counts for scheme_counts, _ in results]
+    if cache is not None:
+        # Each process counted on its own copy of the cache, starting from this one's counts
+        hits, misses = cache.hits, cache.misses
+        cache.add_counts(sum(worker_hits - hits for worker_hits, _ in counts),
+                         sum(worker_misses - misses for _, worker_misses in counts))
+    return outputs
@@ -0,0 +1,292 @@
+"""Per-stage instrumentation of a pipeline run and its JSON report.
+
+A RunReport is handed to pipeline.run, which records every stage it runs:
+wall time, rows processed per second and the peak resident set size of the
+process when the stage ended (a high-water mark, so the growth from one
+stage to the next is that stage's share). Every output stage counts the
+notes, chords and rests its writer wrote and the pitches and chords it
+could not build, in place of per-row messages; the report holds the
+failures of all writers, each counted once. On request the
+stages are also profiled with cProfile and traced with tracemalloc; those
+modules are only imported then, so a report adds nothing to start-up time.
+
+Reports are written as JSON; aggregate sums the stages of many reports,
+e.g. the jobs of a batch.
+"""
+
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+REPORT_VERSION = 1
+PROFILE_FUNCTIONS = 25
+
+
+class ErrorReport:
+    """Counts of values that could not be turned into notes or chords, by kind.
+
+    ``events`` counts the notes, chords and rests that were written.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.messages = {}
+        self.events = {}
+
+    def add(self, kind, value, exc):
+        key = (kind, value)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.messages.setdefault(key, f"{type(exc).__name__}: {exc}")
+
+    def add_event(self, kind):
+        self.events[kind] = self.events.get(kind, 0) + 1
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def update(self, other):
+        """Add the counts of another report, e.g. one from a worker process."""
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+            self.messages.setdefault(key, other.messages[key])
+        for kind, count in other.events.items():
+            self.events[kind] = self.events.get(kind, 0) + count
+
+    def merge(self, other):
+        """Add the failures of another writer's pass over the same rows.
+
+        A failure both writers met is counted once, so writing a table to
+        several outputs does not multiply its failures.
+        """
+        for key, count in other.counts.items():
+            self.counts[key] = max(self.counts.get(key, 0), count)
+            self.messages.setdefault(key, other.messages[key])
+
+    def lines(self):
+        return [f"{kind} {value!r}: {count} row(s), {self.messages[(kind, value)]}"
+                for (kind, value), count in sorted(self.counts.items(), key=lambda item: -item[1])]
+
+    def to_dict(self):
+        return [{"kind": kind, "value": value, "count": count, "error": self.messages[(kind, value)]}
+                for (kind, value), count in self.counts.items()]
+
+    def print_summary(self):
+        if self.counts:
+            print(f"{len(self)} row(s) could not be converted and became rests or were skipped:")
+            for line in self.lines():
+                print(f"  {line}")
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None where it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # kilobytes on Linux
+
+
+class Stage:
+    """Measurements of one stage; ``counts`` holds rows, notes, chords and the like."""
+
+    def __init__(self, name, counts=None):
+        self.name = name
+        self.counts = dict(counts or {})
+        self.seconds = None
+        self.peak_rss = None
+        self.traced_peak = None
+        self.errors = None  # the ErrorReport of an output stage's writer
+
+    def to_dict(self):
+        entry = {"stage": self.name, "seconds": round(self.seconds, 4) if self.seconds is not None else None}
+        entry.update(self.counts)
+        rows = self.counts.get("rows")
+        if rows is not None and self.seconds:
+            entry["rows_per_second"] = round(rows / self.seconds)
+        entry["peak_rss_bytes"] = self.peak_rss
+        if self.traced_peak is not None:
+            entry["traced_peak_bytes"] = self.traced_peak
+        return entry
+
+
+class RunReport:
+    """Stages, counts and errors of one run.
+
+    With ``profile`` the stages run under cProfile; with ``trace_memory``
+    tracemalloc records the peak Python memory of each stage (both slow the
+    run down). ``info`` describes the run (inputs, options) in the report.
+    """
+
+    def __init__(self, profile=False, trace_memory=False, **info):
+        self.info = info
+        self.stages = []
+        self.errors = ErrorReport()
+        self.profiler = None
+        if profile:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+        self.trace_memory = trace_memory
+        self._start = time.perf_counter()
+        self.seconds = None
+
+    @contextlib.contextmanager
+    def stage(self, name, **counts):
+        """Measure the body of a ``with`` block as the stage ``name``; yields its Stage."""
+        record = Stage(name, counts)
+        tracing = False  # whether this stage started tracemalloc
+        if self.trace_memory:
+            import tracemalloc
+
+            tracing = not tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.start()
+            else:
+                tracemalloc.reset_peak()
+        if self.profiler is not None:
+            self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            if self.profiler is not None:
+                self.profiler.disable()
+            if self.trace_memory:
+                record.traced_peak = tracemalloc.get_traced_memory()[1]
+            if tracing:
+                tracemalloc.stop()
+            record.peak_rss = peak_rss()
+            self.stages.append(record)
+
+    @contextlib.contextmanager
+    def output_stage(self, name, **counts):
+        """Measure a writer as the stage ``name``; the Stage's ``errors`` is the ErrorReport to pass to it.
+
+        The notes, chords and rests the writer counted become counts of the
+        stage, and its failures are merged into ``errors``.
+        """
+        with self.stage(name, **counts) as record:
+            record.errors = ErrorReport()
+            try:
+                yield record
+            finally:
+                record.counts.update(record.errors.events)
+                record.counts["errors"] = len(record.errors)
+                self.errors.merge(record.errors)
+
+    def update(self, other):
+        """Add the stages and errors of another report, e.g. one from a worker process."""
+        self.stages.extend(other.stages)
+        self.errors.update(other.errors)
+
+    def __getstate__(self):
+        # A profiler cannot be pickled; reports from worker processes are merged without one
+        state = dict(self.__dict__)
+        state["profiler"] = None
+        return state
+
+    def profile_stats(self, limit=PROFILE_FUNCTIONS):
+        """The functions with the most cumulative time, as dicts."""
+        if self.profiler is None:
+            return None
+        import io
+        import pstats
+
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        stats.sort_stats("cumulative")
+        entries = []
+        for function in stats.fcn_list[:limit]:
+            calls, primitive_calls, total, cumulative, _ = stats.stats[function]
+            filename, line, name = function
+            entries.append({"function": f"{filename}:{line}({name})", "calls": calls,
+                            "total_seconds": round(total, 4), "cumulative_seconds": round(cumulative, 4)})
+        return entries
+
+    def dump_profile(self, path):
+        """Write the cProfile statistics to ``path`` for pstats or a profile viewer."""
+        if self.profiler is not None:
+            self.profiler.dump_stats(path)
+
+    def finish(self):
+        """Stop the run clock; called once the last stage has run."""
+        self.seconds = time.perf_counter() - self._start
+
+    def to_dict(self):
+        import datetime
+        import platform
+
+        report = {
+            "version": REPORT_VERSION,
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "run": self.info,
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+            "peak_rss_bytes": peak_rss(),
+            "stages": [stage.to_dict() for stage in self.stages],
+            "error_count": len(self.errors),
+            "errors": self.errors.to_dict(),
+        }
+        profile = self.profile_stats()
+        if profile is not None:
+            report["profile"] = profile
+        return report
+
+    def write(self, path):
+        import json
+
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+
+    def lines(self):
+        """One line per stage, for printing."""
+        lines = []
+        for stage in self.stages:
+            entry = stage.to_dict()
+            rate = f", {entry['rows_per_second']} rows/s" if "rows_per_second" in entry else ""
+            cached = " (cached)" if entry.get("cached") else ""
+            lines.append(f"{stage.name:<24} {stage.seconds:>8.3f} s{rate}{cached}")
+        return lines
+
+
+def stage(report, name, **counts):
+    """report.stage(name), or a context that measures nothing when ``report`` is None."""
+    if report is None:
+        return contextlib.nullcontext(Stage(name, counts))
+    return report.stage(name, **counts)
+
+
+def output_stage(report, name, **counts):
+    """report.output_stage(name), or a context that measures nothing when ``report`` is None.
+
+    Without a report the Stage has no ``errors``, so the writer prints its own summary.
+    """
+    if report is None:
+        return contextlib.nullcontext(Stage(name, counts))
+    return report.output_stage(name, **counts)
+
+
+def aggregate(reports):
+    """Sum the stages of report dicts by stage name: count, seconds and rows."""
+    totals = {}
+    for report in reports:
+        for entry in report["stages"]:
+            total = totals.setdefault(entry["stage"], {"count": 0, "seconds": 0.0, "rows": 0})
+            total["count"] += 1
+            total["seconds"] = round(total["seconds"] + (entry["seconds"] or 0), 4)
+            total["rows"] += entry.get("rows") or 0
+    for total in totals.values():
+        if total["seconds"]:
+            total["rows_per_second"] = round(total["rows"] / total["seconds"])
+    return {
+        "runs": len(reports),
+        "seconds": round(sum(report["seconds"] or 0 for report in reports), 4),
+        "error_count": sum(report["error_count"] for report in reports),
+        "stages": totals,
+    }
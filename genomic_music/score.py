@@ -0,0 +1,161 @@
+"""music21 score construction for the annotated chord tables of both pipelines."""
+
+from music21 import stream, meter, instrument, chord, note, articulations
+
+from .instruments import instrument_class
+from .notes import pitch_pool
+from .report import ErrorReport
+from .voicings import scale_type_intervals, triad_intervals, voicing_cache
+
+
+def _new_part(header):
+    # Every score gets its own instrument objects
+    part = stream.Part()
+    part.insert(0, getattr(instrument, instrument_class(header))())
+    return part
+
+
+def _is_accent(value):
+    return value.strip().lower() == "accent"
+
+
+def _report(errors, own_report):
+    # Callers that pass no report still hear about failures, once per score
+    if own_report:
+        errors.print_summary()
+
+
+def _count_events(elements, errors):
+    # Notes, chords and rests of a part, counted as musicxml.part_events counts them
+    for element in elements:
+        errors.add_event("rests" if element.isRest else "chords" if element.isChord else "notes")
+    return elements
+
+
+def build_part(table, header, errors, with_introns=False):
+    """Build the music21 Part of one header of a chord table.
+
+    Only the rows of ``header`` are read, so parts can be built separately
+    and from separate tables; build_score and build_intron_score put them
+    together. Its notes, chords and rests are counted in ``errors.events``.
+    """
+    part_table = table.select(table.equals("header", header))
+    part = _new_part(header)
+    pitches = part_table.column("pitch")
+    accents = [_is_accent(value) for value in part_table.column("accent")]
+    # With the columns of conservation.add_dynamics, they set the accents and velocities
+    emphasis, velocities = accents, None
+    if "velocity" in part_table.columns:
+        emphasis = [_is_accent(value) for value in part_table.column("emphasis")]
+        velocities = [int(value) for value in part_table.column("velocity")]
+
+    if header != "SequenceX":
+        if with_introns:
+            # Pitches are a name followed by a single octave digit; anything
+            # else is a rest
+            pitches = [value if len(value) > 1 and value[-1].isdigit() else "" for value in pitches]
+        # Handle individual notes for other sequences
+        part.append(_count_events(pitch_pool.build_notes(pitches, emphasis, 0.5, errors, velocities), errors))
+        return part
+
+    part.append(_count_events(_intron_chord_track(part_table, pitches, accents, errors) if with_introns
+                              else _chord_track(part_table, pitches, accents, errors, emphasis, velocities), errors))
+    return part
+
+
+def _chord_track(part_table, pitches, accents, errors, emphasis=None, velocities=None):
+    # Process chords for SequenceX
+    amino_acid_chords = part_table.column("amino_acid_chord")
+    scale_types = [value.strip().lower() for value in part_table.column("scale_type")]
+    chords = []
+    for i, root_note in enumerate(pitches):
+        if not (accents[i] and root_note and amino_acid_chords[i] and scale_types[i]):
+            continue
+        try:
+            # Define the chord based on scale_type and amino_acid_chord; the
+            # voicing is transposed once per (root, scale type) and reused
+            intervals = scale_type_intervals.get(scale_types[i], ())
+            created_chord = chord.Chord(list(voicing_cache.get(root_note, intervals)))
+            created_chord.quarterLength = 1.5  # Dotted quarter note duration
+
+            # Add accent articulation
+            if emphasis is None or emphasis[i]:
+                created_chord.articulations.append(articulations.Accent())
+            if velocities is not None:
+                created_chord.volume.velocity = velocities[i]
+            chords.append(created_chord)
+        except Exception as e:
+            errors.add("chord", f"{root_note} {scale_types[i]}", e)
+    return chords
+
+
+def _intron_chord_track(part_table, pitches, accents, errors):
+    # Handle SequenceX to create chords
+    types = [value.strip().lower() for value in part_table.column("type")]
+    chord_types = part_table.column("amino_acid_chord")
+    elements = []
+    for i, root_note in enumerate(pitches):
+        if types[i] == "exon":
+            # Create a triad based on the root note from the pitch column
+            chord_type = chord_types[i]
+            if not root_note:
+                continue
+            try:
+                # Define triad notes based on the root, all within the same octave;
+                # the voicing is transposed once per (root, chord quality) and reused
+                chord_obj = chord.Chord(list(voicing_cache.get(root_note, triad_intervals(chord_type))))
+                chord_obj.duration.quarterLength = 1.5  # Set duration to eighth note
+                # Add accent if specified in the CSV
+                if accents[i]:
+                    chord_obj.articulations.append(articulations.Accent())
+                elements.append(chord_obj)
+            except Exception as e:
+                errors.add("chord", f"{root_note} {chord_type}", e)
+        elif types[i] == "intron":
+            # Add a rest for intron type
+            elements.append(note.Rest(quarterLength=0.5))
+    return elements
+
+
+def build_score(table, errors=None):
+    """Build a 3/8 music21 Score with one Part per sequence header.
+
+    SequenceX rows become chords on accented bases and every other sequence
+    contributes one eighth note or rest per base, built a whole column at a
+    time. Pitches or chords that cannot be built are counted in ``errors``
+    (an ErrorReport); without one, a summary is printed at the end.
+    """
+    own_report = errors is None
+    errors = ErrorReport() if own_report else errors
+
+    # Initialize the score
+    score = stream.Score()
+    meter_obj = meter.TimeSignature('3/8')
+    score.append(meter_obj)
+
+    for header in table.distinct("header"):
+        score.append(build_part(table, header, errors))
+
+    _report(errors, own_report)
+    return score
+
+
+def build_intron_score(table, errors=None):
+    """Build the 3/8 score of the pipeline with introns.
+
+    SequenceX exon rows become triads on the root in the pitch column, intron
+    rows become eighth rests and every other sequence contributes one eighth
+    note or rest per base. Failures are handled as in build_score.
+    """
+    own_report = errors is None
+    errors = ErrorReport() if own_report else errors
+
+    score = stream.Score()
+    meter_obj = meter.TimeSignature('3/8')
+    score.insert(0, meter_obj)
+
+    for header in table.distinct("header"):
+        score.append(build_part(table, header, errors, with_introns=True))
+
+    _report(errors, own_report)
+    return score
@@ -0,0 +1,147 @@
+"""Windowed rendering: a long FASTA file as a series of fixed-size sections.
+
+A locus tens of kilobases long makes a MusicXML score with one note per base
+that notation software struggles to open. write_sections cuts the bases
+into windows of a whole number of codons (in 3/8 a codon is one measure of
+a sequence part) and renders each window to its own MusicXML, MIDI and
+audio files. Every section reads only its own bytes of an uncompressed
+FASTA file through the ``.fai`` index, so memory is bounded by the window
+size rather than by the length of the gene, and sections are rendered in
+parallel processes and written as soon as they are done.
+
+A JSON manifest lists the sections in order with where each one starts in
+the sequence and in time, the length of each part and the files of each
+section. Concatenating the measures of each part over the sections gives
+the notes of the whole score; placing each section at its
+``offset_seconds`` gives the audio timeline.
+"""
+
+import concurrent.futures
+import json
+import os
+
+from . import pipeline
+from .fasta import record_lengths
+from .mappings import scheme_for
+
+DEFAULT_SECTION_CODONS = 256
+MANIFEST_VERSION = 1
+
+_extensions = {"musicxml": ".musicxml", "midi_file": ".mid"}
+
+
+def section_regions(length, section_codons):
+    """0-based (start, end) of the bases of each section of a ``length``-base sequence."""
+    if section_codons < 1:
+        raise ValueError(f"a section needs at least one codon, not {section_codons}")
+    size = 3 * section_codons
+    return [(start, min(start + size, length)) for start in range(0, length, size)]
+
+
+def _part_lengths(chord_table, with_introns):
+    # Length in eighths of every part of a section, as the score writers lay it out
+    from .musicxml import part_events
+    from .report import ErrorReport
+
+    errors = ErrorReport()  # the writers report the failures themselves
+    return {header: sum(length for _, length, _, _ in part_events(chord_table, header, errors, with_introns))
+            for header in chord_table.distinct("header")}
+
+
+def _render_section(fasta_path, coordinates, region, outputs, backend, scheme, records, cache, with_dynamics):
+    # Runs in a worker process: annotate, add chords and write one window
+    chord_table = pipeline.run(fasta_path, coordinates, backend=backend, workers=1, cache=cache, scheme=scheme,
+                               records=records, region=region, with_dynamics=with_dynamics, **outputs)
+    counts = (cache.hits, cache.misses) if cache is not None else None
+    return _part_lengths(chord_table, bool(coordinates)), counts
+
+
+def write_sections(fasta_path, output_dir, name=None, coordinates=None, section_codons=DEFAULT_SECTION_CODONS,
+                   musicxml=True, midi=False, audio=None, backend="direct", scheme=None, records=None,
+                   workers=None, cache=None, with_dynamics=False):
+    """Render a FASTA file as sections of ``section_codons`` codons and write their manifest.
+
+    Section ``i`` goes to ``output_dir/{name}_{i:03d}`` plus the extension
+    of each output: .musicxml, .mid with ``midi``, and the ``audio`` format
+    ("wav", "mp3" or "flac"). ``name`` defaults to the FASTA file name.
+    ``coordinates``, ``backend``, ``scheme``, ``records``, ``cache`` and
+    ``with_dynamics`` are those of pipeline.run; the dynamics of a column
+    only depend on that column, so sections get the dynamics of the whole
+    alignment. Sections are rendered by ``workers`` processes
+    (None: one per CPU). Returns the path of ``{name}_manifest.json``.
+    """
+    from .midi import TEMPO_BPM
+
+    if backend not in ("direct", "music21"):
+        raise ValueError(f"unknown MusicXML backend {backend!r}")
+    with_introns = bool(coordinates)
+    pipeline._check_dynamics(with_dynamics, with_introns)
+    if scheme is not None:
+        scheme = scheme_for(scheme, with_introns)
+    if name is None:
+        name = os.path.basename(fasta_path).split(".")[0]
+
+    lengths = [length for number, length in enumerate(record_lengths(fasta_path), start=1)
+               if records is None or number in records]
+    if not lengths:
+        raise ValueError(f"{fasta_path}: no records to render")
+    regions = section_regions(max(lengths), section_codons)
+
+    os.makedirs(output_dir, exist_ok=True)
+    extensions = {keyword: extension for keyword, extension in _extensions.items()
+                  if (musicxml if keyword == "musicxml" else midi)}
+    if audio:
+        extensions["audio_file"] = "." + audio
+    outputs = [{keyword: os.path.join(output_dir, f"{name}_{i:03d}{extension}")
+                for keyword, extension in extensions.items()} for i in range(len(regions))]
+
+    arguments = [(fasta_path, coordinates, region, section_outputs, backend, scheme, records, cache, with_dynamics)
+                 for region, section_outputs in zip(regions, outputs)]
+    if workers == 1 or len(regions) == 1:
+        results = [_render_section(*section) for section in arguments]
+    else:
+        hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_render_section, *zip(*arguments)))
+        if cache is not None:
+            # Each process counted on its own copy of the cache, starting from this one's counts
+            cache.add_counts(sum(counts[0] - hits for _, counts in results),
+                             sum(counts[1] - misses for _, counts in results))
+
+    seconds_per_eighth = 30.0 / TEMPO_BPM
+    sections = []
+    offset = 0
+    for i, ((start, end), section_outputs, (parts, _)) in enumerate(zip(regions, outputs, results)):
+        length = max(parts.values(), default=0)
+        sections.append({
+            "index": i,
+            "start": start + 1,
+            "end": end,
+            "offset_eighths": offset,
+            "length_eighths": length,
+            "offset_seconds": round(offset * seconds_per_eighth, 6),
+            "parts": parts,
+            "files": {keyword.replace("_file", ""): os.path.basename(path)
+                      for keyword, path in section_outputs.items()},
+        })
+        offset += length
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "fasta": os.path.abspath(fasta_path),
+        "coordinates": os.path.abspath(coordinates) if coordinates else None,
+        "scheme": scheme.name if scheme is not None else None,
+        "records": sorted(records) if records is not None else None,
+        "dynamics": with_dynamics,
+        "section_codons": section_codons,
+        "meter": "3/8",
+        "tempo_bpm": TEMPO_BPM,
+        "bases": max(lengths),
+        "length_eighths": offset,
+        "sections": sections,
+    }
+    manifest_path = os.path.join(output_dir, f"{name}_manifest.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return manifest_path
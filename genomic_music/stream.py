@@ -0,0 +1,437 @@
+"""Streaming sonification of long alignments.
+
+The FASTA file is annotated and given chords a window of codons at a time,
+with the same stages as the batch pipeline, so the first notes can be heard
+after one window instead of after the whole score. NoteStream.events is an
+asyncio generator of NoteEvents in time order; the sinks below turn it into
+raw PCM, a WAV stream, MIDI messages or JSON lines on a file, stdout or a TCP
+connection, and serve streams it to every client that connects. Nothing
+needs an audio device: pipe the PCM into a player, or write a file.
+
+An uncompressed FASTA file is read through its ``.fai`` index one window at
+a time: only the record lengths and one window of bases and rows are kept.
+A gzip-compressed file cannot be indexed and is read whole before the first
+window. Events are released in time order, so those of the sequence parts
+wait until the SequenceX chord track (three eighths per coding codon, none
+for gaps and stop codons) has caught up with them; they grow with how far
+that track falls behind. A slow consumer holds the producer back through
+``drain``.
+"""
+
+import asyncio
+import heapq
+import json
+import os
+import sys
+
+import numpy as np
+
+from . import chords as exon_chords
+from . import introns
+from .columnar import TableWriter
+from .coordinates import CDSIndex, read_cds_coordinates
+from .fasta import IndexedFasta, read_fasta
+from .instruments import instrument_program
+from .mappings import scheme_for
+from .midi import TEMPO_BPM, TICKS_PER_QUARTER, midi_keys, note_velocity, part_channel, variable_length
+from .musicxml import PitchCache, part_events
+from .report import ErrorReport
+from .synth import RELEASE_SECONDS, SAMPLE_RATE, NoteList, overlap, pcm16, render_chunk
+from .translate import (ANNOTATION_FIELDS, GAP, annotate_alignment, annotate_locus, annotation_columns,
+                        frame_context)
+
+WINDOW_CODONS = 64
+BLOCK_SECONDS = 0.5
+LOOKAHEAD_SECONDS = 0.1
+
+FORMATS = ("wav", "pcm", "midi", "events")
+
+
+class NoteEvent:
+    """A note or chord of one part; ``time`` and ``length`` are in eighth notes."""
+
+    __slots__ = ("time", "header", "part", "keys", "length", "velocity")
+
+    def __init__(self, time, header, part, keys, length, velocity):
+        self.time = time
+        self.header = header
+        self.part = part
+        self.keys = keys
+        self.length = length
+        self.velocity = velocity
+
+
+class NoteStream:
+    """Timed note events of one FASTA file, computed a window at a time.
+
+    ``coordinates`` selects the pipeline with introns and ``scheme`` the
+    mapping scheme, as in pipeline.run. ``headers`` lists the parts once the
+    FASTA file has been read.
+    """
+
+    def __init__(self, fasta_path, coordinates=None, window_codons=WINDOW_CODONS, errors=None, scheme=None):
+        self.fasta_path = fasta_path
+        self.coordinates = coordinates
+        self.scheme = scheme_for(scheme, coordinates) if scheme is not None else None
+        self.window_codons = window_codons
+        self.errors = ErrorReport() if errors is None else errors
+        self.headers = []
+
+    def _open(self):
+        # (fetch, lengths, indexed file or None): fetch(i, start, end) returns bases start to end of
+        # record i, read from the .fai index of an uncompressed file and from memory otherwise
+        upper = bool(self.coordinates)
+        try:
+            indexed = IndexedFasta(self.fasta_path)
+        except ValueError:  # compressed, or wrapped irregularly
+            records = [sequence for _, sequence in read_fasta(self.fasta_path, upper=upper)]
+            return (lambda i, start, end: records[i][start:end]), [len(sequence) for sequence in records], None
+        positions = [i for i, record in enumerate(indexed.index) if record.length]
+        lengths = [indexed.index[position].length for position in positions]
+        return (lambda i, start, end: indexed.fetch(positions[i], start, end, upper)), lengths, indexed
+
+    def _load(self):
+        fetch, lengths, indexed = self._open()
+        try:
+            if self.coordinates:
+                cds_regions, start_offset = read_cds_coordinates(self.coordinates)
+                return fetch, lengths, (start_offset, CDSIndex(cds_regions)), indexed
+            if len(lengths) < 2:
+                raise ValueError(f"{self.fasta_path}: at least two records are needed, Sequence2 is the reference")
+            if any(length > lengths[1] for length in lengths):
+                raise IndexError("reference sequence is shorter than the aligned sequence")
+        except BaseException:
+            if indexed is not None:
+                indexed.close()
+            raise
+        return fetch, lengths, None, indexed
+
+    def _windows(self, fetch, lengths, locus):
+        # Chord tables of consecutive windows, each read when it is needed; windows start on codon boundaries
+        step = 3 * self.window_codons
+        if self.scheme is not None:
+            add_chords = self.scheme.add_chords
+        else:
+            add_chords = (introns if locus else exon_chords).add_chords
+        preceding = [0] * len(lengths)  # bases (not gaps) of each record before the window
+        for start in range(0, max(lengths, default=0), step):
+            if locus:
+                start_offset, cds_index = locus
+                with TableWriter(None, introns.LOCUS_FIELDS) as writer:
+                    for i in range(len(lengths)):
+                        piece = fetch(i, start, start + step)
+                        if len(piece) >= 3:
+                            annotation = annotate_locus(piece, start_offset + start, cds_index)
+                            writer.write_columns(introns.locus_columns(f"Sequence{i + 1}", annotation))
+                yield add_chords(writer.table)
+            else:
+                reference = fetch(1, start, start + step)
+                with TableWriter(None, ANNOTATION_FIELDS) as writer:
+                    for i, length in enumerate(lengths):
+                        piece = fetch(i, start, start + step)
+                        if piece:
+                            before, after = frame_context(lambda a, b: fetch(i, a, b), length, start, piece,
+                                                          preceding[i])
+                            preceding[i] += len(piece) - piece.count(GAP)
+                            annotation = annotate_alignment(piece, reference, before, after)
+                            annotation.position = annotation.position + start
+                            writer.write_columns(annotation_columns(f"Sequence{i + 1}", annotation))
+                yield add_chords(writer.table)
+
+    async def events(self):
+        """Yield every NoteEvent in time order.
+
+        Windows are computed in a worker thread so other streams keep
+        playing meanwhile. An event is released once every part still
+        sounding has moved past it.
+        """
+        loop = asyncio.get_running_loop()
+        fetch, lengths, locus, indexed = await loop.run_in_executor(None, self._load)
+        try:
+            async for event in self._events(loop, fetch, lengths, locus):
+                yield event
+        finally:
+            if indexed is not None:
+                indexed.close()
+
+    async def _events(self, loop, fetch, lengths, locus):
+        self.headers = [f"Sequence{i + 1}" for i in range(len(lengths))] + ["SequenceX"]
+        parts = {header: i for i, header in enumerate(self.headers)}
+        with_introns = locus is not None
+        pitch_cache = PitchCache()
+        positions = {}
+        pending = []
+        order = 0
+
+        windows = self._windows(fetch, lengths, locus)
+        while True:
+            table = await loop.run_in_executor(None, next, windows, None)
+            if table is None:
+                break
+            active = table.distinct("header")
+            for header in active:
+                position = positions.get(header, 0)
+                for pitches, length, accent, velocity in part_events(table, header, self.errors, with_introns,
+                                                                     pitch_cache):
+                    keys = midi_keys(pitches, self.errors)
+                    if keys:
+                        event = NoteEvent(position, header, parts[header], keys, length,
+                                          note_velocity(accent, velocity))
+                        heapq.heappush(pending, (position, event.part, order, event))
+                        order += 1
+                    position += length
+                positions[header] = position
+            # Parts missing from a window have ended, so only active parts hold events back
+            watermark = min(positions[header] for header in active)
+            while pending and pending[0][0] < watermark:
+                yield heapq.heappop(pending)[-1]
+        while pending:
+            yield heapq.heappop(pending)[-1]
+
+
+async def paced(items, tempo_bpm=TEMPO_BPM, lookahead=LOOKAHEAD_SECONDS):
+    """Pass on (time in eighths, item) pairs no earlier than their playing time."""
+    loop = asyncio.get_running_loop()
+    seconds_per_eighth = 30.0 / tempo_bpm
+    start = loop.time()
+    async for time, item in items:
+        delay = start + time * seconds_per_eighth - lookahead - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield time, item
+
+
+def _wav_header(sample_rate, data_size=0xFFFFFFFF - 36):
+    # Streams of unknown length use the largest size; files are patched on close
+    return (b"RIFF" + (36 + data_size).to_bytes(4, "little") + b"WAVEfmt "
+            + (16).to_bytes(4, "little") + (1).to_bytes(2, "little") + (1).to_bytes(2, "little")
+            + sample_rate.to_bytes(4, "little") + (2 * sample_rate).to_bytes(4, "little")
+            + (2).to_bytes(2, "little") + (16).to_bytes(2, "little")
+            + b"data" + data_size.to_bytes(4, "little"))
+
+
+async def write_pcm(stream, writer, sample_rate=SAMPLE_RATE, tempo_bpm=TEMPO_BPM, wav=False,
+                    block_seconds=BLOCK_SECONDS):
+    """Render the events to 16-bit mono PCM, a block of ``block_seconds`` at a time.
+
+    With ``wav`` a WAV header comes first; its sizes are filled in at the end
+    when ``writer`` is a seekable file. The output is not paced: a consumer
+    playing it in real time holds the renderer back.
+    """
+    samples_per_eighth = sample_rate * 30.0 / tempo_bpm
+    release = int(RELEASE_SECONDS * sample_rate)
+    block = int(block_seconds * sample_rate)
+    if wav:
+        writer.write(_wav_header(sample_rate))
+    written = 0
+    block_start = 0
+    carry = np.zeros(0, dtype=np.float32)
+    starts, lengths, keys, velocities = [], [], [], []
+    end = 0
+    gain = None
+
+    async def flush(keep):
+        nonlocal block_start, carry, written
+        notes = NoteList(np.asarray(starts, dtype=np.int64), np.asarray(lengths, dtype=np.int64),
+                         np.asarray(keys, dtype=np.int16), np.asarray(velocities, dtype=np.int16))
+        buffer = overlap(render_chunk(notes, block_start, block, sample_rate), carry)
+        data = pcm16(buffer[:keep], gain)
+        writer.write(data)
+        await writer.drain()
+        written += len(data)
+        carry = buffer[keep:]
+        block_start += block
+        for column in (starts, lengths, keys, velocities):
+            column.clear()
+
+    async for event in stream.events():
+        if gain is None:
+            # Each sequence plays one note at a time and SequenceX up to four
+            gain = 0.9 / np.sqrt(len(stream.headers) + 3)
+        start = int(round(event.time * samples_per_eighth))
+        length = int(round(event.length * samples_per_eighth))
+        while start >= block_start + block:
+            await flush(block)
+        for key in event.keys:
+            starts.append(start)
+            lengths.append(length)
+            keys.append(key)
+            velocities.append(event.velocity)
+        end = max(end, start + length + release)
+    while block_start < end:
+        await flush(min(block, end - block_start))
+
+    if wav and writer.seekable():
+        writer.seek(0)
+        writer.write(_wav_header(sample_rate, written))
+
+
+async def midi_messages(stream):
+    """Yield (time in eighths, MIDI message) for the events, note-offs included."""
+    note_offs = []
+    programs = set()
+    order = 0
+    async for event in stream.events():
+        while note_offs and note_offs[0][0] <= event.time:
+            time, _, message = heapq.heappop(note_offs)
+            yield time, message
+        channel = part_channel(event.part)
+        if event.part not in programs:
+            programs.add(event.part)
+            _, program = instrument_program(event.header)
+            yield event.time, bytes([0xC0 | channel, program & 0x7F])
+        for key in event.keys:
+            yield event.time, bytes([0x90 | channel, key, event.velocity])
+            heapq.heappush(note_offs, (event.time + event.length, order, bytes([0x80 | channel, key, 0])))
+            order += 1
+    while note_offs:
+        time, _, message = heapq.heappop(note_offs)
+        yield time, message
+
+
+async def write_midi(stream, writer, tempo_bpm=TEMPO_BPM, realtime=True):
+    """Send the events as MIDI.
+
+    To a seekable file this writes a type 0 Standard MIDI File. Anywhere else
+    the bare MIDI messages are sent as they would go down a MIDI cable, paced
+    in real time unless ``realtime`` is false.
+    """
+    if not writer.seekable():
+        messages = midi_messages(stream)
+        async for _, message in (paced(messages, tempo_bpm) if realtime else messages):
+            writer.write(message)
+            await writer.drain()
+        return
+
+    ticks_per_eighth = TICKS_PER_QUARTER // 2
+    microseconds = round(60_000_000 / tempo_bpm)
+    writer.write(b"MThd" + (6).to_bytes(4, "big") + (0).to_bytes(2, "big") + (1).to_bytes(2, "big")
+                 + TICKS_PER_QUARTER.to_bytes(2, "big") + b"MTrk" + bytes(4))
+    track = (b"\x00\xff\x51\x03" + microseconds.to_bytes(3, "big")
+             + b"\x00\xff\x58\x04\x03\x03\x0c\x08")  # 3/8
+    writer.write(track)
+    length = len(track)
+    previous = 0
+    async for time, message in midi_messages(stream):
+        data = variable_length((time - previous) * ticks_per_eighth) + message
+        writer.write(data)
+        await writer.drain()
+        length += len(data)
+        previous = time
+    writer.write(b"\x00\xff\x2f\x00")
+    writer.seek(18)
+    writer.write((length + 4).to_bytes(4, "big"))
+
+
+async def write_events(stream, writer, tempo_bpm=TEMPO_BPM, realtime=True):
+    """Send the events as JSON lines with times in seconds, paced unless ``realtime`` is false."""
+    seconds_per_eighth = 30.0 / tempo_bpm
+
+    async def timed():
+        async for event in stream.events():
+            yield event.time, event
+
+    async for time, event in (paced(timed(), tempo_bpm) if realtime else timed()):
+        line = {"time": time * seconds_per_eighth, "part": event.header, "keys": event.keys,
+                "duration": event.length * seconds_per_eighth, "velocity": event.velocity}
+        writer.write((json.dumps(line) + "\n").encode())
+        await writer.drain()
+
+
+async def stream_to(writer, fasta_path, coordinates=None, format="wav", realtime=None, tempo_bpm=TEMPO_BPM,
+                    window_codons=WINDOW_CODONS, sample_rate=SAMPLE_RATE, errors=None, scheme=None):
+    """Stream one FASTA file to ``writer`` in ``format`` (one of FORMATS).
+
+    ``writer`` has the asyncio.StreamWriter ``write``/``drain`` interface
+    plus ``seekable``. MIDI and JSON events are paced in real time unless
+    ``realtime`` is false; by default they are paced except into files.
+    ``scheme`` names the mapping scheme of the chord stage.
+    """
+    stream = NoteStream(fasta_path, coordinates, window_codons, errors, scheme)
+    if realtime is None:
+        realtime = not writer.seekable()
+    if format in ("wav", "pcm"):
+        await write_pcm(stream, writer, sample_rate, tempo_bpm, wav=format == "wav")
+    elif format == "midi":
+        await write_midi(stream, writer, tempo_bpm, realtime)
+    elif format == "events":
+        await write_events(stream, writer, tempo_bpm, realtime)
+    else:
+        raise ValueError(f"unknown stream format {format!r}; use one of {', '.join(FORMATS)}")
+    return stream
+
+
+class _FileWriter:
+    """StreamWriter-like wrapper around a binary file or stdout."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, data):
+        self.f.write(data)
+
+    async def drain(self):
+        self.f.flush()
+
+    def seekable(self):
+        return self.f.seekable()
+
+    def seek(self, offset):
+        self.f.seek(offset)
+
+
+class _SocketWriter:
+    # asyncio.StreamWriter for a client connection, never seekable
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, data):
+        self.writer.write(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def seekable(self):
+        return False
+
+
+def play(fasta_path, output="-", **options):
+    """Stream one FASTA file to a file path, or to stdout for "-".
+
+    ``options`` are those of stream_to. Rows that could not be turned into
+    notes are summarised on stderr.
+    """
+    errors = ErrorReport()
+    if output == "-":
+        try:
+            asyncio.run(stream_to(_FileWriter(sys.stdout.buffer), fasta_path, errors=errors, **options))
+        except BrokenPipeError:
+            # The player stopped reading; keep the interpreter from flushing into the closed pipe
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    else:
+        with open(output, "wb") as f:
+            asyncio.run(stream_to(_FileWriter(f), fasta_path, errors=errors, **options))
+    for line in errors.lines():
+        print(line, file=sys.stderr)
+
+
+async def serve(fasta_path, host="127.0.0.1", port=8765, **options):
+    """Serve the stream of one FASTA file to every TCP client that connects.
+
+    Each client gets the whole piece from the start; ``options`` are those
+    of stream_to. Runs until cancelled.
+    """
+    async def handle(reader, writer):
+        try:
+            await stream_to(_SocketWriter(writer), fasta_path, **options)
+        except (ConnectionError, OSError):
+            pass  # the client went away
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    address = ", ".join(f"{host}:{port}" for host, port, *_ in (s.getsockname() for s in server.sockets))
+    print(f"Streaming {os.path.basename(fasta_path)} on {address}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,230 @@
+"""Offline audio rendering of the chord table with a small NumPy synthesizer.
+
+Every note is an additive piano-like tone: a few harmonics under an attack /
+exponential-decay / release envelope. Notes with the same key, length and
+velocity sound identical, so each such waveform is computed once and then
+added into the output wherever it occurs. The timeline is cut into chunks
+that are rendered in parallel worker processes and stitched back together
+with their release tails overlapping, then streamed to a WAV file. MP3 and
+FLAC are encoded from that WAV with pydub when ffmpeg is available.
+"""
+
+import collections
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import wave
+
+import numpy as np
+
+from .midi import TEMPO_BPM, midi_keys, note_velocity
+from .musicxml import part_events
+from .report import ErrorReport
+
+SAMPLE_RATE = 44100
+CHUNK_SECONDS = 10.0
+RELEASE_SECONDS = 0.08
+ATTACK_SECONDS = 0.005
+DECAY_SECONDS = 0.6
+
+# Relative amplitudes of the first harmonics
+harmonics = np.array([1.0, 0.5, 0.25, 0.12, 0.06], dtype=np.float32)
+
+
+class NoteList:
+    """Struct-of-arrays note list: start and length in samples, MIDI key and velocity."""
+
+    def __init__(self, starts, lengths, keys, velocities):
+        self.starts = starts
+        self.lengths = lengths
+        self.keys = keys
+        self.velocities = velocities
+
+    def __len__(self):
+        return len(self.starts)
+
+    def select(self, mask):
+        return NoteList(self.starts[mask], self.lengths[mask], self.keys[mask], self.velocities[mask])
+
+
+def _part_notes(events, errors):
+    # Flattened (start, length, key, velocity) in eighths of every note of one part,
+    # followed by a (part length, 0, -1, 0) row
+    position = 0
+    for pitches, length, accent, velocity in events:
+        velocity = note_velocity(accent, velocity)
+        for key in midi_keys(pitches, errors):
+            yield from (position, length, key, velocity)
+        position += length
+    yield from (position, 0, -1, 0)
+
+
+def collect_notes(table, with_introns=False, errors=None, sample_rate=SAMPLE_RATE, tempo_bpm=TEMPO_BPM):
+    """Return the NoteList of every part and the total length in samples.
+
+    The notes of each part are read straight into a NumPy array. Pitches
+    outside the MIDI key range are left out and counted in ``errors``, as
+    in the MIDI output.
+    """
+    errors = ErrorReport() if errors is None else errors
+    samples_per_eighth = sample_rate * 30.0 / tempo_bpm
+    parts = [np.zeros((0, 4), dtype=np.int64)]
+    total = 0
+    for header in table.distinct("header"):
+        events = part_events(table, header, errors, with_introns)
+        part = np.fromiter(_part_notes(events, errors), dtype=np.int64).reshape(-1, 4)
+        total = max(total, int(part[-1, 0]))
+        parts.append(part[:-1])
+    notes = np.concatenate(parts)
+    notes = NoteList(
+        np.rint(notes[:, 0] * samples_per_eighth).astype(np.int64),
+        np.rint(notes[:, 1] * samples_per_eighth).astype(np.int64),
+        notes[:, 2].astype(np.int16),
+        notes[:, 3].astype(np.int16),
+    )
+    return notes, int(round(total * samples_per_eighth))
+
+
+def tone(key, length, velocity, sample_rate=SAMPLE_RATE):
+    """Waveform of one note: ``length`` samples plus its release tail."""
+    release = int(RELEASE_SECONDS * sample_rate)
+    t = np.arange(length + release, dtype=np.float32) / sample_rate
+    frequency = 440.0 * 2.0 ** ((key - 69) / 12.0)
+    signal = np.zeros_like(t)
+    for k, amplitude in enumerate(harmonics, start=1):
+        if frequency * k >= sample_rate / 2:
+            break
+        signal += amplitude * np.sin(2 * np.pi * frequency * k * t)
+    envelope = np.exp(-t / DECAY_SECONDS)
+    attack = int(ATTACK_SECONDS * sample_rate)
+    envelope[:attack] *= np.linspace(0.0, 1.0, attack, dtype=np.float32)
+    envelope[length:] *= np.linspace(1.0, 0.0, release, dtype=np.float32)
+    return (velocity / 127.0) * signal * envelope / harmonics.sum()
+
+
+def render_chunk(notes, start, length, sample_rate=SAMPLE_RATE):
+    """Render the notes that begin in [start, start + length).
+
+    The returned buffer is longer than ``length`` by the longest note plus
+    its release, so the tail can be overlapped with the next chunk.
+    """
+    tail = int(notes.lengths.max()) if len(notes) else 0
+    buffer = np.zeros(length + tail + int(RELEASE_SECONDS * sample_rate), dtype=np.float32)
+    waveforms = {}
+    for note_start, note_length, key, velocity in zip(notes.starts.tolist(), notes.lengths.tolist(),
+                                                       notes.keys.tolist(), notes.velocities.tolist()):
+        waveform = waveforms.get((key, note_length, velocity))
+        if waveform is None:
+            waveform = waveforms[(key, note_length, velocity)] = tone(key, note_length, velocity, sample_rate)
+        offset = note_start - start
+        buffer[offset:offset + len(waveform)] += waveform
+    return buffer
+
+
+def overlap(buffer, carry):
+    """Add the tail carried over from the previous chunk to the start of ``buffer``."""
+    buffer[:len(carry)] += carry[:len(buffer)]
+    if len(carry) > len(buffer):
+        buffer = np.concatenate([buffer, carry[len(buffer):]])
+    return buffer
+
+
+def pcm16(samples, gain):
+    """Scale, soft clip and encode samples as 16-bit little-endian PCM."""
+    return (np.tanh(samples * gain) * 32767).astype("<i2").tobytes()
+
+
+def _polyphony(notes):
+    # Most notes sounding at once, used to scale the mix without a second pass
+    if not len(notes):
+        return 1
+    changes = np.concatenate([notes.starts, notes.starts + notes.lengths])
+    steps = np.concatenate([np.ones(len(notes), dtype=np.int64), -np.ones(len(notes), dtype=np.int64)])
+    order = np.lexsort((steps, changes))
+    return max(1, int(np.cumsum(steps[order]).max()))
+
+
+def _rendered_chunks(jobs, workers):
+    # Render chunks in order, keeping at most two per worker submitted ahead of the writer
+    if workers == 1:
+        for job in jobs:
+            yield render_chunk(*job)
+        return
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = iter(jobs)
+        in_flight = collections.deque()
+        for job in jobs:
+            in_flight.append(executor.submit(render_chunk, *job))
+            if len(in_flight) == 2 * workers:
+                break
+        while in_flight:
+            buffer = in_flight.popleft().result()
+            job = next(jobs, None)
+            if job is not None:
+                in_flight.append(executor.submit(render_chunk, *job))
+            yield buffer
+
+
+def write_wav(table, path, with_introns=False, workers=None, sample_rate=SAMPLE_RATE,
+              chunk_seconds=CHUNK_SECONDS, errors=None):
+    """Render a chord table to a 16-bit mono WAV file.
+
+    Chunks of ``chunk_seconds`` are rendered across ``workers`` processes
+    (default: one per CPU; 1 renders in this process) and written in order,
+    so memory is bounded by the chunks in flight (at most two per worker)
+    rather than the piece.
+    """
+    notes, total = collect_notes(table, with_introns, errors, sample_rate)
+    gain = 0.9 / np.sqrt(_polyphony(notes))
+    chunk_length = int(chunk_seconds * sample_rate)
+    n_chunks = max(1, -(-total // chunk_length))
+    chunk_notes = [notes.select((notes.starts >= i * chunk_length) & (notes.starts < (i + 1) * chunk_length))
+                   for i in range(n_chunks)]
+    jobs = ((chunk_notes[i], i * chunk_length, chunk_length, sample_rate) for i in range(n_chunks))
+
+    rendered = _rendered_chunks(jobs, workers)
+    try:
+        with wave.open(path, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(sample_rate)
+            carry = np.zeros(0, dtype=np.float32)
+            for i, buffer in enumerate(rendered):
+                buffer = overlap(buffer, carry)
+                if i < n_chunks - 1:
+                    keep = chunk_length
+                else:
+                    # Stop after the release of the last note
+                    keep = min(len(buffer), total - i * chunk_length + int(RELEASE_SECONDS * sample_rate))
+                out.writeframes(pcm16(buffer[:keep], gain))
+                carry = buffer[keep:]
+    finally:
+        # Stops the pool when writing fails part way
+        rendered.close()
+
+
+def render_audio(table, path, with_introns=False, workers=None, sample_rate=SAMPLE_RATE, errors=None):
+    """Render a chord table to .wav, or to .mp3/.flac when ffmpeg is available.
+
+    Notes that cannot be rendered are counted in ``errors`` (an ErrorReport).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".wav":
+        write_wav(table, path, with_introns, workers, sample_rate, errors=errors)
+        return
+    if extension not in (".mp3", ".flac"):
+        raise ValueError(f"unsupported audio format {extension!r}; use .wav, .mp3 or .flac")
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError(f"encoding {extension} needs ffmpeg; write a .wav file instead")
+
+    from pydub import AudioSegment
+
+    fd, wav_file = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        write_wav(table, wav_file, with_introns, workers, sample_rate, errors=errors)
+        AudioSegment.from_wav(wav_file).export(path, format=extension[1:])
+    finally:
+        os.remove(wav_file)
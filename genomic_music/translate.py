@@ -0,0 +1,289 @@
+"""Vectorized codon translation and per-base annotation.
+
+Sequences are encoded as uint8 arrays and translated through a 64-entry codon
+lookup table, so a whole record is annotated with a handful of array
+operations instead of a Python loop over every base.
+
+Aligned sequences are read in their own reading frame: gap columns are
+skipped when bases are grouped into codons, so a gap that is not a whole
+codon does not shift the codons after it, and gap columns become rests.
+"""
+
+import itertools
+
+import numpy as np
+
+from .fasta import IndexedFasta, read_fasta, read_records
+
+# Columns of the annotation table written by fa-to-csv.py
+ANNOTATION_FIELDS = ["header", "position", "sequence", "type", "codons", "duration", "accent"]
+
+# Codon to amino acid mapping
+dna_to_amino_acid = {
+    'TTT': 'F', 'TTC': 'F', 'TTA': 'L', 'TTG': 'L',
+    'CTT': 'L', 'CTC': 'L', 'CTA': 'L', 'CTG': 'L',
+    'ATT': 'I', 'ATC': 'I', 'ATA': 'I', 'ATG': 'M',  # Start codon (M)
+    'GTT': 'V', 'GTC': 'V', 'GTA': 'V', 'GTG': 'V',
+    'TCT': 'S', 'TCC': 'S', 'TCA': 'S', 'TCG': 'S',
+    'CCT': 'P', 'CCC': 'P', 'CCA': 'P', 'CCG': 'P',
+    'ACT': 'T', 'ACC': 'T', 'ACA': 'T', 'ACG': 'T',
+    'GCT': 'A', 'GCC': 'A', 'GCA': 'A', 'GCG': 'A',
+    'TAT': 'Y', 'TAC': 'Y', 'TAA': 'Stop', 'TAG': 'Stop',
+    'CAT': 'H', 'CAC': 'H', 'CAA': 'Q', 'CAG': 'Q',
+    'AAT': 'N', 'AAC': 'N', 'AAA': 'K', 'AAG': 'K',
+    'GAT': 'D', 'GAC': 'D', 'GAA': 'E', 'GAG': 'E',
+    'TGT': 'C', 'TGC': 'C', 'TGA': 'Stop', 'TGG': 'W',
+    'CGT': 'R', 'CGC': 'R', 'CGA': 'R', 'CGG': 'R',
+    'AGT': 'S', 'AGC': 'S', 'AGA': 'R', 'AGG': 'R',
+    'GGT': 'G', 'GGC': 'G', 'GGA': 'G', 'GGG': 'G'
+}
+
+# Amino acid labels indexed by code; code 0 is "no amino acid" (gaps, lowercase
+# or ambiguous bases, introns)
+amino_acids = [""] + sorted(set(dna_to_amino_acid.values()) - {"Stop"}) + ["Stop"]
+amino_acid_codes = {aa: code for code, aa in enumerate(amino_acids)}
+
+# Base codes: T, C, A, G are 0-3, everything else is INVALID_BASE. Only
+# uppercase bases translate, as with the dictionary lookup in the scripts.
+BASES = "TCAG"
+INVALID_BASE = 4
+GAP = "-"
+CONTEXT_CHUNK = 64  # columns read at a time when looking for the bases around a region
+COUNT_CHUNK = 1 << 20  # columns read at a time when counting the gaps before a region
+base_codes = np.full(256, INVALID_BASE, dtype=np.uint8)
+for code, base in enumerate(BASES):
+    base_codes[ord(base)] = code
+
+# 64-entry codon table indexed by 16 * first + 4 * second + third base code
+codon_table = np.zeros(64, dtype=np.uint8)
+for codon, aa in dna_to_amino_acid.items():
+    b0, b1, b2 = (BASES.index(base) for base in codon)
+    codon_table[16 * b0 + 4 * b1 + b2] = amino_acid_codes[aa]
+
+
+def encode(sequence):
+    """Return the raw bytes of a sequence as a uint8 array."""
+    return np.frombuffer(sequence.encode("latin-1"), dtype=np.uint8)
+
+
+def translate(raw):
+    """Translate every complete codon of an encoded sequence to amino acid codes.
+
+    Trailing bases that do not fill a codon are ignored, and codons containing
+    anything other than uppercase T, C, A or G translate to code 0.
+    """
+    n_codons = len(raw) // 3
+    codes = base_codes[raw[:3 * n_codons]].reshape(n_codons, 3)
+    valid = (codes < INVALID_BASE).all(axis=1)
+    index = (codes[:, 0].astype(np.intp) << 4) | (codes[:, 1] << 2) | codes[:, 2]
+    return np.where(valid, codon_table[index & 63], 0).astype(np.uint8)
+
+
+class Annotation:
+    """Per-base annotation columns for one sequence.
+
+    Attributes are parallel arrays: ``raw`` (bases as uint8), ``position``,
+    ``exon`` (bool), ``amino_acid`` (codes into ``amino_acids``) and ``accent``
+    (bool). The list-returning methods give the string form used in the CSVs.
+    """
+
+    def __init__(self, raw, position, exon, amino_acid, accent):
+        self.raw = raw
+        self.position = position
+        self.exon = exon
+        self.amino_acid = amino_acid
+        self.accent = accent
+
+    def __len__(self):
+        return len(self.raw)
+
+    def bases(self):
+        return list(self.raw.tobytes().decode("latin-1"))
+
+    def types(self):
+        return np.where(self.exon, "exon", "intron").tolist()
+
+    def amino_acid_labels(self):
+        return [amino_acids[code] for code in self.amino_acid.tolist()]
+
+    def accents(self):
+        return np.where(self.accent, "accent", "").tolist()
+
+
+def reading_frame(raw, phase=0):
+    """Codon index and place in the codon of every column of an aligned sequence.
+
+    Gap columns are skipped, so column ``j`` holds base ``k`` of the
+    ungapped sequence (``phase`` bases come before the first column), which
+    is base ``k % 3`` of codon ``k // 3``. Returns (codon, place, is_base)
+    arrays; codon and place are meaningless where ``is_base`` is False.
+    """
+    is_base = raw != ord(GAP)
+    ungapped = np.cumsum(is_base) + (phase - 1)
+    return ungapped // 3, ungapped % 3, is_base
+
+
+def annotate_alignment(sequence, reference_sequence, before="", after=""):
+    """Annotate an aligned sequence for the fa-to-csv.py table.
+
+    A column is exonic when the reference has no gap there. The bases of
+    the sequence are read in its own reading frame: every base carries the
+    amino acid of the codon it belongs to in the ungapped sequence and the
+    first base of every codon is accented, while gap columns get neither
+    and become rests. ``before`` and ``after`` are the bases just outside a
+    window of a longer sequence that complete its first and last codons
+    (see frame_context); a codon left incomplete has no amino acid.
+    """
+    raw = encode(sequence)
+    n = len(raw)
+    reference = encode(reference_sequence)
+    if len(reference) < n:
+        raise IndexError("reference sequence is shorter than the aligned sequence")
+
+    exon = reference[:n] != ord(GAP)
+    codon_index, place, is_base = reading_frame(raw, len(before))
+    codon_aa = translate(np.concatenate([encode(before), raw[is_base], encode(after)]))
+    amino_acid = np.zeros(n, dtype=np.uint8)
+    coding = is_base & exon & (codon_index < len(codon_aa))
+    amino_acid[coding] = codon_aa[codon_index[coding]]
+    return Annotation(raw, np.arange(1, n + 1), exon, amino_acid, is_base & (place == 0))
+
+
+def frame_context(fetch, length, start, piece, preceding):
+    """The bases around a window of an aligned sequence that complete its codons.
+
+    ``piece`` is columns ``start`` onwards of a sequence of ``length``
+    columns, ``fetch(a, b)`` returns columns ``a`` to ``b`` of it and
+    ``preceding`` is the number of bases (not gaps) before ``start``.
+    Returns (before, after) for annotate_alignment: the last bases of the
+    codon cut by ``start`` and the first ones of the codon cut by the end
+    of the window. Only a few columns around the window are read.
+    """
+    needed = preceding % 3
+    before = ""
+    stop = start
+    while len(before) < needed and stop > 0:
+        before = fetch(max(0, stop - CONTEXT_CHUNK), stop).replace(GAP, "") + before
+        stop -= CONTEXT_CHUNK
+    before = before[len(before) - needed:] if needed else ""
+
+    needed = -(preceding + len(piece) - piece.count(GAP)) % 3
+    after = ""
+    begin = start + len(piece)
+    while len(after) < needed and begin < length:
+        after += fetch(begin, min(begin + CONTEXT_CHUNK, length)).replace(GAP, "")
+        begin += CONTEXT_CHUNK
+    return before, after[:needed]
+
+
+def aligned_records(fasta_path, numbers=None, region=None):
+    """Yield (number, sequence, before, after) for the records of an aligned FASTA file.
+
+    As read_records, with the frame_context of the ``region`` of every
+    record (empty strings without one). An indexed file is read around the
+    region only; the gaps before it are counted a chunk at a time.
+    """
+    if region is None:
+        for number, _, sequence in read_records(fasta_path, numbers):
+            yield number, sequence, "", ""
+        return
+    start, end = region
+    try:
+        indexed = IndexedFasta(fasta_path)
+    except ValueError:
+        indexed = None  # compressed, or wrapped irregularly
+    if indexed is None:
+        for number, _, sequence in read_records(fasta_path, numbers):
+            piece = sequence[start:end]
+            preceding = min(start, len(sequence)) - sequence.count(GAP, 0, start)
+            before, after = frame_context(lambda a, b: sequence[a:b], len(sequence), start, piece, preceding)
+            yield number, piece, before, after
+        return
+    with indexed:
+        positions = [i for i, record in enumerate(indexed.index) if record.length]
+        for number, position in enumerate(positions, start=1):
+            if numbers is not None and number not in numbers:
+                continue
+            length = indexed.index[position].length
+            piece = indexed.fetch(position, start, end)
+            stop = min(start, length)
+            preceding = stop - sum(indexed.fetch(position, a, min(a + COUNT_CHUNK, stop)).count(GAP)
+                                   for a in range(0, stop, COUNT_CHUNK))
+            before, after = frame_context(lambda a, b: indexed.fetch(position, a, b), length, start, piece,
+                                          preceding)
+            yield number, piece, before, after
+
+
+def annotate_locus(sequence, start_offset, cds_index):
+    """Annotate a genomic locus the way fastocodoncsv.py does.
+
+    Only complete codons are kept. Each codon is exonic when its first base
+    lies in a CDS region of ``cds_index`` (a CDSIndex), and all three bases
+    share that call and the codon's amino acid.
+    """
+    raw = encode(sequence)
+    n = 3 * (len(raw) // 3)
+    raw = raw[:n]
+    codon_start = start_offset + np.arange(0, n, 3)
+    codon_exon = cds_index.mask(codon_start)
+    codon_aa = np.where(codon_exon, translate(raw), 0).astype(np.uint8)
+    return Annotation(
+        raw,
+        start_offset + np.arange(n),
+        np.repeat(codon_exon, 3),
+        np.repeat(codon_aa, 3),
+        np.arange(n) % 3 == 0,
+    )
+
+
+def codon_region(region):
+    """A (start, end) region widened to whole codons, counted from the first base."""
+    if region is None:
+        return None
+    start, end = region
+    return start - start % 3, end + -end % 3
+
+
+def annotate_fasta(fasta_path, writer, records=None, region=None):
+    """Annotate every record of an aligned FASTA file into a TableWriter.
+
+    Records are named Sequence1, Sequence2, ... in file order and Sequence2 is
+    the reference for exon/intron calls, so only the first two records are
+    buffered before rows start being written. ``records`` (a set of record
+    numbers) and ``region`` (0-based start, end of alignment columns,
+    widened to whole codons) restrict the output; see fasta.read_records.
+    """
+    if records is not None or region is not None:
+        region = codon_region(region)
+        reference = [sequence for _, _, sequence in read_records(fasta_path, {2}, region)]
+        if not reference:
+            raise ValueError(f"{fasta_path}: at least two records are needed, Sequence2 is the reference")
+        for number, sequence, before, after in aligned_records(fasta_path, records, region):
+            annotation = annotate_alignment(sequence, reference[0], before, after)
+            if region:
+                annotation.position = annotation.position + region[0]
+            writer.write_columns(annotation_columns(f"Sequence{number}", annotation))
+        return
+
+    records = read_fasta(fasta_path)
+    first_records = list(itertools.islice(records, 2))
+    if len(first_records) < 2:
+        raise ValueError(f"{fasta_path}: at least two records are needed, Sequence2 is the reference")
+    reference_sequence = first_records[1][1]
+
+    for i, (_, sequence) in enumerate(itertools.chain(first_records, records)):
+        annotation = annotate_alignment(sequence, reference_sequence)
+        writer.write_columns(annotation_columns(f"Sequence{i + 1}", annotation))
+
+
+def annotation_columns(header, annotation):
+    """Columns of the fa-to-csv.py table for one annotated record."""
+    return {
+        "header": header,
+        "position": annotation.position,
+        "sequence": annotation.bases(),
+        "type": annotation.types(),
+        "codons": annotation.amino_acid_labels(),
+        "duration": 0.125,
+        "accent": annotation.accents(),
+    }
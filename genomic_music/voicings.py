@@ -0,0 +1,102 @@
+"""Memoized chord voicings for the SequenceX chord track.
+
+A SequenceX chord is its root plus a fixed set of semitone intervals. There
+are only a few dozen distinct (root, intervals) pairs in a score, so each
+voicing is spelled once and then reused for every chord with the same key.
+Accented and unaccented chords share a voicing; the accent is an
+articulation added to the chord built from it. Notes above the root are
+spelled as music21 spells a transposition by semitones, without importing
+music21; only a root this module cannot read is handed to music21.
+"""
+
+import re
+
+# Semitone intervals above the root for each scale type of the pipeline without introns
+scale_type_intervals = {
+    "blues": (0, 3, 7, 10),       # Dominant seventh with minor third
+    "pentatonic": (0, 4, 7),      # Major triad
+    "mixolydian": (0, 4, 7, 10),  # Dominant seventh
+    "bebop": (0, 4, 7, 14),       # Triad with added ninth
+}
+
+
+def triad_intervals(chord_type):
+    """Intervals of the triad used for a chord quality in the pipeline with introns."""
+    if "m" in chord_type:
+        third_interval = 3  # Minor third
+    elif "dim" in chord_type:
+        third_interval = 3  # Minor third for diminished
+    elif "aug" in chord_type:
+        third_interval = 4  # Major third for augmented
+    else:
+        third_interval = 4  # Major third for major triad
+
+    if "dim" in chord_type:
+        fifth_interval = 6  # Diminished fifth
+    elif "aug" in chord_type:
+        fifth_interval = 8  # Augmented fifth
+    else:
+        fifth_interval = 7  # Perfect fifth for major and minor triads
+
+    return (0, third_interval, fifth_interval)
+
+
+_root_pattern = re.compile(r"^([A-G])(#{0,2}|-{0,2})(\d?)$")
+_steps = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+# music21's spelling of every pitch class after a transposition by semitones
+_pitch_class_names = ("C", "C#", "D", "E-", "E", "F", "F#", "G", "G#", "A", "B-", "B")
+
+
+def transpose(root_note, interval):
+    """Name of the pitch ``interval`` semitones above ``root_note``, as music21's Pitch.transpose spells it."""
+    match = _root_pattern.match(root_note)
+    if not match:
+        from music21 import pitch
+
+        return pitch.Pitch(root_note).transpose(interval).nameWithOctave
+    step, accidentals, octave = match.groups()
+    # A root without an octave is placed in octave 4 and the result keeps no octave, as in music21
+    midi = (_steps[step] + accidentals.count("#") - accidentals.count("-")
+            + 12 * (int(octave or 4) + 1) + interval)
+    name = _pitch_class_names[midi % 12]
+    return f"{name}{midi // 12 - 1}" if octave else name
+
+
+class VoicingCache:
+    """Pitch names of chord voicings keyed by (root note, intervals).
+
+    ``hits`` and ``misses`` count lookups so the hit rate can be reported.
+    """
+
+    def __init__(self):
+        self.voicings = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, root_note, intervals):
+        """Return the pitch names of the chord, transposing only on first use.
+
+        The root keeps its spelling from the table; the other notes are
+        spelled as music21's transpose spells them in the original converters.
+        """
+        key = (root_note, intervals)
+        voicing = self.voicings.get(key)
+        if voicing is not None:
+            self.hits += 1
+            return voicing
+        self.misses += 1
+        voicing = tuple(root_note if interval == 0 else transpose(root_note, interval) for interval in intervals)
+        self.voicings[key] = voicing
+        return voicing
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"voicings": len(self.voicings), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hit_rate(), 4)}
+
+
+# Shared by every score built in this process
+voicing_cache = VoicingCache()
@@ -0,0 +1,67 @@
+import itertools
+import os
+
+import pytest
+
+from genomic_music import batch, pipeline
+from genomic_music.fasta import read_fasta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+FASTA = os.path.join(ROOT, "OG0002459_codon.fasta")
+
+OPTIONS = dict(musicxml=True, midi=True, backend="direct")
+
+
+@pytest.fixture
+def source(tmp_path):
+    # Two small orthogroups cut from the sample alignment
+    directory = tmp_path / "source"
+    directory.mkdir()
+    records = list(itertools.islice(read_fasta(FASTA), 3))
+    for name, columns in (("small", 60), ("other", 90)):
+        with open(directory / f"{name}.fasta", "w") as out:
+            for header, sequence in records:
+                out.write(f">{header}\n{sequence[:columns]}\n")
+    return str(directory)
+
+
+def test_failed_job_leaves_no_outputs_and_reruns(source, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "out")
+    os.makedirs(output_dir)
+    job = [job for job in batch.discover_jobs(source) if job.name == "small"][0]
+
+    def truncated_midi(chord_table, output_file, with_introns=False, errors=None):
+        with open(output_file, "wb") as out:
+            out.write(b"MThd")
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(pipeline, "midi", truncated_midi)
+        result = batch.run_job(job, output_dir, OPTIONS)
+    assert result["status"] == "failed"
+    assert "disk full" in result["error"]
+    # The MusicXML file written before the failure is not kept either
+    assert not any(filename.startswith("small") for filename in os.listdir(output_dir))
+    assert not os.path.exists(batch.staging_dir(job, output_dir))
+    assert not batch.is_up_to_date(job, output_dir, OPTIONS)
+
+    summary = batch.run_batch(batch.discover_jobs(source), output_dir, workers=1, **OPTIONS)
+    assert {entry["name"]: entry["status"] for entry in summary["jobs"]} == {"other": "done", "small": "done"}
+    with open(os.path.join(output_dir, "small.mid"), "rb") as f:
+        assert len(f.read()) > 4
+
+    summary = batch.run_batch(batch.discover_jobs(source), output_dir, workers=1, **OPTIONS)
+    assert summary["counts"] == {"done": 0, "skipped": 2, "failed": 0}
+
+
+def test_failed_up_to_date_check_is_recorded(source, tmp_path):
+    jobs = batch.discover_jobs(source)
+    summary = batch.run_batch(jobs, str(tmp_path / "out"), workers=1, schemes=["no-such-scheme"], **OPTIONS)
+    assert summary["counts"] == {"done": 0, "skipped": 0, "failed": 2}
+    assert all("no-such-scheme" in entry["error"] for entry in summary["jobs"])
+
+
+def test_duplicate_job_names_are_rejected(source):
+    os.link(os.path.join(source, "small.fasta"), os.path.join(source, "small.fa"))
+    with pytest.raises(ValueError, match="share the name 'small'"):
+        batch.discover_jobs(source)
@@ -0,0 +1,54 @@
+import itertools
+import os
+
+from genomic_music import pipeline
+from genomic_music.cache import StageCache, cached_tables
+from genomic_music.fasta import read_fasta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+FASTA = os.path.join(ROOT, "OG0002459_codon.fasta")
+
+
+def write_alignment(path, records):
+    with open(path, "w") as out:
+        for header, sequence in records:
+            out.write(f">{header}\n{sequence}\n")
+
+
+def test_changing_one_record_rebuilds_only_its_parts(tmp_path):
+    records = [(header, sequence[:300]) for header, sequence in itertools.islice(read_fasta(FASTA), 4)]
+    fasta = str(tmp_path / "alignment.fasta")
+    write_alignment(fasta, records)
+    cache = StageCache(str(tmp_path / "cache"))
+
+    cached_tables(fasta, cache)
+    assert (cache.hits, cache.misses) == (0, 8)  # annotation and chords of every record
+    cached_tables(fasta, cache)
+    assert (cache.hits, cache.misses) == (8, 8)
+
+    # A substitution in Sequence4, which is not the reference of either stage
+    header, sequence = records[3]
+    changed = "T" if sequence[10] != "T" else "C"
+    records[3] = (header, sequence[:10] + changed + sequence[11:])
+    write_alignment(fasta, records)
+    annotated, chord_table, _ = cached_tables(fasta, cache)
+    assert (cache.hits, cache.misses) == (14, 10)
+
+    expected = pipeline.chords(pipeline.annotate(fasta))
+    assert list(chord_table.rows()) == list(expected.rows())
+    assert list(annotated.rows()) == list(pipeline.annotate(fasta).rows())
+
+
+def test_changing_the_reference_rebuilds_every_annotation(tmp_path):
+    records = [(header, sequence[:90]) for header, sequence in itertools.islice(read_fasta(FASTA), 3)]
+    fasta = str(tmp_path / "alignment.fasta")
+    write_alignment(fasta, records)
+    cache = StageCache(str(tmp_path / "cache"))
+    cached_tables(fasta, cache)
+
+    header, sequence = records[1]
+    records[1] = (header, "-" + sequence[1:])  # Sequence2 decides exons for every record
+    write_alignment(fasta, records)
+    _, chord_table, _ = cached_tables(fasta, cache)
+    assert cache.misses == 6 + 3 + 3
+    assert list(chord_table.rows()) == list(pipeline.chords(pipeline.annotate(fasta)).rows())
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from genomic_music import columnar
+from genomic_music.columnar import Categorical, Table, TableWriter, read_table, write_table
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+CHORD_TABLE = os.path.join(ROOT, "OG0002459_codon_with_chords.csv")
+
+
+def rows_of(table):
+    return list(table.rows())
+
+
+def test_npz_and_csv_round_trip(tmp_path):
+    table = read_table(CHORD_TABLE)
+    write_table(str(tmp_path / "table.npz"), table)
+    write_table(str(tmp_path / "table.csv"), read_table(str(tmp_path / "table.npz")))
+    round_trip = read_table(str(tmp_path / "table.csv"))
+    assert round_trip.fieldnames == table.fieldnames
+    assert rows_of(round_trip) == rows_of(table)
+    with open(CHORD_TABLE) as original, open(tmp_path / "table.csv") as written:
+        assert written.read().splitlines() == original.read().splitlines()
+
+
+def test_integer_csv_columns_stay_integers(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "ROW_CHUNK", 3)
+    path = tmp_path / "table.csv"
+    path.write_text("position,octave,label,padded,late\n"
+                    "1,4,a,01,1\n2,4,b,2,2\n3,5,c,3,3\n"
+                    "4,4,d,4,x\n5,-1,e,5,5\n")
+    table = read_table(str(path))
+    assert table.columns["position"].tolist() == [1, 2, 3, 4, 5]
+    assert table.columns["octave"].dtype == np.int64
+    for name in ("label", "padded", "late"):
+        assert isinstance(table.columns[name], Categorical)
+    # A column demoted by a later chunk keeps the values of the earlier ones
+    assert table.column("late") == ["1", "2", "3", "x", "5"]
+    assert table.column("padded")[0] == "01"
+
+
+def test_short_rows_and_blank_lines(tmp_path):
+    path = tmp_path / "table.csv"
+    path.write_text("a,b,c\n1,2\n\n3,4,5,6\n")
+    assert rows_of(read_table(str(path))) == [{"a": "1", "b": "2", "c": ""}, {"a": "3", "b": "4", "c": "5"}]
+
+
+def test_writer_chunks_match_one_write(monkeypatch):
+    rows = [{"n": str(i), "s": "xyz"[i % 3]} for i in range(10)]
+    whole = Table.from_rows(rows, ["n", "s"])
+    monkeypatch.setattr(columnar, "ROW_CHUNK", 4)
+    with TableWriter(None, ["n", "s"]) as writer:
+        writer.write_rows(iter(rows))
+    assert rows_of(writer.table) == rows_of(whole) == rows
+
+
+def test_from_codes_uses_the_smallest_code_type():
+    assert Categorical.from_codes(np.array([0, 1, 1]), ["a", "b"]).codes.dtype == np.uint8
+    column = Categorical.from_codes(np.arange(300), [str(i) for i in range(300)])
+    assert column.codes.dtype == np.uint16
+    assert column.tolist()[298:] == ["298", "299"]
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from genomic_music import conservation, pipeline
+
+# Sequence3 has a synonymous change in the last column (AAA -> AAG, both K)
+# and Sequence4 a non-synonymous one in the fourth (AAA -> CAA, K -> Q)
+ALIGNMENT = ">s1\nATGAAA\n>s2\nATGAAA\n>s3\nATGAAG\n>s4\nATGCAA\n"
+
+
+@pytest.fixture
+def chord_table(tmp_path):
+    path = tmp_path / "alignment.fasta"
+    path.write_text(ALIGNMENT)
+    return pipeline.chords(pipeline.annotate(str(path)))
+
+
+def test_column_statistics(chord_table):
+    stats = conservation.column_statistics(chord_table)
+    assert stats["identity"].tolist() == [1.0, 1.0, 1.0, 0.75, 1.0, 0.75]
+    expected_entropy = -(0.75 * np.log2(0.75) + 0.25 * np.log2(0.25))
+    assert np.allclose(stats["entropy"], [0, 0, 0, expected_entropy, 0, expected_entropy])
+    assert stats["nonsynonymous"].tolist() == [0, 0, 0, 1, 0, 0]
+    assert (stats["column"][-6:] == -1).all()  # the SequenceX rows
+
+
+def test_dynamics_columns(chord_table):
+    rows = list(conservation.add_dynamics(chord_table).rows())
+    changes = {(row["header"], row["position"]): row["change"] for row in rows if row["change"]}
+    assert changes == {("Sequence3", "6"): "synonymous", ("Sequence4", "4"): "nonsynonymous"}
+    assert {row["entropy"] for row in rows if row["header"] == "Sequence1"} == {"0.000", "0.811"}
+    accented = [(row["header"], row["position"]) for row in rows if row["emphasis"]]
+    assert accented == [("Sequence4", "4"), ("SequenceX", "")]
+    for row in rows:
+        if row["emphasis"]:
+            assert int(row["velocity"]) == conservation.ACCENT_VELOCITY
+    # Conserved columns are soft, variable ones louder, codon starts lifted
+    sequence1 = [int(row["velocity"]) for row in rows if row["header"] == "Sequence1"]
+    assert sequence1[1] == conservation.SOFT_VELOCITY
+    assert sequence1[0] == conservation.SOFT_VELOCITY + conservation.CODON_LIFT
+    assert sequence1[5] > sequence1[4]
@@ -0,0 +1,41 @@
+import random
+
+from genomic_music.coordinates import CDSIndex, read_cds_coordinates
+
+
+def linear_scan(regions, position):
+    # The CDS lookup of fastocodoncsv.py
+    for start, end in regions:
+        if start <= position <= end:
+            return "exon"
+    return "intron"
+
+
+def test_cds_index_agrees_with_linear_scan():
+    rng = random.Random(0)
+    regions = []
+    for _ in range(200):
+        start = rng.randint(1000, 50000)
+        regions.append((start, start + rng.randint(0, 300)))  # overlapping and single-base regions included
+    cds_index = CDSIndex(regions)
+    positions = list(range(900, 50500))
+    assert [cds_index.position_type(position) for position in positions] == \
+        [linear_scan(regions, position) for position in positions]
+    assert cds_index.mask(positions).tolist() == [linear_scan(regions, position) == "exon" for position in positions]
+    assert len(cds_index) < len(regions)
+
+
+def test_empty_index():
+    cds_index = CDSIndex([])
+    assert cds_index.position_type(10) == "intron"
+    assert cds_index.mask([1, 2]).tolist() == [False, False]
+
+
+def test_read_cds_coordinates(tmp_path):
+    path = tmp_path / "gene_and_cds_coordinates.tsv"
+    path.write_text("chrom\tstart\tend\tid\tfeature\n"
+                    "chr2\t10000\t12999\tg1\tgene\n"
+                    "chr2\t10000\t10200\tg1\tCDS\n"
+                    "chr2\tx\t10700\tg1\tCDS\n"
+                    "chr2\t11000\t11450\tg1\tCDS\n")
+    assert read_cds_coordinates(str(path)) == ([(10000, 10200), (11000, 11450)], 10000)
@@ -0,0 +1,78 @@
+import gzip
+
+import pytest
+
+from genomic_music.fasta import IndexedFasta, build_index, fasta_index, read_fasta, read_index, read_records
+
+RECORDS = [
+    ("r1 first record", "ACGTACGTAC" "GTACGTACGT" "ACG"),
+    ("r2", "TTTTT" "CCCCC"),
+    ("r3\tdescribed", "GGGG"),
+]
+
+
+def write_fasta(path, records, width):
+    with open(path, "w") as out:
+        for header, sequence in records:
+            out.write(f">{header}\n")
+            for start in range(0, len(sequence), width):
+                out.write(sequence[start:start + width] + "\n")
+
+
+@pytest.fixture
+def fasta(tmp_path):
+    path = str(tmp_path / "records.fa")
+    write_fasta(path, RECORDS, 10)
+    return path
+
+
+def test_build_index_matches_samtools_layout(fasta):
+    index = build_index(fasta)
+    assert [(record.name, record.length, record.line_bases, record.line_width) for record in index] == [
+        ("r1", 23, 10, 11), ("r2", 10, 10, 11), ("r3", 4, 4, 5)]
+    with open(fasta, "rb") as f:
+        data = f.read()
+    for record, (_, sequence) in zip(index, RECORDS):
+        assert data[record.offset:record.offset + 4].decode() == sequence[:4]
+
+
+def fields(record):
+    return record.name, record.length, record.offset, record.line_bases, record.line_width
+
+
+def test_index_is_saved_and_read_back(fasta):
+    built = fasta_index(fasta)
+    saved = read_index(fasta + ".fai")
+    assert [fields(record) for record in saved] == [fields(record) for record in built]
+
+
+@pytest.mark.parametrize("start, end", [(0, None), (0, 10), (9, 11), (10, 20), (3, 23), (20, 40), (5, 5), (30, 40)])
+def test_fetch_slices_across_line_breaks(fasta, start, end):
+    with IndexedFasta(fasta) as indexed:
+        for position, (_, sequence) in enumerate(RECORDS):
+            assert indexed.fetch(position, start, end) == sequence[start:end]
+        assert indexed.fetch("r2", 2, 7) == RECORDS[1][1][2:7]
+
+
+def test_irregular_lines_cannot_be_indexed(tmp_path):
+    path = str(tmp_path / "ragged.fa")
+    with open(path, "w") as out:
+        out.write(">r1\nACGT\nAC\nACGT\n")
+    with pytest.raises(ValueError, match="different lengths"):
+        build_index(path)
+
+
+def test_gzip_files_are_streamed(fasta, tmp_path):
+    compressed = str(tmp_path / "records.fa.gz")
+    with open(fasta, "rb") as f, gzip.open(compressed, "wb") as out:
+        out.write(f.read())
+    with pytest.raises(ValueError, match="gzip"):
+        build_index(compressed)
+    for numbers, region in [(None, None), ({1, 3}, None), (None, (2, 12)), ({2}, (4, 8))]:
+        assert list(read_records(compressed, numbers, region)) == list(read_records(fasta, numbers, region))
+
+
+def test_read_records_names_and_selection(fasta):
+    assert list(read_records(fasta)) == [(1, "r1", RECORDS[0][1]), (2, "r2", RECORDS[1][1]), (3, "r3", "GGGG")]
+    assert list(read_records(fasta, {2, 3}, (1, 3))) == [(2, "r2", "TT"), (3, "r3", "GG")]
+    assert [header for header, _ in read_fasta(fasta)] == [header for header, _ in RECORDS]
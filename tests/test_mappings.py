@@ -0,0 +1,106 @@
+import copy
+import json
+import os
+
+import pytest
+
+from genomic_music import mappings
+from genomic_music.mappings import SchemeError, validate
+
+with open(os.path.join(os.path.dirname(mappings.__file__), "schemes", "blues.json")) as f:
+    BLUES = json.load(f)
+
+
+def problems_of(data):
+    with pytest.raises(SchemeError) as error:
+        validate(data)
+    return error.value.problems
+
+
+def edited(**changes):
+    data = copy.deepcopy(BLUES)
+    data.update(changes)
+    return data
+
+
+def test_bundled_scheme_is_valid():
+    scheme = validate(copy.deepcopy(BLUES), "blues.json")
+    assert scheme.name == "blues"
+    assert scheme.pipeline == "alignment"
+
+
+def test_not_an_object():
+    assert problems_of([]) == ["a scheme must be a JSON object"]
+
+
+def test_unknown_pipeline_and_missing_tables():
+    problems = problems_of({"pipeline": "other"})
+    assert "pipeline must be one of alignment, locus, not 'other'" in problems
+    assert "no amino acid groups" in problems
+    assert "no chord pitches" in problems
+
+
+def test_group_problems():
+    data = edited()
+    groups = data["groups"]
+    first, second = list(groups)[:2]
+    groups[first]["scale_type"] = "waltz"
+    groups[first]["chords"]["X"] = "C"
+    moved = next(iter(groups[second]["chords"]))
+    groups[first]["chords"][moved] = groups[second]["chords"][moved]
+    groups[second]["chords"]["Z"] = "c minor"
+    problems = problems_of(data)
+    assert any(problem.startswith(f"group {first!r}: scale type 'waltz'") for problem in problems)
+    assert f"group {first!r}: 'X' is not an amino acid" in problems
+    assert f"{moved} is in both groups {first!r} and {second!r}" in problems
+    assert f"group {second!r}: 'Z' is not an amino acid" in problems
+
+
+def test_missing_amino_acid_and_chord_pitches():
+    data = edited()
+    chords = next(iter(data["groups"].values()))["chords"]
+    amino_acid, chord = next(iter(chords.items()))
+    del chords[amino_acid]
+    problems = problems_of(data)
+    assert f"no chord for {amino_acid}" in problems
+
+    data = edited()
+    chord = next(iter(next(iter(data["groups"].values()))["chords"].values()))
+    data["pitches"][chord] = {"A": "C4", "C": "H4", "G": "E4", "U": "G4"}
+    problems = problems_of(data)
+    assert f"pitches of {chord} has no pitch for T" in problems
+    assert f"pitches of {chord}: 'H4' is not a pitch such as C4, E-4 or F#3" in problems
+    assert f"pitches of {chord}: 'U' is not a base" in problems
+
+
+def test_duplicate_keys_are_problems(tmp_path):
+    path = tmp_path / "twice.json"
+    path.write_text('{"pipeline": "alignment", "pipeline": "locus"}')
+    with pytest.raises(SchemeError) as error:
+        mappings.read_scheme(str(path))
+    assert "duplicate key 'pipeline'" in error.value.problems
+
+
+def test_warnings():
+    data = edited(intron_pitches={"A": "C4", "C": "D4", "G": "E4", "T": "F4"})
+    data["pitches"]["Q9"] = {"A": "C4", "C": "D4", "G": "E4", "T": "F4"}
+    warnings = validate(data).warnings
+    assert "pitches of unused chords: Q9" in warnings
+    assert "intron_pitches are only used by locus schemes" in warnings
+    # The bundled blues scheme shares C7 and D7 between two groups
+    assert any(warning.startswith("chord 'C7' is shared by the groups") for warning in warnings)
+
+
+def test_locus_scheme_needs_intron_pitches():
+    data = edited(pipeline="locus")
+    assert "intron_pitches must map the bases A, C, G, T to pitches" in problems_of(data)
+
+
+def test_registered_name_is_kept(tmp_path, monkeypatch):
+    monkeypatch.setenv("GENOMIC_MUSIC_SCHEME_CACHE", str(tmp_path / "compiled"))
+    monkeypatch.setattr(mappings, "_registered", {})
+    path = tmp_path / "file_name.json"
+    path.write_text(json.dumps(BLUES))
+    mappings.register_scheme(str(path), "registered")
+    assert mappings.load_scheme("registered").name == "registered"
+    assert mappings.load_scheme(str(path)).name == "file_name"
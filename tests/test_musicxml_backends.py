@@ -0,0 +1,88 @@
+"""The direct MusicXML writer against the music21 reference backend.
+
+Both backends render the same input and the two files are parsed back with
+music21. The reference score appends its parts one after another, so it is
+notated in 4/4 and every part is padded with rests to the end of the last
+one; ties and runs of rests are therefore merged and trailing rests dropped
+before the notes, chords and rests are compared.
+"""
+
+import itertools
+import os
+
+import pytest
+
+from genomic_music import pipeline
+from genomic_music.fasta import read_fasta
+
+converter = pytest.importorskip("music21.converter")
+articulations = pytest.importorskip("music21.articulations")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+FASTA = os.path.join(ROOT, "OG0002459_codon.fasta")
+
+# Alignment columns rendered from the sample; enough for chords on every scale type
+COLUMNS = 150
+# Locus for the pipeline with introns: (start, end) of the gene and of its CDS, inclusive
+GENE = (1000, 1299)
+CDS = [(1000, 1059), (1120, 1209), (1250, 1299)]
+
+
+def events(path):
+    """(offset, quarter length, pitch names or "rest", accented) of every part of a MusicXML file."""
+    parts = []
+    for part in converter.parse(path).stripTies().parts:
+        part_events = []
+        for element in part.flatten().notesAndRests:
+            pitches = "rest" if element.isRest else tuple(p.nameWithOctave for p in element.pitches)
+            offset, length = float(element.offset), float(element.quarterLength)
+            if pitches == "rest" and part_events and part_events[-1][2] == "rest":
+                previous = part_events.pop()
+                offset, length = previous[0], length + previous[1]
+            accent = any(isinstance(a, articulations.Accent) for a in element.articulations)
+            part_events.append((offset, length, pitches, accent))
+        while part_events and part_events[-1][2] == "rest":
+            part_events.pop()
+        parts.append(part_events)
+    return parts
+
+
+def render_both(tmp_path, fasta, **options):
+    paths = {}
+    for backend in ("direct", "music21"):
+        paths[backend] = str(tmp_path / f"{backend}.musicxml")
+        pipeline.run(fasta, musicxml=paths[backend], backend=backend, workers=1, **options)
+    return events(paths["direct"]), events(paths["music21"])
+
+
+@pytest.fixture
+def locus(tmp_path):
+    # Ungapped sample records as the gene sequences of a locus, with three CDS
+    length = GENE[1] - GENE[0] + 1
+    fasta = tmp_path / "extracted_gene_sequences.fa"
+    with open(fasta, "w") as out:
+        for i, (_, sequence) in enumerate(itertools.islice(read_fasta(FASTA), 3)):
+            out.write(f">seq{i}\n{sequence.replace('-', '')[:length]}\n")
+    coordinates = tmp_path / "gene_and_cds_coordinates.tsv"
+    with open(coordinates, "w") as out:
+        out.write("chrom\tstart\tend\tid\tfeature\n")
+        out.write(f"chr1\t{GENE[0]}\t{GENE[1]}\tg1\tgene\n")
+        for start, end in CDS:
+            out.write(f"chr1\t{start}\t{end}\tg1\tCDS\n")
+    return str(fasta), str(coordinates)
+
+
+def test_exon_pipeline_backends_match(tmp_path):
+    direct, reference = render_both(tmp_path, FASTA, region=(0, COLUMNS))
+    assert len(direct) == len(reference) == 9
+    assert all(direct)
+    assert any(len(pitches) > 1 for _, _, pitches, _ in direct[-1])
+    assert direct == reference
+
+
+def test_intron_pipeline_backends_match(tmp_path, locus):
+    fasta, coordinates = locus
+    direct, reference = render_both(tmp_path, fasta, coordinates=coordinates)
+    assert len(direct) == len(reference) == 4
+    assert any(pitches == "rest" for part in direct for _, _, pitches, _ in part)
+    assert direct == reference
@@ -0,0 +1,51 @@
+from genomic_music import pipeline
+from genomic_music.columnar import Table
+from genomic_music.midi import write_midi
+from genomic_music.musicxml import write_musicxml
+from genomic_music.report import ErrorReport, RunReport
+
+ALIGNMENT = ">s1\nATGAAATAG\n>s2\nATGAAA---\n"
+
+
+def test_writers_count_their_events_and_failures_once(tmp_path):
+    rows = [{"header": "Sequence1", "pitch": pitch, "accent": ""} for pitch in ["C4", "Q4", "B9", ""]]
+    table = Table.from_rows(rows, ["header", "pitch", "accent"])
+    report = RunReport()
+    with report.output_stage("musicxml-direct") as record:
+        write_musicxml(table, str(tmp_path / "score.musicxml"), errors=record.errors)
+    with report.output_stage("midi") as record:
+        write_midi(table, str(tmp_path / "score.mid"), errors=record.errors)
+    musicxml, midi = (stage.to_dict() for stage in report.stages)
+    assert (musicxml["notes"], musicxml["rests"], musicxml["errors"]) == (2, 2, 1)
+    assert (midi["notes"], midi["rests"], midi["errors"]) == (2, 2, 2)
+    # Q4 failed in both writers, B9 only fits MusicXML
+    assert report.errors.counts == {("pitch", "Q4"): 1, ("pitch", "B9"): 1}
+
+
+def test_merge_and_update():
+    first, second = ErrorReport(), ErrorReport()
+    for _ in range(2):
+        first.add("pitch", "Q4", ValueError("bad"))
+    second.add("pitch", "Q4", ValueError("bad"))
+    second.add_event("notes")
+    merged = ErrorReport()
+    merged.merge(first)
+    merged.merge(second)
+    assert merged.counts == {("pitch", "Q4"): 2}
+    first.update(second)
+    assert first.counts == {("pitch", "Q4"): 3}
+    assert first.events == {"notes": 1}
+
+
+def test_run_counts_events_in_the_output_stages(tmp_path):
+    fasta = tmp_path / "alignment.fasta"
+    fasta.write_text(ALIGNMENT)
+    report = RunReport()
+    pipeline.run(str(fasta), midi_file=str(tmp_path / "score.mid"), musicxml=str(tmp_path / "score.musicxml"),
+                 backend="direct", report=report)
+    stages = {stage.name: stage.to_dict() for stage in report.stages}
+    assert "notes" not in stages["chords"]
+    for name in ("musicxml-direct", "midi"):
+        # The stop codon and the gaps are rests
+        assert (stages[name]["notes"], stages[name]["chords"], stages[name]["rests"]) == (12, 2, 6)
+        assert stages[name]["errors"] == 0
@@ -0,0 +1,75 @@
+import asyncio
+import itertools
+import os
+import random
+
+import pytest
+
+from genomic_music import pipeline
+from genomic_music.fasta import read_fasta
+from genomic_music.report import ErrorReport
+from genomic_music.stream import NoteStream
+from genomic_music.synth import collect_notes
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+FASTA = os.path.join(ROOT, "OG0002459_codon.fasta")
+
+
+def batch_notes(fasta, coordinates):
+    with_introns = coordinates is not None
+    table = pipeline.chords(pipeline.annotate(fasta, None, coordinates), None, with_introns)
+    # One sample per eighth note, so note starts and lengths are in eighths as in NoteEvent
+    notes, _ = collect_notes(table, with_introns, ErrorReport(), sample_rate=2, tempo_bpm=60)
+    return sorted(zip(notes.starts.tolist(), notes.keys.tolist(), notes.lengths.tolist(),
+                      notes.velocities.tolist()))
+
+
+def stream_notes(fasta, coordinates, window_codons):
+    async def collect():
+        notes, last = [], 0
+        async for event in NoteStream(fasta, coordinates, window_codons).events():
+            assert event.time >= last
+            last = event.time
+            notes += [(event.time, key, event.length, event.velocity) for key in event.keys]
+        return notes
+    return sorted(asyncio.run(collect()))
+
+
+@pytest.fixture
+def alignment(tmp_path):
+    path = str(tmp_path / "alignment.fasta")
+    with open(path, "w") as out:
+        for header, sequence in itertools.islice(read_fasta(FASTA), 4):
+            out.write(f">{header}\n{sequence[:240]}\n")
+    return path
+
+
+@pytest.fixture
+def locus(tmp_path):
+    rng = random.Random(1)
+    fasta = str(tmp_path / "locus.fa")
+    with open(fasta, "w") as out:
+        for number in range(2):
+            sequence = "".join(rng.choice("acgt") for _ in range(300))
+            out.write(f">seq{number}\n")
+            out.write("".join(sequence[start:start + 60] + "\n" for start in range(0, 300, 60)))
+    coordinates = str(tmp_path / "coordinates.tsv")
+    with open(coordinates, "w") as out:
+        out.write("chrom\tstart\tend\tid\tfeature\n")
+        out.write("chr1\t1000\t1299\tg1\tgene\n")
+        for start, end in [(1000, 1040), (1100, 1180), (1250, 1299)]:
+            out.write(f"chr1\t{start}\t{end}\tg1\tCDS\n")
+    return fasta, coordinates
+
+
+@pytest.mark.parametrize("window_codons", [3, 16, 1000])
+def test_alignment_stream_matches_batch(alignment, window_codons):
+    assert stream_notes(alignment, None, window_codons) == batch_notes(alignment, None)
+
+
+@pytest.mark.parametrize("window_codons", [4, 1000])
+def test_locus_stream_matches_batch(locus, window_codons):
+    fasta, coordinates = locus
+    expected = batch_notes(fasta, coordinates)
+    assert expected
+    assert stream_notes(fasta, coordinates, window_codons) == expected
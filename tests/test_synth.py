@@ -0,0 +1,16 @@
+from genomic_music.columnar import Table
+from genomic_music.report import ErrorReport
+from genomic_music.synth import collect_notes
+
+
+def test_out_of_range_keys_are_left_out_and_counted():
+    rows = [{"header": "Sequence1", "pitch": pitch, "accent": accent}
+            for pitch, accent in [("C4", "accent"), ("B9", ""), ("", ""), ("A4", "")]]
+    errors = ErrorReport()
+    notes, total = collect_notes(Table.from_rows(rows, ["header", "pitch", "accent"]), errors=errors,
+                                 sample_rate=2, tempo_bpm=60)
+    assert notes.starts.tolist() == [0, 3]
+    assert notes.keys.tolist() == [60, 69]
+    assert notes.velocities.tolist() == [110, 80]
+    assert total == 4
+    assert list(errors.counts.items()) == [(("pitch", "B9"), 1)]
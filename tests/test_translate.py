@@ -0,0 +1,47 @@
+import pytest
+
+from genomic_music.translate import annotate_alignment, encode, frame_context, reading_frame
+
+
+def test_reading_frame_skips_partial_codon_gaps():
+    codon, place, is_base = reading_frame(encode("AT-G--AAA-C"))
+    assert is_base.tolist() == [True, True, False, True, False, False, True, True, True, False, True]
+    bases = is_base.nonzero()[0]
+    assert codon[bases].tolist() == [0, 0, 0, 1, 1, 1, 2]
+    assert place[bases].tolist() == [0, 1, 2, 0, 1, 2, 0]
+
+
+def test_reading_frame_phase():
+    codon, place, _ = reading_frame(encode("G-AA"), phase=2)
+    assert (codon[[0, 2, 3]].tolist(), place[[0, 2, 3]].tolist()) == ([0, 1, 1], [2, 0, 1])
+
+
+def test_gaps_do_not_shift_the_codons_after_them():
+    annotation = annotate_alignment("AT-GAA-A-TGG", "ATCGAAGACTGG")
+    assert annotation.amino_acid_labels() == ["M", "M", "", "M", "K", "K", "", "K", "", "W", "W", "W"]
+    assert annotation.accents() == ["accent", "", "", "", "accent", "", "", "", "", "accent", "", ""]
+    assert annotation.types() == ["exon"] * 12
+
+
+def test_reference_gaps_are_introns_without_amino_acids():
+    annotation = annotate_alignment("ATGAAA", "AT---A")
+    assert annotation.types() == ["exon", "exon", "intron", "intron", "intron", "exon"]
+    assert annotation.amino_acid_labels() == ["M", "M", "", "", "", "K"]
+
+
+@pytest.mark.parametrize("window", [1, 2, 4, 5, 7])
+def test_windows_read_in_the_frame_of_the_whole_sequence(window):
+    sequence = "A-TGA-AAT--GGC-CT"
+    reference = "A" * len(sequence)
+    whole = annotate_alignment(sequence, reference)
+    labels, accents = [], []
+    preceding = 0
+    for start in range(0, len(sequence), window):
+        piece = sequence[start:start + window]
+        before, after = frame_context(lambda a, b: sequence[a:b], len(sequence), start, piece, preceding)
+        part = annotate_alignment(piece, reference[start:start + window], before, after)
+        labels += part.amino_acid_labels()
+        accents += part.accents()
+        preceding += len(piece) - piece.count("-")
+    assert labels == whole.amino_acid_labels()
+    assert accents == whole.accents()